@@ -1,3 +1,16 @@
 from .cloud_provider import CloudProvider
-from .dbox import DBox
-from .gdrive import GDrive
\ No newline at end of file
+
+
+def __getattr__(name):
+    # Only import the SDK of a provider once that provider is actually used
+    if name == 'DBox':
+        from .dbox import DBox
+        return DBox
+    if name == 'GDrive':
+        from .gdrive import GDrive
+        return GDrive
+    if name == 'LocalHTTPProvider':
+        from .local_http import LocalHTTPProvider
+        return LocalHTTPProvider
+    raise AttributeError('module {} has no attribute {}'.format(__name__,
+                                                                 name))
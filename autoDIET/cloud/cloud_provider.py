@@ -1,11 +1,139 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from ..utils.file_utils import hash_file
+
+
 class CloudProvider(object):
     """
     Abstract class for a cloud provider capable of uploading a file and hosting
     it such that it would be publicly available for embedding in web services
     """
+    # Optional autoDIET.cloud.manifest.UploadManifest of files already hosted
+    manifest = None
+    # Whether upload_deduplicated asks the provider for an existing copy
+    # before uploading. Providers that reject uploads to a name that is
+    # already taken set this to False and are only asked after a conflict
+    lookup_before_upload = True
 
     def __init__(self, *args, **kwargs):
         raise NotImplementedError('Constructor not overridden from base class')
 
     def upload_public_file(self, local_path, dest_path):
         raise NotImplementedError('Function not implemented in child class')
+
+    @property
+    def namespace(self):
+        """
+        Identifies the account and location that files are uploaded to, such
+        that entries in a shared manifest do not leak across them
+        """
+        return type(self).__name__
+
+    def _existing_link(self, remote_name):
+        """
+        Returns the public link of a file with the given name if it is already
+        hosted by the provider. None otherwise, or if the child class cannot
+        look files up by name
+        """
+        return None
+
+    def upload_deduplicated(self, local_path, content_hash=None):
+        """
+        Uploads the provided file under a name derived from the hash of its
+        contents and shares it as a publicly visible file. Files whose
+        contents were already uploaded, according to the manifest or to the
+        provider itself, are not uploaded again and their link is returned.
+        The provider is only asked for an existing copy before uploading if
+        lookup_before_upload is True, and otherwise only once the upload
+        fails
+
+        Parameters
+        ----------
+        local_path : str
+            Path to local file that needs to be uploaded
+        content_hash : str, optional
+            SHA-256 hash of the contents of the file if already computed
+
+        Returns
+        -------
+        str
+            Publicly visible address where the file can be accessed
+        """
+        if content_hash is None:
+            content_hash = hash_file(local_path)
+        manifest = self.manifest
+        if manifest is not None:
+            link = manifest.get(self.namespace, content_hash)
+            if link:
+                return link
+        remote_name = content_hash + os.path.splitext(local_path)[1].lower()
+        link = None
+        if self.lookup_before_upload:
+            link = self._existing_link(remote_name)
+        if not link:
+            try:
+                link = self.upload_public_file(local_path, remote_name)
+            except Exception:
+                # Already uploaded, possibly by another worker
+                link = self._existing_link(remote_name)
+                if not link:
+                    raise
+        if manifest is not None:
+            manifest.set(self.namespace, content_hash, link)
+        return link
+
+    def upload_public_files(self, local_paths, workers=4, deduplicate=False):
+        """
+        Uploads several files concurrently and shares each as a publicly
+        visible file. Child classes whose clients cannot be shared across
+        threads should override this or make upload_public_file thread-safe
+
+        Parameters
+        ----------
+        local_paths : list of str
+            Paths to local files that need to be uploaded
+        workers : int, optional
+            Maximum number of files uploaded at the same time. Default = 4
+        deduplicate : bool, optional
+            Set to True to name the remote files by the hash of their contents
+            and skip uploading files that are already hosted. See
+            upload_deduplicated. Default = False
+
+        Returns
+        -------
+        list of str
+            Publicly visible addresses where the files can be accessed, in
+            the same order as local_paths
+        """
+        local_paths = list(local_paths)
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError('workers must be a positive integer')
+        if deduplicate:
+            # Upload each distinct content only once, even within this batch
+            hashes = [hash_file(path) for path in local_paths]
+            unique = dict(zip(hashes, local_paths))
+            links = dict(zip(unique, self._map(
+                lambda pair: self.upload_deduplicated(
+                    pair[1], content_hash=pair[0]),
+                list(unique.items()), workers)))
+            return [links[content_hash] for content_hash in hashes]
+        return self._map(self.upload_public_file, local_paths, workers)
+
+    @staticmethod
+    def _map(func, items, workers):
+        """
+        Applies func to items on a pool of threads and returns the results
+        in order, raising the first failure
+        """
+        if len(items) < 2 or workers == 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+            return list(pool.map(func, items))
+
+    def close(self):
+        """
+        Releases any resources such as background threads held by this
+        provider
+        """
+        pass
@@ -1,33 +1,108 @@
 import sys
 import os
+import threading
 from warnings import warn
 import json
-from .dbox import DBox
-from .gdrive import GDrive
+from urllib.parse import urlparse
+from .manifest import UploadManifest
+from .retry import RetryingProvider
 
+# (absolute path, modification time, serve) of configuration ->
+# CloudProvider
+_providers = dict()
+_providers_lock = threading.Lock()
 
-def setup_tnail_cloud(cloud_config):
+
+def setup_tnail_cloud(cloud_config, reuse=True, serve=True):
     """
-    Sets up an instance of either the microflow.DBox or microflow.GDrive
-    using the information provided in a JSON file
+    Sets up an instance of either the microflow.DBox, microflow.GDrive, or
+    autoDIET.cloud.local_http.LocalHTTPProvider using the information
+    provided in a JSON file
 
     Parameters
     ----------
     cloud_config : str
         Path to JSON file containing information necessary to set up an
-        instance of microflow.DBox or microflow.GDrive
+        instance of microflow.DBox or microflow.GDrive. For hosting files
+        locally, set "provider" to "local_http" along with "root_dir",
+        "base_url", and optionally "serve", "host" (default "127.0.0.1") and
+        "port" (default = port of "base_url"). "base_url" may be left out
+        when serving without a pool of processes, in which case any free
+        port is used. The optional
+        "manifest_path" entry points to a SQLite database recording the
+        files already hosted, such that identical files are uploaded once
+        Uploads throttled by the provider or failing due to transient errors
+        are tried again up to "max_retries" times (default 5, 0 to disable)
+    reuse : bool, optional
+        Set to True to return the instance already set up by this process
+        for the same configuration file, if it has not changed since. The
+        client, its connections and tokens are then only set up once per
+        process rather than once per call. Default = True
+    serve : bool, optional
+        Set to False to skip serving the directory of a "local_http"
+        provider even if the configuration asks for it. Meant for workers
+        of a process pool whose parent already serves it. Default = True
 
     Returns
     -------
-    microflow.DBox or microflow.GDrive
+    microflow.DBox, microflow.GDrive, or LocalHTTPProvider
+        Wrapped in autoDIET.cloud.retry.RetryingProvider unless retries are
+        disabled
     """
     if not os.path.exists(cloud_config):
         raise FileNotFoundError('CloudProvider configuration path: {} does not'
                                 ' exist'.format(cloud_config))
 
+    if not reuse:
+        return _setup_tnail_cloud(cloud_config, serve=serve)
+
+    key = (os.path.abspath(cloud_config), os.stat(cloud_config).st_mtime_ns,
+           serve)
+    # Hold the lock while setting up so that concurrent callers share one
+    # instance rather than each performing the handshake
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None:
+            provider = _setup_tnail_cloud(cloud_config, serve=serve)
+            if provider is not None:
+                _providers[key] = provider
+        return provider
+
+
+def clear_tnail_clouds():
+    """
+    Closes and forgets every CloudProvider set up via setup_tnail_cloud
+    """
+    with _providers_lock:
+        for provider in _providers.values():
+            provider.close()
+        _providers.clear()
+
+
+def _setup_tnail_cloud(cloud_config, serve=True):
+    """
+    Reads the configuration file and sets up a new CloudProvider
+    """
     with open(cloud_config) as file_handle:
         config = json.load(file_handle)
 
+    # Optional manifest of files already hosted on the cloud
+    manifest_path = config.pop("manifest_path", None)
+    max_retries = config.pop("max_retries", 5)
+    cloud = _make_provider(config, serve=serve)
+    if cloud is None:
+        return None
+    if manifest_path:
+        cloud.manifest = UploadManifest(manifest_path)
+    if max_retries:
+        cloud = RetryingProvider(cloud, max_retries=max_retries)
+    return cloud
+
+
+def _make_provider(config, serve=True):
+    """
+    Sets up a new CloudProvider from the contents of the configuration file
+    """
     # First figure out the cloud provider
     provider = config.pop("provider", None)
     if not isinstance(provider, str):
@@ -35,6 +110,7 @@ def setup_tnail_cloud(cloud_config):
     provider = provider.lower()
 
     if provider == "google_drive":
+        from .gdrive import GDrive
         token_path = config.pop("token_path", None)
         dest_dir_id = config.pop("drive_directory", None)
         if token_path:
@@ -48,6 +124,7 @@ def setup_tnail_cloud(cloud_config):
                                                 exc_tb.tb_lineno))
             return None
     elif provider == "dropbox":
+        from .dbox import DBox
         acc_token = config.pop("access_token", None)
         if acc_token:
             try:
@@ -58,6 +135,25 @@ def setup_tnail_cloud(cloud_config):
                 warn("Could not set up Google Drive\n"
                      "{}: '{}'\nFrom:{}".format(exc_type, fname,
                                                 exc_tb.tb_lineno))
+    elif provider == "local_http":
+        from .local_http import LocalHTTPProvider
+        root_dir = config.pop("root_dir", None)
+        base_url = config.pop("base_url", None)
+        serve_dir = config.pop("serve", False)
+        if root_dir and (base_url or (serve_dir and serve)):
+            cloud = LocalHTTPProvider(root_dir, base_url)
+            if serve_dir and serve:
+                port = 0
+                if base_url:
+                    parsed = urlparse(base_url)
+                    port = parsed.port or (443 if parsed.scheme == 'https'
+                                           else 80)
+                cloud.serve(host=config.pop("host", '127.0.0.1'),
+                            port=config.pop("port", port))
+            return cloud
+        warn('Both "root_dir" and "base_url" are required for local_http '
+             'unless serving from this process')
+        return None
     else:
         raise NotImplementedError("Do not know how to handle: "
                                   "{}".format(provider))
@@ -1,11 +1,44 @@
 import os
+import threading
 import dropbox
+import requests
 from .cloud_provider import CloudProvider
 
+_session_lock = threading.Lock()
+_shared_session = None
+
+
+def get_shared_session(max_connections=8):
+    """
+    Returns the HTTP session shared by all instances of DBox in this process
+    such that connections to Dropbox are kept alive and reused rather than
+    opening a new connection (and TLS handshake) per client
+
+    Parameters
+    ----------
+    max_connections : int, optional
+        Size of the connection pool. Only used when the session is created.
+        Default = 8
+
+    Returns
+    -------
+    requests.Session
+        Session to pass to dropbox.Dropbox
+    """
+    global _shared_session
+    with _session_lock:
+        if _shared_session is None:
+            _shared_session = dropbox.create_session(
+                max_connections=max_connections)
+        return _shared_session
+
 
 class DBox(CloudProvider):
+    # Uploads to a path that is already taken fail with a conflict
+    lookup_before_upload = False
 
-    def __init__(self, access_token):
+    def __init__(self, access_token, chunk_size=8 * 1024 ** 2, max_retries=3,
+                 session=None):
         """
         Initializes class
 
@@ -13,13 +46,95 @@ class DBox(CloudProvider):
         ----------
         access_token : str
             Dropbox access token
+        chunk_size : int, optional
+            Files larger than this many bytes are streamed through an upload
+            session in chunks of this size, such that memory use does not
+            grow with the size of the file. Default = 8 MB
+        max_retries : int, optional
+            Number of times a chunk is sent again after a network error
+            before giving up. Default = 3
+        session : requests.Session, optional
+            HTTP session to send requests through.
+            Default = session shared by all instances in this process
         """
         if not isinstance(access_token, str):
             raise TypeError('Access token must be a string')
         access_token = access_token.strip()
         if len(access_token) < 1:
             raise ValueError("Access token must not be empty")
-        self.__service__ = dropbox.Dropbox(access_token)
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise ValueError('chunk_size must be a positive integer')
+        if chunk_size > 150 * 1024 ** 2:
+            raise ValueError('Dropbox does not accept chunks larger than '
+                             '150 MB')
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        if session is None:
+            session = get_shared_session()
+        self.__service__ = dropbox.Dropbox(access_token, session=session)
+        self._account_id = None
+
+    @staticmethod
+    def _correct_offset(exc):
+        """
+        Returns the offset that Dropbox expects if the given error was caused
+        by sending a chunk at the wrong offset, e.g. because a chunk whose
+        response was lost had in fact been received. None otherwise
+        """
+        error = getattr(exc, 'error', None)
+        if error is not None and hasattr(error, 'is_lookup_failed') and \
+                error.is_lookup_failed():
+            error = error.get_lookup_failed()
+        if error is not None and hasattr(error, 'is_incorrect_offset') and \
+                error.is_incorrect_offset():
+            return error.get_incorrect_offset().correct_offset
+        return None
+
+    def _upload_session(self, local_path, dest_path):
+        """
+        Streams the provided file to Dropbox in chunks via an upload session.
+        Chunks that fail due to network errors are sent again, resuming from
+        the offset that Dropbox has actually received
+        """
+        file_size = os.path.getsize(local_path)
+        with open(local_path, "rb") as file_handle:
+            session = self.__service__.files_upload_session_start(
+                file_handle.read(self.chunk_size))
+            cursor = dropbox.files.UploadSessionCursor(
+                session_id=session.session_id, offset=file_handle.tell())
+            commit = dropbox.files.CommitInfo(path=dest_path)
+            retries = 0
+            while True:
+                remaining = file_size - cursor.offset
+                file_handle.seek(cursor.offset)
+                chunk = file_handle.read(min(self.chunk_size, remaining))
+                try:
+                    if remaining <= self.chunk_size:
+                        return self.__service__.files_upload_session_finish(
+                            chunk, cursor, commit)
+                    self.__service__.files_upload_session_append_v2(chunk,
+                                                                    cursor)
+                    cursor.offset += len(chunk)
+                    retries = 0
+                except dropbox.exceptions.ApiError as exc:
+                    correct_offset = self._correct_offset(exc)
+                    if correct_offset is None:
+                        raise
+                    if correct_offset > cursor.offset:
+                        # The previous chunk had been received after all
+                        retries = 0
+                    elif retries >= self.max_retries:
+                        raise
+                    else:
+                        retries += 1
+                    cursor.offset = correct_offset
+                except (requests.exceptions.ConnectionError,
+                        requests.exceptions.Timeout):
+                    if retries >= self.max_retries:
+                        raise
+                    # Dropbox reports the correct offset on the next attempt
+                    # if this chunk was received after all
+                    retries += 1
 
     def upload_public_file(self, local_path, dest_path=None):
         """
@@ -42,12 +157,50 @@ class DBox(CloudProvider):
         if not dest_path:
             _, file_name = os.path.split(local_path)
             dest_path = '/' + file_name
+        elif not dest_path.startswith('/'):
+            dest_path = '/' + dest_path
 
-        with open(local_path, "rb") as file_handle:
-            _ = self.__service__.files_upload(file_handle.read(), dest_path)
+        if os.path.getsize(local_path) > self.chunk_size:
+            self._upload_session(local_path, dest_path)
+        else:
+            with open(local_path, "rb") as file_handle:
+                _ = self.__service__.files_upload(file_handle.read(),
+                                                  dest_path)
         share_metadata = self.__service__.sharing_create_shared_link_with_settings(dest_path,
                                                                                    settings=dropbox.sharing.SharedLinkSettings())
+        return self._embed_link(share_metadata.url)
+
+    @staticmethod
+    def _embed_link(url):
         # The shareable link takes one to dropbox instead of the file itself:
-        embed_link = share_metadata.url.replace("www.dropbox",
-                                                "dl.dropboxusercontent")
-        return embed_link
+        return url.replace("www.dropbox", "dl.dropboxusercontent")
+
+    @property
+    def namespace(self):
+        """
+        Identifies the Dropbox account that files are uploaded to
+        """
+        if self._account_id is None:
+            account = self.__service__.users_get_current_account()
+            self._account_id = account.account_id
+        return 'dropbox:' + self._account_id
+
+    def _existing_link(self, remote_name):
+        """
+        Returns the public link of the file at the given path in Dropbox if
+        it exists, creating the link if necessary
+        """
+        dest_path = '/' + remote_name.lstrip('/')
+        try:
+            self.__service__.files_get_metadata(dest_path)
+        except dropbox.exceptions.ApiError:
+            # Typically because nothing exists at this path
+            return None
+        links = self.__service__.sharing_list_shared_links(
+            path=dest_path, direct_only=True).links
+        if links:
+            return self._embed_link(links[0].url)
+        service = self.__service__
+        share_metadata = service.sharing_create_shared_link_with_settings(
+            dest_path, settings=dropbox.sharing.SharedLinkSettings())
+        return self._embed_link(share_metadata.url)
@@ -1,5 +1,8 @@
 import os.path
+import datetime
 import mimetypes
+import threading
+from warnings import warn
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -9,9 +12,41 @@ from google.oauth2.credentials import Credentials
 from .cloud_provider import CloudProvider
 
 
+class _DiscoveryCache(object):
+    """
+    In-memory cache of discovery documents shared by every Drive service
+    built in this process, such that the document is only fetched once
+    """
+
+    def __init__(self):
+        self._docs = dict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            return self._docs.get(url)
+
+    def set(self, url, content):
+        with self._lock:
+            self._docs[url] = content
+
+
+_discovery_cache = _DiscoveryCache()
+
+
+def _build_service(creds):
+    """
+    Builds an instance of the Google Drive API from the cached discovery
+    document
+    """
+    return build('drive', 'v3', credentials=creds, cache_discovery=True,
+                 cache=_discovery_cache)
+
+
 class GDrive(CloudProvider):
 
-    def __init__(self, token_json_path, dest_dir_id=None):
+    def __init__(self, token_json_path, dest_dir_id=None,
+                 chunk_size=8 * 1024 ** 2, num_retries=3, refresh_margin=300):
         """
         Gets an authenticated instance of the Google Drive API
 
@@ -22,11 +57,30 @@ class GDrive(CloudProvider):
         dest_dir_id : str, Optional.
             ID of the Google drive folder that is already publicly visible
             If not provided, files will be placed in root of Google Drive
+        chunk_size : int, optional
+            Files are uploaded via resumable uploads in chunks of this many
+            bytes, such that memory use does not grow with the size of the
+            file. Must be a multiple of 256 KB. Default = 8 MB
+        num_retries : int, optional
+            Number of times a chunk is sent again, with exponential backoff,
+            after a network or server error. The upload resumes from the last
+            byte Google Drive received. Default = 3
+        refresh_margin : float, optional
+            Number of seconds before the access token expires at which it is
+            refreshed in the background, such that uploads never wait on a
+            token refresh. Set to None to only refresh tokens on demand.
+            Default = 300
 
         Returns
         -------
         googleapiclient.discovery.Resource
         """
+        if not isinstance(chunk_size, int) or chunk_size < 1 or \
+                chunk_size % (256 * 1024):
+            raise ValueError('chunk_size must be a positive multiple of '
+                             '256 KB')
+        self.chunk_size = chunk_size
+        self.num_retries = num_retries
         SCOPES = ['https://www.googleapis.com/auth/drive']
         creds = None
         # The file token.json stores the user's access and refresh tokens, and is
@@ -47,9 +101,97 @@ class GDrive(CloudProvider):
             with open(token_json_path, 'w') as token:
                 token.write(creds.to_json())
 
-        self.__service__ = build('drive', 'v3', credentials=creds)
+        self.__creds = creds
+        self.__token_path = token_json_path
+        self.__refresh_lock = threading.Lock()
+        self.__timer = None
+        self.__closed = False
+        self.refresh_margin = refresh_margin
+        self.__service__ = _build_service(creds)
+        # The HTTP client under the service is not thread-safe
+        self.__local = threading.local()
+        self.__local.service = self.__service__
         # TODO: Don't require folder itself to be publicly visible
         self.dest_dir_id = dest_dir_id
+        if refresh_margin is not None:
+            self._schedule_refresh()
+
+    def _schedule_refresh(self, min_delay=30):
+        """
+        Schedules a background refresh of the access token shortly before it
+        expires
+        """
+        creds = self.__creds
+        if creds.expiry is None or not creds.refresh_token:
+            return
+        # Expiry of Google credentials is a naive datetime in UTC
+        delay = (creds.expiry - datetime.datetime.utcnow()).total_seconds()
+        delay = max(delay - self.refresh_margin, min_delay)
+        with self.__refresh_lock:
+            if self.__closed:
+                return
+            self.__timer = threading.Timer(delay, self._refresh_token)
+            self.__timer.daemon = True
+            self.__timer.start()
+
+    def _refresh_token(self):
+        """
+        Refreshes the access token and saves it for the next run
+        """
+        try:
+            with self.__refresh_lock:
+                self.__creds.refresh(Request())
+                with open(self.__token_path, 'w') as token:
+                    token.write(self.__creds.to_json())
+        except Exception as exc:
+            # Requests still refresh expired tokens on demand
+            warn('Could not refresh Google Drive token in the background\n'
+                 '{}: {}'.format(type(exc).__name__, exc))
+        self._schedule_refresh()
+
+    def close(self):
+        """
+        Stops refreshing the access token in the background
+        """
+        with self.__refresh_lock:
+            self.__closed = True
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+
+    def _thread_service(self):
+        """
+        Returns the instance of the Google Drive API for the current thread
+        """
+        service = getattr(self.__local, 'service', None)
+        if service is None:
+            service = _build_service(self.__creds)
+            self.__local.service = service
+        return service
+
+    @property
+    def namespace(self):
+        """
+        Identifies the Google Drive folder that files are uploaded to
+        """
+        return 'google_drive:{}'.format(self.dest_dir_id)
+
+    def _existing_link(self, remote_name):
+        """
+        Returns the public link of the file with the given name within the
+        destination folder if it exists
+        """
+        if not isinstance(self.dest_dir_id, str):
+            return None
+        query = "name = '{}' and '{}' in parents and trashed = false" \
+                "".format(remote_name.replace("'", "\\'"), self.dest_dir_id)
+        resp = self._thread_service().files().list(q=query, fields="files(id)",
+                                                   pageSize=1).execute()
+        files = resp.get('files', [])
+        if not files:
+            return None
+        return "https://drive.google.com/uc?export=view&id={}" \
+               "".format(files[0]['id'])
 
     def upload_public_file(self, src_path, dest_name=None):
         """
@@ -87,12 +229,16 @@ class GDrive(CloudProvider):
         file_metadata = {"name": dest_name,
                          "parents": [self.dest_dir_id]}
         mime_type, _ = mimetypes.guess_type(src_path)
-        media = MediaFileUpload(src_path, mimetype=mime_type)
-        resp = self.__service__.files().create(
+        media = MediaFileUpload(src_path, mimetype=mime_type,
+                                chunksize=self.chunk_size, resumable=True)
+        request = self._thread_service().files().create(
                                     body=file_metadata,
                                     media_body=media,
                                     fields="id",
-                                    ).execute()
+                                    )
+        resp = None
+        while resp is None:
+            _, resp = request.next_chunk(num_retries=self.num_retries)
 
         # TODO: Implement link generation for individual file
 
@@ -0,0 +1,175 @@
+import os
+import shutil
+import tempfile
+import threading
+from functools import partial
+from urllib.parse import quote
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+from .cloud_provider import CloudProvider
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        # Do not print a line per request
+        pass
+
+
+class LocalHTTPProvider(CloudProvider):
+
+    def __init__(self, root_dir, base_url=None):
+        """
+        Hosts files by placing them in a directory tree that is served over
+        HTTP, e.g. by an on-site web server or via serve. Useful where
+        external services are not reachable or their rate limits get in the
+        way, such as in air-gapped deployments or when load-testing ingest.
+
+        Parameters
+        ----------
+        root_dir : str
+            Directory that is served over HTTP. Created if it does not exist
+        base_url : str, optional
+            URL under which the contents of root_dir are served, such as
+            "http://myserver.ornl.gov/thumbnails". Default = address that
+            serve listens on. serve must then be called before uploading
+        """
+        if not isinstance(root_dir, str):
+            raise TypeError('root_dir must be a string')
+        if base_url is not None:
+            if not isinstance(base_url, str):
+                raise TypeError('base_url must be a string')
+            base_url = base_url.strip().rstrip('/')
+            if len(base_url) < 1:
+                raise ValueError('base_url must not be empty')
+        os.makedirs(root_dir, exist_ok=True)
+        self.root_dir = os.path.abspath(root_dir)
+        self.base_url = base_url
+        self._server = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'LocalHTTPProvider({} at {})'.format(self.root_dir,
+                                                     self.base_url)
+
+    @property
+    def namespace(self):
+        """
+        Identifies the location that files are uploaded to
+        """
+        return 'local_http:{}'.format(self.base_url)
+
+    def _local_path(self, dest_path):
+        """
+        Returns the path within root_dir for the given destination, refusing
+        destinations that would end up outside of it
+        """
+        dest_path = dest_path.replace('\\', '/').lstrip('/')
+        local_path = os.path.abspath(os.path.join(self.root_dir, dest_path))
+        if os.path.commonpath([local_path, self.root_dir]) != self.root_dir \
+                or local_path == self.root_dir:
+            raise ValueError('dest_path must be within root_dir: '
+                             '{}'.format(dest_path))
+        return local_path, dest_path
+
+    def _url(self, dest_path):
+        if self.base_url is None:
+            raise ValueError('base_url was not provided and root_dir is not '
+                             'being served yet')
+        return self.base_url + '/' + quote(dest_path)
+
+    def upload_public_file(self, local_path, dest_path=None):
+        """
+        Copies the provided file into the served directory tree
+
+        Parameters
+        ----------
+        local_path : str
+            Path to local file that needs to be hosted
+        dest_path : str, Optional
+            Path relative to root_dir to place the file at.
+            Default = name of the local file
+
+        Returns
+        -------
+        str :
+            Publicly visible address where the file can be accessed
+        """
+        if not dest_path:
+            dest_path = os.path.basename(local_path)
+        target, dest_path = self._local_path(dest_path)
+        folder = os.path.dirname(target)
+        os.makedirs(folder, exist_ok=True)
+        # Copy to a temporary file first such that the web server never
+        # serves a partially written file
+        handle, temp_path = tempfile.mkstemp(dir=folder, prefix='.upload_')
+        os.close(handle)
+        try:
+            shutil.copyfile(local_path, temp_path)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, target)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return self._url(dest_path)
+
+    def _existing_link(self, remote_name):
+        """
+        Returns the URL of the file with the given name if it is already
+        present in the served directory tree
+        """
+        target, dest_path = self._local_path(remote_name)
+        if os.path.isfile(target):
+            return self._url(dest_path)
+        return None
+
+    def serve(self, host='127.0.0.1', port=0):
+        """
+        Serves root_dir over HTTP from a background thread. Only intended for
+        testing and small deployments. Use a proper web server otherwise.
+        Call this once, from the parent process, when ingesting with a pool
+        of processes
+
+        Parameters
+        ----------
+        host : str, optional
+            Address to listen on. Default = "127.0.0.1", which only serves
+            this machine. Use "" to listen on all interfaces
+        port : int, optional
+            Port to listen on. Default = 0, which picks any free port.
+            base_url is set to the address of the server if it was not
+            provided
+
+        Returns
+        -------
+        http.server.HTTPServer
+            The running server
+        """
+        with self._lock:
+            if self._server is not None:
+                return self._server
+            handler = partial(_QuietHandler, directory=self.root_dir)
+            self._server = _ThreadingHTTPServer((host, port), handler)
+            if self.base_url is None:
+                self.base_url = 'http://{}:{}'.format(
+                    host or 'localhost', self._server.server_address[1])
+            thread = threading.Thread(target=self._server.serve_forever,
+                                      name='LocalHTTPProvider', daemon=True)
+            thread.start()
+            return self._server
+
+    def close(self):
+        """
+        Stops serving root_dir if it was being served via serve
+        """
+        with self._lock:
+            if self._server is not None:
+                self._server.shutdown()
+                self._server.server_close()
+                self._server = None
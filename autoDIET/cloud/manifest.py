@@ -0,0 +1,112 @@
+import time
+import sqlite3
+import threading
+
+
+class UploadManifest(object):
+
+    def __init__(self, db_path):
+        """
+        Local record of files already hosted on the cloud, keyed by the hash
+        of their contents. Checking the manifest before uploading avoids
+        uploading identical files (e.g. blank frames) again and spending
+        requests on the quota of the cloud provider.
+
+        Parameters
+        ----------
+        db_path : str
+            Path to the SQLite database file. Created if it does not exist
+        """
+        if not isinstance(db_path, str):
+            raise TypeError('db_path must be a string')
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS uploads ("
+                               "namespace TEXT NOT NULL, "
+                               "content_hash TEXT NOT NULL, "
+                               "link TEXT NOT NULL, "
+                               "updated REAL, "
+                               "PRIMARY KEY (namespace, content_hash))")
+
+    def __repr__(self):
+        return 'UploadManifest({})'.format(self.db_path)
+
+    def get(self, namespace, content_hash):
+        """
+        Returns the public link of a file already uploaded
+
+        Parameters
+        ----------
+        namespace : str
+            Identifies the cloud account and location the file was uploaded to
+        content_hash : str
+            Hash of the contents of the file
+
+        Returns
+        -------
+        str
+            Publicly visible address of the file. None if not uploaded yet
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT link FROM uploads WHERE "
+                                     "namespace = ? AND content_hash = ?",
+                                     (namespace, content_hash)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def set(self, namespace, content_hash, link):
+        """
+        Records the public link of a file that was uploaded
+
+        Parameters
+        ----------
+        namespace : str
+            Identifies the cloud account and location the file was uploaded to
+        content_hash : str
+            Hash of the contents of the file
+        link : str
+            Publicly visible address of the file
+        """
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO uploads (namespace, "
+                               "content_hash, link, updated) VALUES "
+                               "(?, ?, ?, ?)",
+                               (namespace, content_hash, link, time.time()))
+
+    def forget(self, namespace, content_hash=None):
+        """
+        Removes entries, e.g. because the files were deleted from the cloud
+
+        Parameters
+        ----------
+        namespace : str
+            Identifies the cloud account and location the file was uploaded to
+        content_hash : str, optional
+            Hash of the contents of the file. If not provided, all entries
+            within the namespace are removed
+        """
+        with self._lock, self._conn:
+            if content_hash is None:
+                self._conn.execute("DELETE FROM uploads WHERE namespace = ?",
+                                   (namespace,))
+            else:
+                self._conn.execute("DELETE FROM uploads WHERE namespace = ? "
+                                   "AND content_hash = ?",
+                                   (namespace, content_hash))
+
+    def close(self):
+        """
+        Closes the connection to the database
+        """
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
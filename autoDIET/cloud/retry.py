@@ -0,0 +1,244 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+from .cloud_provider import CloudProvider
+
+# Status codes with which providers tell us to slow down
+_THROTTLE_CODES = (429, 503)
+
+
+def _status_code(exc):
+    """
+    Returns the HTTP status code carried by an exception raised by the
+    Dropbox, Google, or requests libraries. None if there is none
+    """
+    if type(exc).__name__ == 'RateLimitError':
+        # dropbox.exceptions.RateLimitError does not carry a status code
+        return 429
+    for owner in (exc, getattr(exc, 'resp', None),
+                  getattr(exc, 'response', None)):
+        if owner is None:
+            continue
+        for attr in ('status_code', 'status'):
+            code = getattr(owner, attr, None)
+            if code is not None:
+                try:
+                    return int(code)
+                except (TypeError, ValueError):
+                    pass
+    return None
+
+
+def _retry_after(exc):
+    """
+    Returns the number of seconds the provider asked us to wait before trying
+    again, if any
+    """
+    # dropbox.exceptions.RateLimitError
+    backoff = getattr(exc, 'backoff', None)
+    if backoff is not None:
+        return float(backoff)
+    for owner in (exc, getattr(exc, 'resp', None),
+                  getattr(exc, 'response', None)):
+        headers = getattr(owner, 'headers', None)
+        if headers is None and isinstance(owner, dict):
+            # httplib2 responses are dictionaries of headers
+            headers = owner
+        if headers is None:
+            continue
+        value = headers.get('retry-after') or headers.get('Retry-After')
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+        try:
+            # HTTP date
+            when = parsedate_to_datetime(value)
+            return max(0.0, when.timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def _is_transient(exc):
+    """
+    Whether or not the exception is a network error worth retrying
+    """
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    # requests, urllib3, and httplib2 errors without importing them
+    return type(exc).__name__ in ('ConnectionError', 'Timeout', 'ReadTimeout',
+                                  'ConnectTimeout', 'ProtocolError',
+                                  'ServerNotFoundError', 'timeout')
+
+
+class AdaptiveLimit(object):
+
+    def __init__(self, initial=4, minimum=1, maximum=16):
+        """
+        Limits the number of concurrent operations, adjusting the limit via
+        additive increase / multiplicative decrease (as in TCP congestion
+        control): each success raises the limit by roughly one per window of
+        operations while each throttling response halves it.
+
+        Parameters
+        ----------
+        initial : int, optional
+            Initial limit. Default = 4
+        minimum : int, optional
+            Limit never drops below this. Default = 1
+        maximum : int, optional
+            Limit never grows beyond this. Default = 16
+        """
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError('Limits must satisfy 1 <= minimum <= initial <= '
+                             'maximum')
+        self.minimum = minimum
+        self.maximum = maximum
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        """
+        Current number of operations allowed at the same time
+        """
+        return int(self._limit)
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, outcome=None):
+        """
+        Frees up a slot
+
+        Parameters
+        ----------
+        outcome : str, optional
+            "success" to increase the limit, "throttled" to decrease it.
+            Default = leave the limit as is
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if outcome == 'success':
+                self._limit = min(self.maximum,
+                                  self._limit + 1.0 / self._limit)
+            elif outcome == 'throttled':
+                self._limit = max(self.minimum, self._limit / 2)
+            self._cond.notify_all()
+
+
+class RetryingProvider(CloudProvider):
+
+    def __init__(self, provider, max_retries=5, base_delay=1.0,
+                 max_delay=60.0, limit=None):
+        """
+        Wraps a CloudProvider such that uploads throttled by the provider
+        (HTTP 429 / 503), failing due to server errors (HTTP 5xx) or network
+        errors are tried again rather than failing the ingest. Waits between
+        attempts follow the Retry-After the provider asks for, or else grow
+        exponentially with random jitter. The number of uploads in flight
+        adapts to how often the provider throttles us, keeping throughput as
+        high as the provider allows.
+
+        Parameters
+        ----------
+        provider : CloudProvider
+            Provider to wrap
+        max_retries : int, optional
+            Number of times an upload is tried again before giving up.
+            Default = 5
+        base_delay : float, optional
+            Wait in seconds before the first retry, doubled for every
+            subsequent retry. Default = 1
+        max_delay : float, optional
+            Longest wait in seconds between two attempts. Default = 60
+        limit : AdaptiveLimit, optional
+            Limit on concurrent uploads. Default = AdaptiveLimit()
+        """
+        if not isinstance(provider, CloudProvider):
+            raise TypeError('provider must be a CloudProvider')
+        if not isinstance(max_retries, int) or max_retries < 0:
+            raise ValueError('max_retries must be a non-negative integer')
+        self.provider = provider
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        if limit is None:
+            limit = AdaptiveLimit()
+        self.limit = limit
+
+    def __repr__(self):
+        return 'RetryingProvider({})'.format(self.provider)
+
+    @property
+    def manifest(self):
+        return self.provider.manifest
+
+    @manifest.setter
+    def manifest(self, manifest):
+        self.provider.manifest = manifest
+
+    @property
+    def namespace(self):
+        return self.provider.namespace
+
+    @property
+    def lookup_before_upload(self):
+        return self.provider.lookup_before_upload
+
+    def _delay(self, attempt, exc):
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Full jitter keeps workers that were throttled together from
+        # retrying together
+        return random.uniform(0, min(self.max_delay,
+                                     self.base_delay * 2 ** attempt))
+
+    def _call(self, func, *args, **kwargs):
+        """
+        Calls func with retries while holding a slot of the adaptive limit
+        """
+        attempt = 0
+        while True:
+            self.limit.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as exc:
+                status = _status_code(exc)
+                throttled = status in _THROTTLE_CODES
+                retryable = throttled or _is_transient(exc) or \
+                    (status is not None and status >= 500)
+                self.limit.release('throttled' if throttled or
+                                   (status is not None and status >= 500)
+                                   else None)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                time.sleep(self._delay(attempt, exc))
+                attempt += 1
+                continue
+            self.limit.release('success')
+            return result
+
+    def upload_public_file(self, local_path, dest_path=None):
+        """
+        Same as upload_public_file of the wrapped provider but tried again
+        if throttled or if a transient error occurs
+        """
+        return self._call(self.provider.upload_public_file, local_path,
+                          dest_path)
+
+    def _existing_link(self, remote_name):
+        return self._call(self.provider._existing_link, remote_name)
+
+    def close(self):
+        self.provider.close()
@@ -2,15 +2,159 @@ import os
 import json
 from warnings import warn
 from datafed.CommandLib import API
-from .utils.datafed_utils import list_all_items_in_coll
+from .utils.datafed_utils import get_collection_index, thread_local_api, \
+    api_settings, CollectionListingCache
 from .utils.dict_utils import pretty_print_dict
+from .utils.parallel_utils import make_executor
+from .utils.thumbnail_cache import ThumbnailCache
 from .cloud.cloud_provider import CloudProvider
 from .cloud.cloud_spawn import setup_tnail_cloud
-from .ingest import upload_to_datafed
+from .ingest import upload_to_datafed, upload_batch_to_datafed
+from .raw_data.parser import connect_tika_server
+from .resources import open_cloud, open_sync_state, open_scratch, \
+    open_thumbnail_cache, open_thumbnail_pipeline, open_tika_server, \
+    open_listing_pool, release_owned
+
+
+def _ingest_file(file_path, web_md, coll_id, link_data=True, scratch=None,
+                 cloud=None, verbose=False, tnail_cache=None,
+                 tnail_pipeline=None, endpoint=None, context=None,
+                 tika_url=None):
+    """
+    Ingests a single data file from within a worker of a thread or process
+    pool. Each worker talks to DataFed through its own instance of the API,
+    set to the endpoint and context of the caller's instance. Workers in
+    other processes use the Apache Tika server at tika_url, if provided.
+    """
+    if tika_url:
+        connect_tika_server(tika_url, verbose=verbose)
+    # Cloud providers and caches cannot be sent to other processes, only the
+    # paths to their configuration
+    if cloud and not isinstance(cloud, CloudProvider):
+        # Files are served, if at all, by the process that started the crawl
+        cloud = setup_tnail_cloud(cloud, serve=False)
+    if tnail_cache and not isinstance(tnail_cache, ThumbnailCache):
+        tnail_cache = ThumbnailCache(tnail_cache)
+    df_api = thread_local_api(endpoint=endpoint, context=context)
+    return upload_to_datafed(file_path, web_md, coll_id,
+                             df_api=df_api, link_data=link_data,
+                             scratch=scratch, cloud=cloud, verbose=verbose,
+                             tnail_cache=tnail_cache,
+                             tnail_pipeline=tnail_pipeline)
+
+
+def _ingest_batch(file_paths, web_md, coll_id, link_data=True, scratch=None,
+                  cloud=None, verbose=False, tnail_cache=None,
+                  tnail_pipeline=None, endpoint=None, context=None,
+                  tika_url=None):
+    """
+    Same as _ingest_file but creates the records for several data files via
+    a single request to DataFed
+    """
+    if tika_url:
+        connect_tika_server(tika_url, verbose=verbose)
+    if cloud and not isinstance(cloud, CloudProvider):
+        # Files are served, if at all, by the process that started the crawl
+        cloud = setup_tnail_cloud(cloud, serve=False)
+    if tnail_cache and not isinstance(tnail_cache, ThumbnailCache):
+        tnail_cache = ThumbnailCache(tnail_cache)
+    df_api = thread_local_api(endpoint=endpoint, context=context)
+    return upload_batch_to_datafed(file_paths, web_md, coll_id,
+                                   df_api=df_api, link_data=link_data,
+                                   scratch=scratch, cloud=cloud,
+                                   verbose=verbose,
+                                   tnail_cache=tnail_cache,
+                                   tnail_pipeline=tnail_pipeline)
+
+
+def _record_batch(batch, record_ids, coll_id, state=None,
+                  listing_cache=None):
+    """
+    Records the (file path, item name) pairs of a batch along with the IDs
+    of their newly created records in the local sync state and the cache of
+    collection listings, if any
+    """
+    for (file_path, item_name), record_id in zip(batch, record_ids):
+        if state:
+            state.set_item(file_path, coll_id, record_id)
+        if listing_cache:
+            listing_cache.add_item(coll_id, item_name, record_id)
+
+
+def _warn_on_batch_failure(batch, coll_id, state=None, listing_cache=None):
+    """
+    Same as _warn_on_failure but for a batch of files ingested together
+    """
+    def _callback(future):
+        exc = future.exception()
+        if exc is not None:
+            warn('Could not ingest {}\n{}: {}'
+                 ''.format([file_path for file_path, _ in batch],
+                           type(exc).__name__, exc))
+            return
+        _record_batch(batch, future.result(), coll_id, state=state,
+                      listing_cache=listing_cache)
+    return _callback
+
+
+def _submit_batch(batch, web_md, coll_id, df_api=None, executor=None,
+                  state=None, listing_cache=None, tika_url=None, **kwargs):
+    """
+    Ingests a batch of (file path, item name) pairs, via the executor if
+    there is one. Keyword arguments are passed on to upload_batch_to_datafed
+    """
+    file_paths = [file_path for file_path, _ in batch]
+    if executor:
+        future = executor.submit(_ingest_batch, file_paths, web_md, coll_id,
+                                 tika_url=tika_url,
+                                 **dict(kwargs, **api_settings(df_api)))
+        future.add_done_callback(
+            _warn_on_batch_failure(batch, coll_id, state=state,
+                                   listing_cache=listing_cache))
+        return
+    record_ids = upload_batch_to_datafed(file_paths, web_md, coll_id,
+                                         df_api=df_api, **kwargs)
+    _record_batch(batch, record_ids, coll_id, state=state,
+                  listing_cache=listing_cache)
+
+
+def _warn_on_failure(file_path, coll_id, state=None, listing_cache=None,
+                     item_name=None):
+    """
+    Returns a callback that warns if ingesting the given file failed in a
+    worker rather than letting one bad file abort the rest of the crawl.
+    Successfully ingested files are recorded in the local sync state and the
+    cache of collection listings, if any
+    """
+    def _callback(future):
+        exc = future.exception()
+        if exc is not None:
+            warn('Could not ingest {}\n{}: {}'
+                 ''.format(file_path, type(exc).__name__, exc))
+            return
+        if state:
+            state.set_item(file_path, coll_id, future.result())
+        if listing_cache:
+            listing_cache.add_item(coll_id, item_name, future.result())
+    return _callback
+
+
+def _is_within(path, root):
+    """
+    Whether or not path is root itself or lies anywhere underneath it,
+    regardless of whether either is relative or reached via symbolic links
+    """
+    path = os.path.realpath(path)
+    root = os.path.realpath(root)
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
 
 
 def process_posix_coll(dir_path, coll_id, df_api=None, link_data=True,
-                       scratch=None, cloud=None, verbose=False):
+                       scratch=None, cloud=None, verbose=False, workers=1,
+                       pool='thread', executor=None, state=None,
+                       file_names=None, tnail_cache=None,
+                       tnail_pipeline=None, listing_cache=None,
+                       batch_size=1, listing_pool=None):
     """
     Ingests the content of a single dataset's worth of files (uploaded via
     DataFlow) into DataFed.
@@ -27,77 +171,214 @@ def process_posix_coll(dir_path, coll_id, df_api=None, link_data=True,
         DataFlow will be ingested
     df_api : datafed.CommandLib.API instance, Optional
         Instance of the DataFed CommandLib API
+        Workers in a pool use instances of their own, set up from the default
+        configuration but with the endpoint and context of this instance
     link_data : bool, optional
         Set to True to have the data record reference the data file in its
         present location. Set to False to push the data file to DataFed
-    scratch : str, optional.
+    scratch : str or autoDIET.utils.scratch.ScratchSpace, optional.
             path to directory that can be used for scratch purposes such as
-            storing thumbnails or other temporary needs.
+            storing thumbnails or other temporary needs. A ScratchSpace is
+            created within the directory such that concurrent ingests never
+            collide on file names and nothing is left behind, unless
+            executor is provided. Provide a ScratchSpace instead to limit
+            the space used or to place thumbnails on tmpfs.
             Default = same directory where raw data is located
-    cloud : CloudProvider, Optional
-        Initialized instance of DBox or GDrive
+    cloud : str or CloudProvider, Optional
+        Initialized instance of DBox or GDrive.
+        When using a pool of processes, provide the path to the JSON file
+        containing the configuration for the cloud provider instead
     verbose : bool, optional
         Set to True to print statements for debugging purposes. Leave False
         otherwise. Default = False
+    workers : int, optional
+        Number of files to ingest concurrently. Default = 1 - one at a time
+    pool : str, optional
+        Set to "thread" to ingest files using a pool of threads or "process"
+        to use a pool of processes. Ignored if executor is provided.
+        Default = "thread"
+    executor : autoDIET.utils.parallel_utils.BoundedExecutor, optional
+        Existing pool of workers shared across collections. If provided, this
+        function returns as soon as all files are submitted to the pool
+    state : str or autoDIET.utils.sync_state.SyncState, optional
+        Path to SQLite database OR instance of SyncState that records the
+        files already ingested into DataFed. Files that are unchanged since
+        they were ingested are skipped without listing the collection.
+        Must be an instance of SyncState if executor is provided
+    file_names : list of str, optional
+        Names of the only files within dir_path to consider for ingestion.
+        Default = all files in dir_path
+    tnail_cache : str or autoDIET.utils.thumbnail_cache.ThumbnailCache
+        Path to directory OR instance of ThumbnailCache holding thumbnails
+        and their links on the cloud, keyed by the contents of the data files
+    tnail_pipeline : int or autoDIET.pipeline.ThumbnailPipeline, optional
+        Number of background threads OR instance of ThumbnailPipeline that
+        add thumbnails to records after they are created, such that record
+        creation does not wait on the cloud. Must be an instance of
+        ThumbnailPipeline if executor is provided. Default = add thumbnails
+        before moving on to the next file
+    listing_cache : autoDIET.utils.datafed_utils.CollectionListingCache
+        Cache of listings of DataFed collections. Records created here are
+        added to the cached listing of coll_id
+    batch_size : int, optional
+        Number of records to create via a single request to DataFed. Worth
+        raising for directories with many small files. Default = 1 - one
+        request per file
+    listing_pool : concurrent.futures.ThreadPoolExecutor, optional
+        Pool of threads that fetch the pages of collection listings
+        concurrently. Default = fetch pages one at a time via df_api
     """
     if not df_api or not isinstance(df_api, API):
         df_api = API()
+    if not isinstance(batch_size, int) or batch_size < 1:
+        raise ValueError('batch_size must be a positive integer')
 
-    json_path = None
-    web_md = dict()
+    own_state = own_executor = own_scratch = own_pipeline = False
+    try:
+        state, own_state = open_sync_state(state, executor=executor)
 
-    for file_name in os.listdir(dir_path):
-        if file_name.lower() == 'metadata.json':
-            json_path = os.path.join(dir_path, file_name)
-            if verbose:
-                print('\tFound JSON: ' + json_path)
-            try:
-                with open(json_path, mode='r') as json_handle:
-                    web_md = json.load(json_handle)
-            except json.JSONDecodeError:
-                warn('Could not decode metadata. Probably not in JSON form')
-
-    if not json_path:
-        warn('metadata.json not found in {}'.format(dir_path))
-        # Use an empty dictionary.
-
-    if verbose:
-        print('\tMetadata from DataFlow web interface:')
-        pretty_print_dict(web_md)
-
-    existing_recs = list_all_items_in_coll(coll_id, mode="d/")
-    if verbose:
-        print('\tFound these data records already on DataFed:')
-        print('\t' + str(existing_recs))
-
-    for file_name in os.listdir(dir_path):
-        if file_name == 'metadata.json' or file_name.startswith('.'):
-            if verbose:
-                print('Not creating DataFed record for file: ' + file_name)
-            continue
+        own_executor = executor is None and workers > 1
+        if own_executor:
+            executor = make_executor(workers, pool=pool)
+        scratch, own_scratch = open_scratch(scratch, executor=executor,
+                                            own_executor=own_executor)
 
-        file_path = os.path.join(dir_path, file_name)
-        if os.path.isdir(file_path):
-            item_name = file_name
-        else:
-            # remove extension from file name and use as title
-            item_name = '.'.join(file_name.split('.')[:-1])
+        cloud = open_cloud(cloud, executor=executor)
+        tnail_cache = open_thumbnail_cache(tnail_cache, executor=executor)
+        tnail_pipeline, own_pipeline = open_thumbnail_pipeline(
+            tnail_pipeline, cloud, executor=executor, scratch=scratch,
+            tnail_cache=tnail_cache, verbose=verbose,
+            own_executor=own_executor)
+        tika_url = open_tika_server(executor=executor, scratch=scratch,
+                                    verbose=verbose)
 
-        if item_name in existing_recs.keys():
-            print(item_name + ' already present in collection')
-            continue
+        json_path = None
+        web_md = dict()
+
+        for file_name in os.listdir(dir_path):
+            if file_name.lower() == 'metadata.json':
+                json_path = os.path.join(dir_path, file_name)
+                if verbose:
+                    print('\tFound JSON: ' + json_path)
+                try:
+                    with open(json_path, mode='r') as json_handle:
+                        web_md = json.load(json_handle)
+                except json.JSONDecodeError:
+                    warn('Could not decode metadata. Probably not in JSON '
+                         'form')
+
+        if not json_path:
+            warn('metadata.json not found in {}'.format(dir_path))
+            # Use an empty dictionary.
 
         if verbose:
-            print('Need to create record for: ' + file_name)
-        upload_to_datafed(file_path, web_md, coll_id, df_api=df_api,
-                          link_data=link_data, scratch=scratch, cloud=cloud,
-                          verbose=verbose)
-        if verbose:
-            print('\n' * 5)
+            print('\tMetadata from DataFlow web interface:')
+            pretty_print_dict(web_md)
+
+        # Only list the collection on DataFed if the local state cannot vouch
+        # for every file in this directory
+        existing_recs = None
+        # (file path, item name) pairs awaiting creation in batch mode
+        batch = list()
+        batch_kwargs = dict(link_data=link_data, scratch=scratch, cloud=cloud,
+                            verbose=verbose, tnail_cache=tnail_cache,
+                            tnail_pipeline=tnail_pipeline)
+
+        if file_names is None:
+            file_names = os.listdir(dir_path)
+
+        for file_name in file_names:
+            if file_name == 'metadata.json' or file_name.startswith('.'):
+                if verbose:
+                    print('Not creating DataFed record for file: ' + file_name)
+                continue
+
+            file_path = os.path.join(dir_path, file_name)
+            if os.path.isdir(file_path):
+                item_name = file_name
+            else:
+                # remove extension from file name and use as title
+                item_name = '.'.join(file_name.split('.')[:-1])
+
+            if state and state.get_item(file_path, coll_id):
+                if verbose:
+                    print(item_name + ' unchanged since it was last ingested')
+                continue
+
+            if existing_recs is None:
+                existing_recs = get_collection_index(
+                    coll_id, df_api=df_api, cache=listing_cache,
+                    workers=1 if listing_pool is None else 4,
+                    pool=listing_pool)
+                if verbose:
+                    print('\tFound these data records already on DataFed:')
+                    print('\t' + str(existing_recs.to_dict(mode="d/")))
+                    duplicates = existing_recs.duplicates(mode="d/")
+                    if duplicates:
+                        print('\tRecords sharing titles: ' + str(duplicates))
+
+            record_id = existing_recs.get(item_name, mode="d/")
+            if record_id:
+                print(item_name + ' already present in collection')
+                if state:
+                    state.set_item(file_path, coll_id, record_id)
+                continue
+
+            if verbose:
+                print('Need to create record for: ' + file_name)
+            if batch_size > 1:
+                batch.append((file_path, item_name))
+                if len(batch) >= batch_size:
+                    _submit_batch(batch, web_md, coll_id, df_api=df_api,
+                                  executor=executor, state=state,
+                                  listing_cache=listing_cache,
+                                  tika_url=tika_url, **batch_kwargs)
+                    batch = list()
+                continue
+            if executor:
+                future = executor.submit(_ingest_file, file_path, web_md,
+                                         coll_id, link_data=link_data,
+                                         scratch=scratch,
+                                         cloud=cloud, verbose=verbose,
+                                         tnail_cache=tnail_cache,
+                                         tnail_pipeline=tnail_pipeline,
+                                         tika_url=tika_url,
+                                         **api_settings(df_api))
+                future.add_done_callback(
+                    _warn_on_failure(file_path, coll_id, state=state,
+                                     listing_cache=listing_cache,
+                                     item_name=item_name))
+                continue
+            record_id = upload_to_datafed(file_path, web_md, coll_id,
+                                          df_api=df_api, link_data=link_data,
+                                          scratch=scratch, cloud=cloud,
+                                          verbose=verbose,
+                                          tnail_cache=tnail_cache,
+                                          tnail_pipeline=tnail_pipeline)
+            if state:
+                state.set_item(file_path, coll_id, record_id)
+            if listing_cache:
+                listing_cache.add_item(coll_id, item_name, record_id)
+            if verbose:
+                print('\n' * 5)
+
+        if batch:
+            _submit_batch(batch, web_md, coll_id, df_api=df_api,
+                          executor=executor, state=state,
+                          listing_cache=listing_cache, tika_url=tika_url,
+                          **batch_kwargs)
+    finally:
+        release_owned(executor=executor if own_executor else None,
+                      tnail_pipeline=tnail_pipeline if own_pipeline else None,
+                      state=state if own_state else None,
+                      scratch=scratch if own_scratch else None)
 
 
 def sync_posix_dfed(local_dir, dfed_coll, max_depth=1, df_api=None,
-                    link_data=True, scratch=None, cloud=None, verbose=False):
+                    link_data=True, scratch=None, cloud=None, verbose=False,
+                    workers=1, pool='thread', executor=None, state=None,
+                    tnail_cache=None, tnail_pipeline=None,
+                    listing_cache=None, batch_size=1, listing_pool=None):
     """
     Recursively mines the provided directory path in the local file system and
     ingests any data not already in DataFed into DataFed.
@@ -121,68 +402,179 @@ def sync_posix_dfed(local_dir, dfed_coll, max_depth=1, df_api=None,
         Default is set to how DataFlow is configured as of 9/28/2021
     df_api : datafed.CommandLib.API instance
         Instance of the DataFed CommandLib API
+        Workers in a pool use instances of their own, set up from the default
+        configuration but with the endpoint and context of this instance
     link_data : bool, optional
         Set to True to have the data record reference the data file in its
         present location. Set to False to push the data file to DataFed
-    scratch : str, optional.
+    scratch : str or autoDIET.utils.scratch.ScratchSpace, optional.
             path to directory that can be used for scratch purposes such as
-            storing thumbnails or other temporary needs.
+            storing thumbnails or other temporary needs. A ScratchSpace is
+            created within the directory such that concurrent ingests never
+            collide on file names and nothing is left behind, unless
+            executor is provided. Provide a ScratchSpace instead to limit
+            the space used or to place thumbnails on tmpfs.
             Default = same directory where raw data is located
     cloud : str or CloudProvider, Optional
         Path to JSON file containing necessary information for cloud hosting
         of thumbnails
         OR Initialized instance of DBox or GDrive
+        When using a pool of processes, the path to the JSON file is passed
+        on to each process
     verbose : bool, optional
         Set to True to print statements for debugging purposes. Leave False
         otherwise. Default = False
+    workers : int, optional
+        Number of files to ingest concurrently. Collections are still created
+        one at a time by the calling thread so that each is created only once.
+        Default = 1 - one file at a time
+    pool : str, optional
+        Set to "thread" to ingest files using a pool of threads or "process"
+        to use a pool of processes. Ignored if executor is provided.
+        Default = "thread"
+    executor : autoDIET.utils.parallel_utils.BoundedExecutor, optional
+        Existing pool of workers to ingest files with. If provided, this
+        function returns as soon as all files are submitted to the pool
+    state : str or autoDIET.utils.sync_state.SyncState, optional
+        Path to SQLite database OR instance of SyncState that records the
+        directories and files already mirrored in DataFed. DataFed is only
+        contacted for new or changed paths, making re-crawls of an unchanged
+        tree nearly free. Entries must be removed via SyncState.forget if
+        the corresponding items are deleted from DataFed.
+        Must be an instance of SyncState if executor is provided
+    tnail_cache : str or autoDIET.utils.thumbnail_cache.ThumbnailCache
+        Path to directory OR instance of ThumbnailCache holding thumbnails
+        and their links on the cloud, keyed by the contents of the data files.
+        Thumbnails are neither generated nor uploaded again for files whose
+        contents were already seen
+    tnail_pipeline : int or autoDIET.pipeline.ThumbnailPipeline, optional
+        Number of background threads OR instance of ThumbnailPipeline that
+        add thumbnails to records after they are created, such that record
+        creation does not wait on the cloud. Must be an instance of
+        ThumbnailPipeline if executor is provided. Default = add thumbnails
+        before moving on to the next file
+    listing_cache : autoDIET.utils.datafed_utils.CollectionListingCache
+        Cache of listings of DataFed collections, such that each collection
+        is listed at most once regardless of how many times it is needed.
+        Pass the same instance to subsequent calls to also avoid listing
+        collections again within its time-to-live.
+        Default = a new cache for this call
+    batch_size : int, optional
+        Number of records to create via a single request to DataFed, per
+        dataset directory. Default = 1 - one request per file
+    listing_pool : concurrent.futures.ThreadPoolExecutor, optional
+        Pool of threads that fetch the pages of collection listings
+        concurrently, shared by every listing in this crawl.
+        Default = a pool for this call
         """
     if not df_api:
         df_api = API()
 
-    if cloud:
-        if not isinstance(cloud, CloudProvider):
-            cloud = setup_tnail_cloud(cloud)
+    own_state = own_executor = own_scratch = own_pipeline = False
+    own_listing_pool = False
+    try:
+        state, own_state = open_sync_state(state, executor=executor)
+        listing_pool, own_listing_pool = open_listing_pool(listing_pool)
 
-    if verbose:
-        print("Syncing {} with {}. Allowed to go {} levels deep"
-              "".format(local_dir, dfed_coll, max_depth))
+        own_executor = executor is None and workers > 1
+        if own_executor:
+            executor = make_executor(workers, pool=pool)
+        scratch, own_scratch = open_scratch(scratch, executor=executor,
+                                            own_executor=own_executor)
 
-    existing_child_colls = list_all_items_in_coll(dfed_coll, mode="c/",
-                                                  df_api=df_api)
+        cloud = open_cloud(cloud, executor=executor)
+        tnail_cache = open_thumbnail_cache(tnail_cache, executor=executor)
+        tnail_pipeline, own_pipeline = open_thumbnail_pipeline(
+            tnail_pipeline, cloud, executor=executor, scratch=scratch,
+            tnail_cache=tnail_cache, verbose=verbose,
+            own_executor=own_executor)
 
-    if verbose:
-        print('Existing collections in {}:'.format(dfed_coll))
-        print(existing_child_colls)
+        if listing_cache is None:
+            listing_cache = CollectionListingCache()
 
-    for dir_name in os.listdir(local_dir):
-        this_child_path = os.path.join(local_dir, dir_name)
+        if verbose:
+            print("Syncing {} with {}. Allowed to go {} levels deep"
+                  "".format(local_dir, dfed_coll, max_depth))
 
-        if this_child_path == scratch:
-            # Ignore scratch within file system
-            continue
+        # Only list the collection on DataFed if the local state does not know
+        # about every sub-directory
+        existing_child_colls = None
 
-        if not os.path.isdir(this_child_path):
-            # TODO: What should we do about files in higher levels
-            # Ignore files at this level
-            continue
-        if dir_name not in existing_child_colls.keys():
-            if verbose:
-                print('Creating collection for sub-dir: ' + dir_name)
-            cc_resp = df_api.collectionCreate(dir_name, parent_id=dfed_coll)
-            existing_child_colls[dir_name] = cc_resp[0].coll[0].id
-        else:
-            if verbose:
+        for dir_name in os.listdir(local_dir):
+            this_child_path = os.path.join(local_dir, dir_name)
+
+            if scratch and _is_within(this_child_path,
+                                      getattr(scratch, 'root', scratch)):
+                # Ignore scratch within file system
+                continue
+
+            if not os.path.isdir(this_child_path):
+                # TODO: What should we do about files in higher levels
+                # Ignore files at this level
+                continue
+
+            child_coll = None
+            if state:
+                child_coll = state.get_collection(this_child_path, dfed_coll)
+
+            if not child_coll:
+                if existing_child_colls is None:
+                    existing_child_colls = get_collection_index(
+                        dfed_coll, df_api=df_api, cache=listing_cache,
+                        pool=listing_pool)
+                    if verbose:
+                        print('Existing collections in {}:'.format(dfed_coll))
+                        print(existing_child_colls.to_dict(mode="c/"))
+
+                child_coll = existing_child_colls.get(dir_name, mode="c/")
+                if not child_coll:
+                    if verbose:
+                        print('Creating collection for sub-dir: ' + dir_name)
+                    cc_resp = df_api.collectionCreate(dir_name,
+                                                      parent_id=dfed_coll)
+                    child_coll = cc_resp[0].coll[0].id
+                    # Also updates the cached index if it is the same one
+                    existing_child_colls.add(dir_name, child_coll)
+                    listing_cache.add_item(dfed_coll, dir_name, child_coll)
+                else:
+                    if verbose:
+                        print('Already have a collection for dir: {} ID: {}'
+                              ''.format(dir_name, child_coll))
+                if state:
+                    state.set_collection(this_child_path, dfed_coll,
+                                         child_coll)
+            elif verbose:
                 print('Already have a collection for dir: {} ID: {}'
-                      ''.format(dir_name, existing_child_colls[dir_name]))
-        if max_depth > 0:
-            sync_posix_dfed(this_child_path, existing_child_colls[dir_name],
-                            max_depth=max_depth-1, link_data=link_data,
-                            df_api=df_api, scratch=scratch, cloud=cloud,
-                            verbose=verbose)
-        else:
-            process_posix_coll(this_child_path, existing_child_colls[dir_name],
-                               link_data=link_data, scratch=scratch,
-                               df_api=df_api, cloud=cloud, verbose=verbose)
+                      ''.format(dir_name, child_coll))
+
+            if max_depth > 0:
+                sync_posix_dfed(this_child_path, child_coll,
+                                max_depth=max_depth-1, link_data=link_data,
+                                df_api=df_api, scratch=scratch, cloud=cloud,
+                                verbose=verbose, executor=executor,
+                                state=state,
+                                tnail_cache=tnail_cache,
+                                tnail_pipeline=tnail_pipeline,
+                                listing_cache=listing_cache,
+                                batch_size=batch_size,
+                                listing_pool=listing_pool)
+            else:
+                process_posix_coll(this_child_path, child_coll,
+                                   link_data=link_data, scratch=scratch,
+                                   df_api=df_api, cloud=cloud, verbose=verbose,
+                                   executor=executor, state=state,
+                                   tnail_cache=tnail_cache,
+                                   tnail_pipeline=tnail_pipeline,
+                                   listing_cache=listing_cache,
+                                   batch_size=batch_size,
+                                   listing_pool=listing_pool)
+    finally:
+        release_owned(executor=executor if own_executor else None,
+                      tnail_pipeline=tnail_pipeline if own_pipeline else None,
+                      state=state if own_state else None,
+                      scratch=scratch if own_scratch else None,
+                      listing_pool=listing_pool if own_listing_pool
+                      else None)
 
 
 if __name__ == "__main__":
@@ -1,42 +1,39 @@
 import os
 import json
+import shutil
+import tempfile
 from warnings import warn
 from datafed.CommandLib import API
 
-from .raw_data.babel import extract_metadata, generate_thumbnails
-from .utils.file_utils import make_tarfile
+from .raw_data.babel import get_parser, extract_metadata, \
+    generate_thumbnails
+from .utils.archive_utils import make_archive
+from .utils.scratch import ScratchSpace, directory_size
 from .cloud.cloud_provider import CloudProvider
 
 
-def make_desc_with_thumbnails(tnails, cloud, verbose=False):
+def upload_thumbnails(tnails, cloud, workers=4, verbose=False):
     """
     Uploads the specified thumbnail images to a cloud location as publicly
-    visible files and then embeds the links to these thumbnails into a
-    string that can serve as the description for a DataFed data record
+    visible files. Multiple thumbnails are uploaded concurrently
 
     Parameters
     ----------
     tnails : list
         List of tuples arranged as [(title_1, path_1), (title_2, path_2)]
-    cloud : microflow.CloudProvider, Optional
+    cloud : microflow.CloudProvider
         Initialized instance of microflow.DBox or microflow.GDrive
+    workers : int, optional
+        Maximum number of thumbnails uploaded at the same time. Default = 4
     verbose : bool, optional
         Set to True to print statements for debugging purposes. Leave False
         otherwise. Default = False
 
     Returns
     -------
-    str
-        Description for Data record containing markdown for thumbnail images
+    list
+        List of pairs arranged as [[title_1, link_1], [title_2, link_2]]
     """
-    if not isinstance(cloud, CloudProvider):
-        warn('cloud must be either a valid GDrive or DBox instance')
-        return ""
-    if not tnails:
-        if verbose:
-            print('Did not receive any thumbnail tuples')
-        return ""
-
     # unpack the returned tuple
     if verbose:
         print('Got following files:')
@@ -47,22 +44,78 @@ def make_desc_with_thumbnails(tnails, cloud, verbose=False):
     if verbose:
         print('Uploading images to {}'.format(cloud))
 
+    # Identical thumbnails (e.g. blank frames) are only hosted once
+    links = cloud.upload_public_files([pair[1] for pair in tnails],
+                                      workers=workers, deduplicate=True)
     rem_pairs = list()
-    for loc_pair in tnails:
-        # Make sure to add a forward slash to the file name
-        link = cloud.upload_public_file(loc_pair[1])
+    for loc_pair, link in zip(tnails, links):
         if verbose:
             print('Uploaded: {} - locally at: {} to: {}'
                   ''.format(loc_pair[0], loc_pair[1], link))
         rem_pairs.append([loc_pair[0], link])
+    return rem_pairs
 
-    # Now construct the description string:
+
+def thumbnails_markdown(rem_pairs, verbose=False):
+    """
+    Embeds links to thumbnails into a string that can serve as the
+    description for a DataFed data record
+
+    Parameters
+    ----------
+    rem_pairs : list
+        List of pairs arranged as [[title_1, link_1], [title_2, link_2]]
+    verbose : bool, optional
+        Set to True to print statements for debugging purposes. Leave False
+        otherwise. Default = False
+
+    Returns
+    -------
+    str
+        Description for Data record containing markdown for thumbnail images
+    """
     desc = ""
     for pair in rem_pairs:
         desc += "![{}]({})\n\n".format(pair[0], pair[1])
 
     if verbose:
         print('Markdown snippet for thumbnails:\n' + desc)
+    return desc
+
+
+def make_desc_with_thumbnails(tnails, cloud, verbose=False):
+    """
+    Uploads the specified thumbnail images to a cloud location as publicly
+    visible files and then embeds the links to these thumbnails into a
+    string that can serve as the description for a DataFed data record
+
+    Parameters
+    ----------
+    tnails : list
+        List of tuples arranged as [(title_1, path_1), (title_2, path_2)]
+    cloud : microflow.CloudProvider, Optional
+        Initialized instance of microflow.DBox or microflow.GDrive
+    verbose : bool, optional
+        Set to True to print statements for debugging purposes. Leave False
+        otherwise. Default = False
+
+    Returns
+    -------
+    str
+        Description for Data record containing markdown for thumbnail images
+    """
+    if not isinstance(cloud, CloudProvider):
+        warn('cloud must be either a valid GDrive or DBox instance')
+        return ""
+    if not tnails:
+        if verbose:
+            print('Did not receive any thumbnail tuples')
+        return ""
+
+    rem_pairs = upload_thumbnails(tnails, cloud, verbose=verbose)
+
+    # Now construct the description string:
+    desc = thumbnails_markdown(rem_pairs, verbose=verbose)
 
     # Now delete the local images:
     if verbose:
@@ -72,8 +125,276 @@ def make_desc_with_thumbnails(tnails, cloud, verbose=False):
     return desc
 
 
+def _cached_thumbnails_desc(record_id, file_path, cloud, tnail_cache,
+                            scratch=None, parser=None, verbose=False):
+    """
+    Same as generating thumbnails and calling make_desc_with_thumbnails but
+    reuses thumbnails and links from the cache where possible and keeps the
+    local thumbnails in the cache rather than deleting them
+    """
+    if not isinstance(cloud, CloudProvider):
+        warn('cloud must be either a valid GDrive or DBox instance')
+        return ""
+    own_parser = parser is None
+    if own_parser:
+        parser = get_parser(file_path, scratch=scratch, verbose=verbose)
+        if parser is None:
+            return None
+    try:
+        key = tnail_cache.make_key(file_path, parser=parser, cloud=cloud)
+        with tnail_cache.in_use(key):
+            cached = tnail_cache.get(key)
+
+            if cached and all(url for _, _, url in cached):
+                if verbose:
+                    print('Reusing thumbnails already on the cloud for: ' +
+                          file_path)
+                return thumbnails_markdown([[title, url] for title, _, url
+                                            in cached], verbose=verbose)
+
+            if cached:
+                if verbose:
+                    print('Reusing cached thumbnails for: ' + file_path)
+                # Only upload the thumbnails that are not on the cloud yet.
+                # Those without a link always have a local copy
+                uploaded = iter(upload_thumbnails(
+                    [(title, path) for title, path, url in cached if not url],
+                    cloud, verbose=verbose))
+                rem_pairs = [[title, url] if url else next(uploaded)
+                             for title, _, url in cached]
+            else:
+                tnails = generate_thumbnails(file_path, record_id,
+                                             scratch=scratch, verbose=verbose,
+                                             parser=parser)
+                if not tnails:
+                    return None
+                tnails = tnail_cache.put(key, tnails)
+                rem_pairs = upload_thumbnails(tnails, cloud, verbose=verbose)
+
+            tnail_cache.set_urls(key, [link for _, link in rem_pairs])
+            return thumbnails_markdown(rem_pairs, verbose=verbose)
+    finally:
+        if own_parser:
+            # Only close the Parser if it was created here
+            parser.close()
+
+
+def get_record_metadata(file_path, web_md, scratch=None, parser=None,
+                        verbose=False):
+    """
+    Determines the title and metadata for the DataFed data record that
+    would represent the given data file or directory
+
+    Parameters
+    ----------
+    file_path : str
+        Path to raw data file or directory
+    web_md : dict
+        Metadata captured from the DataFlow web interface
+    scratch : str, optional.
+            path to directory that can be used for scratch purposes such as
+            storing thumbnails or other temporary needs.
+            Default = same directory where raw data is located
+    parser : microflow.raw_data.parser.Parser, optional
+        Parser for this file obtained via get_parser. Metadata is not
+        extracted from the file itself if not provided
+    verbose : bool, optional
+        Set to True to print statements for debugging purposes. Leave False
+        otherwise. Default = False
+
+    Returns
+    -------
+    dset_name : str
+        Title for the data record
+    full_md : dict
+        Metadata for the data record
+    """
+    _, file_name = os.path.split(file_path)
+
+    if os.path.isdir(file_path):
+        # file name serves as the record title
+        # Just use the web metadata:
+        return file_name, {"web_metadata": web_md}
+
+    # Individual file:
+    parts = file_name.split('.')
+    # TODO: What if multiple files have same base name but diff extensions?
+    dset_name = '.'.join(parts[:-1])
+    ext = parts[-1]
+
+    if verbose:
+        print('From this file: {}, using record title: {} and found '
+              'extension: {}'.format(file_name, dset_name, ext))
+
+    if parser:
+        this_md = extract_metadata(file_path, scratch=scratch,
+                                   verbose=verbose, parser=parser)
+    else:
+        if verbose:
+            print('No Parser to extract metadata from file: ' + file_path)
+        this_md = dict()
+
+    # combine with web_md
+    if web_md is None or len(web_md) == 0:
+        full_md = dict()
+    else:
+        full_md = {"web_metadata": web_md}
+    if len(this_md) > 0:
+        full_md['extracted_metadata'] = this_md
+
+    return dset_name, full_md
+
+
+def put_raw_data(record_id, file_path, df_api=None, scratch=None,
+                 verbose=False, codec='auto'):
+    """
+    Uploads the raw data file or directory into the given DataFed data record.
+    Directories are first archived into a tar ball, compressed on the fly
+
+    Parameters
+    ----------
+    record_id : str
+        ID of DataFed data record
+    file_path : str
+        Path to raw data file or directory
+    df_api : datafed.CommandLib.API, optional
+        Instance of the DataFed CommandLib API
+    scratch : str or autoDIET.utils.scratch.ScratchSpace, optional.
+            path to directory that can be used for scratch purposes such as
+            storing thumbnails or other temporary needs. Given a
+            ScratchSpace, each tar ball is written into a directory of its
+            own and counts against the byte budget until it is uploaded.
+            Default = same directory where raw data is located
+    verbose : bool, optional
+        Set to True to print statements for debugging purposes. Leave False
+        otherwise. Default = False
+    codec : str, optional
+        Codec to compress directories with. See
+        autoDIET.utils.archive_utils.make_archive. Default = "auto"
+    """
+    if not df_api:
+        df_api = API()
+
+    if not os.path.isdir(file_path):
+        if verbose:
+            print('Uploading data file into DataFed data record '
+                  '(asynchronously)')
+        _ = df_api.dataPut(record_id, file_path, wait=False)
+        return
+
+    # The tar ball is at most about as large as the directory
+    reserved = 0
+    dest = scratch
+    if isinstance(scratch, ScratchSpace):
+        reserved = directory_size(file_path)
+        if verbose:
+            print('Waiting for {} bytes of scratch space'.format(reserved))
+        scratch.reserve(reserved)
+    upload_path = None
+    try:
+        if isinstance(scratch, ScratchSpace):
+            # Tar balls of directories with the same name never collide
+            dest = scratch.make_dir()
+        # Step 1 of 3: create a tar ball
+        if verbose:
+            print('About to compress directory to tar ball for uploading')
+        if scratch and verbose:
+            print('Need to copy data over to scratch before compressing. '
+                  'This could take some time...')
+        # TODO: What if we cannot upload from scratch space?
+        # scratch on VM is not visible to Globus endpoint!
+        archive = make_archive(file_path, dest=dest, codec=codec)
+        upload_path = archive.path
+        if verbose:
+            print('Compressed directory: {} to a tar ball: {}'
+                  ''.format(file_path, archive))
+
+        # Step 2 of 3: dataPut
+        if verbose:
+            print('Uploading tar ball into DataFed data record')
+        # Need to wait until tar is uploaded before deleting the tar ball
+        _ = df_api.dataPut(record_id, upload_path, wait=True)
+    finally:
+        # Step 3 of 3: delete the tar ball:
+        if verbose and upload_path:
+            print('Deleting tar ball')
+        if upload_path and os.path.exists(upload_path):
+            os.remove(upload_path)
+        if dest is not scratch:
+            shutil.rmtree(dest, ignore_errors=True)
+        if reserved:
+            scratch.release(reserved)
+
+
+def add_thumbnails(record_id, file_path, cloud, df_api=None, scratch=None,
+                   parser=None, tnail_cache=None, verbose=False):
+    """
+    Generates thumbnails for the given data file, hosts them on the cloud, and
+    embeds them into the description of the given DataFed data record
+
+    Parameters
+    ----------
+    record_id : str
+        ID of DataFed data record
+    file_path : str
+        Path to raw data file
+    cloud : microflow.CloudProvider
+        Initialized instance of microflow.DBox or microflow.GDrive
+    df_api : datafed.CommandLib.API, optional
+        Instance of the DataFed CommandLib API
+    scratch : str, optional.
+            path to directory that can be used for scratch purposes such as
+            storing thumbnails or other temporary needs.
+            Default = same directory where raw data is located
+    parser : microflow.raw_data.parser.Parser, optional
+        Parser for this file obtained via get_parser. One will be obtained if
+        not provided
+    tnail_cache : autoDIET.utils.thumbnail_cache.ThumbnailCache, optional
+        Cache of thumbnails and their links. Thumbnails are neither generated
+        nor uploaded again for files with the same contents
+    verbose : bool, optional
+        Set to True to print statements for debugging purposes. Leave False
+        otherwise. Default = False
+
+    Returns
+    -------
+    str
+        Description for Data record containing markdown for thumbnail images.
+        None if no thumbnails could be generated
+    """
+    if not df_api:
+        df_api = API()
+
+    if verbose:
+        print('Attempting to get thumbnail')
+
+    if tnail_cache:
+        desc = _cached_thumbnails_desc(record_id, file_path, cloud,
+                                       tnail_cache, scratch=scratch,
+                                       parser=parser, verbose=verbose)
+        if desc is None:
+            return None
+    else:
+        tnail_pairs = generate_thumbnails(file_path, record_id,
+                                          scratch=scratch, verbose=verbose,
+                                          parser=parser)
+
+        if not tnail_pairs:
+            # Could not generate description
+            return None
+
+        desc = make_desc_with_thumbnails(tnail_pairs, cloud, verbose=verbose)
+
+    if verbose:
+        print("Updating record's description to embed thumbnails")
+    # Use the record_id to update the record
+    _ = df_api.dataUpdate(record_id, description=desc)
+    return desc
+
+
 def upload_to_datafed(file_path, web_md, coll_id, link_data=True, df_api=None,
-                      scratch=None, cloud=None, verbose=False):
+                      scratch=None, cloud=None, verbose=False,
+                      tnail_cache=None, tnail_pipeline=None):
     """
     Converts a given data file and metadata captured from the web interface
     in DataFlow into a single DataFed data record
@@ -101,6 +422,12 @@ def upload_to_datafed(file_path, web_md, coll_id, link_data=True, df_api=None,
     verbose : bool, optional
         Set to True to print statements for debugging purposes. Leave False
         otherwise. Default = False
+    tnail_cache : autoDIET.utils.thumbnail_cache.ThumbnailCache, optional
+        Cache of thumbnails and their links on the cloud
+    tnail_pipeline : autoDIET.pipeline.ThumbnailPipeline, optional
+        Background stage to hand thumbnails off to. If provided, this returns
+        as soon as the record is created and cloud is ignored in favor of
+        the one the pipeline was set up with
 
     Returns
     -------
@@ -110,112 +437,343 @@ def upload_to_datafed(file_path, web_md, coll_id, link_data=True, df_api=None,
     if not df_api:
         df_api = API()
 
-    _, file_name = os.path.split(file_path)
-
-    if os.path.isdir(file_path):
-        # file name serves as the record title
-        dset_name = file_name
-        # Just use the web metadata:
-        full_md = {"web_metadata": web_md}
-    else:
+    this_parser = None
+    if not os.path.isdir(file_path):
+        # The same Parser provides both metadata and thumbnails so that the
+        # file is only opened and decoded once
+        this_parser = get_parser(file_path, scratch=scratch, verbose=verbose)
 
-        # Individual file:
-        parts = file_name.split('.')
-        # TODO: What if multiple files have same base name but diff extensions?
-        dset_name = '.'.join(parts[:-1])
-        ext = parts[-1]
+    try:
+        dset_name, full_md = get_record_metadata(file_path, web_md,
+                                                 scratch=scratch,
+                                                 parser=this_parser,
+                                                 verbose=verbose)
 
+        # create data record with title of file and combined md
         if verbose:
-            print('From this file: {}, using record title: {} and found '
-                  'extension: {}'.format(file_name, dset_name, ext))
-
-        this_md = extract_metadata(file_path, scratch=scratch, verbose=verbose)
-
-        # combine with web_md
-        if web_md is None or len(web_md) == 0:
-            full_md = dict()
-        else:
-            full_md = {"web_metadata": web_md}
-        if len(this_md) > 0:
-            full_md['extracted_metadata'] = this_md
-
-    # create data record with title of file and combined md
-    if verbose:
-        print('Creating data record for this file in collection: ' + coll_id)
-    dc_resp = df_api.dataCreate(dset_name,
-                                metadata=json.dumps(full_md),
-                                # Choose to provide path later on if necessary
-                                external=link_data,
-                                parent_id=coll_id)
-    record_id = dc_resp[0].data[0].id
-    if verbose:
-        print('Created data record with ID: ' + record_id)
-
-    if link_data:
-        # only provide a link to the raw data.
-        # if this is a directory, then we link the directory directly
-        glob_path = df_api.endpointGet() + os.path.abspath(file_path)
-        if verbose:
-            print('Linking this data record with data file in local file '
-                  'system: ' + glob_path)
-        _ = df_api.dataUpdate(record_id, raw_data_file=glob_path)
-    else:
-        # put raw data into record
-        upload_path = file_path
-        if os.path.isdir(file_path):
-            # Step 1 of 3: create a tar ball
+            print('Creating data record for this file in collection: ' +
+                  coll_id)
+        glob_path = None
+        if link_data:
+            # only provide a link to the raw data.
+            # if this is a directory, then we link the directory directly
+            glob_path = df_api.endpointGet() + os.path.abspath(file_path)
             if verbose:
-                print('About to compress directory to tar ball for uploading')
-            if scratch and verbose:
-                print('Need to copy data over to scratch before compressing. '
-                      'This could take some time...')
-            # TODO: What if we cannot upload from scratch space?
-            # scratch on VM is not visible to Globus endpoint!
-            upload_path = make_tarfile(file_path, compress=True,
-                                       tar_path=scratch)
-            if verbose:
-                print('Compressed directory: {} to a tar ball: {}'
-                      ''.format(file_path, upload_path))
-            # Step 2 of 3: dataPut
-
+                print('Linking this data record with data file in local file '
+                      'system: ' + glob_path)
+        record_id = _create_record(dset_name, full_md, coll_id, df_api,
+                                   source=glob_path)
         if verbose:
-            print('Uploading data file into DataFed data record '
-                  '(asynchronously)')
-        _ = df_api.dataPut(record_id, upload_path,
-                           # Need to wait until tar is uploaded before deleting
-                           # the temporary tar ball
-                           wait=os.path.isdir(file_path))
+            print('Created data record with ID: ' + record_id)
 
-        if os.path.isdir(file_path):
-            # Step 3 of 3: delete the tar ball:
-            if verbose:
-                print('Deleting tar ball')
-            os.remove(upload_path)
+        if not link_data:
+            # put raw data into record
+            put_raw_data(record_id, file_path, df_api=df_api,
+                         scratch=scratch, verbose=verbose)
 
+        if os.path.isdir(file_path) or not this_parser:
             # No point thinking about thumbnails:
             return record_id
 
+        if _thumbnails_for_record(record_id, file_path, this_parser,
+                                  cloud=cloud, df_api=df_api,
+                                  scratch=scratch, tnail_cache=tnail_cache,
+                                  tnail_pipeline=tnail_pipeline,
+                                  verbose=verbose):
+            this_parser = None
+        return record_id
+    finally:
+        if this_parser:
+            this_parser.close()
+
+
+def _thumbnails_for_record(record_id, file_path, parser, cloud=None,
+                           df_api=None, scratch=None, tnail_cache=None,
+                           tnail_pipeline=None, verbose=False):
+    """
+    Adds thumbnails to a freshly created record, either right away or via
+    the pipeline. Returns True if the pipeline took ownership of the Parser
+    """
+    if tnail_pipeline:
+        # The pipeline closes the Parser once it is done with it
+        tnail_pipeline.submit(record_id, file_path, parser=parser)
+        return True
+
     # Generate description from thumbnails
     if not cloud:
         if verbose:
             print('No cloud configured for uploading thumbnail images')
-        return record_id
+        return False
 
-    if verbose:
-        print('Attempting to get thumbnail')
+    try:
+        add_thumbnails(record_id, file_path, cloud, df_api=df_api,
+                       scratch=scratch, parser=parser,
+                       tnail_cache=tnail_cache, verbose=verbose)
+    except Exception as exc:
+        # The record exists already. Only its description is missing
+        warn('Could not add thumbnails for {} to record: {}\n{}: {}'
+             ''.format(file_path, record_id, type(exc).__name__, exc))
+    return False
 
-    tnail_pairs = generate_thumbnails(file_path, record_id, scratch=scratch,
-                                      verbose=verbose)
 
-    if not tnail_pairs:
-        # Could not generate description
-        return record_id
+def _create_record(title, md, coll_id, df_api, source=None):
+    """
+    Creates a data record, linking it to the raw data at source (if provided)
+    in the same request. Falls back to linking via a separate request for
+    versions of DataFed that cannot do so while creating the record
 
-    desc = make_desc_with_thumbnails(tnail_pairs, cloud, verbose=verbose)
+    Returns
+    -------
+    str
+        ID of the new record
+    """
+    metadata = json.dumps(md)
+    if source:
+        try:
+            dc_resp = df_api.dataCreate(title, metadata=metadata,
+                                        external=True, raw_data_file=source,
+                                        parent_id=coll_id)
+            return dc_resp[0].data[0].id
+        except TypeError as exc:
+            # raw_data_file is not a parameter of dataCreate in this version
+            if 'raw_data_file' not in str(exc):
+                raise
+    dc_resp = df_api.dataCreate(title, metadata=metadata,
+                                external=bool(source), parent_id=coll_id)
+    record_id = dc_resp[0].data[0].id
+    if source:
+        _ = df_api.dataUpdate(record_id, raw_data_file=source)
+    return record_id
 
-    if verbose:
-        print("Updating record's description to embed thumbnails")
-    # Use the record_id to update the record
-    _ = df_api.dataUpdate(record_id, description=desc)
 
-    return record_id
+def _create_records_individually(records, coll_id, df_api, verbose=False):
+    """
+    Stand-in for dataBatchCreate for versions of DataFed without it. Takes
+    and returns the same as create_records
+    """
+    record_ids = list()
+    for record in records:
+        record_id = _create_record(record["title"], record.get("md", {}),
+                                   coll_id, df_api,
+                                   source=record.get("source"))
+        if verbose:
+            print('Created data record with ID: ' + record_id)
+        record_ids.append(record_id)
+    return record_ids
+
+
+def _split_batch(batch, max_bytes):
+    """
+    Splits records into consecutive chunks whose JSON encoding takes up no
+    more than max_bytes. A record that is larger than max_bytes by itself
+    forms a chunk of its own
+    """
+    chunk = list()
+    # Opening and closing brackets of the JSON list
+    size = 2
+    for record in batch:
+        # Account for the separator between records
+        rec_size = len(json.dumps(record).encode('utf-8')) + 2
+        if chunk and size + rec_size > max_bytes:
+            yield chunk
+            chunk = list()
+            size = 2
+        chunk.append(record)
+        size += rec_size
+    if chunk:
+        yield chunk
+
+
+def _batch_create(batch, coll_id, df_api, scratch=None, verbose=False):
+    """
+    Creates the given records via a single request to dataBatchCreate and
+    matches the records that DataFed created back to them
+
+    Returns
+    -------
+    list of str
+        IDs of the created records in the same order as batch
+    """
+    # DataFed reads the records from JSON files
+    handle, json_path = tempfile.mkstemp(prefix='records_', suffix='.json',
+                                         dir=scratch)
+    try:
+        with os.fdopen(handle, mode='w') as file_handle:
+            json.dump(batch, file_handle)
+        if verbose:
+            print('Creating {} data records in collection: {}'
+                  ''.format(len(batch), coll_id))
+        resp = df_api.dataBatchCreate([json_path], coll_id=coll_id)
+    finally:
+        os.remove(json_path)
+
+    created = resp[0].data
+    if len(created) != len(batch):
+        raise ValueError('Asked DataFed to create {} records but got {} IDs'
+                         ''.format(len(batch), len(created)))
+    # DataFed does not promise to reply in the order of the request. Match
+    # by title, taking duplicate titles in order
+    by_title = dict()
+    for item in created:
+        by_title.setdefault(item.title, list()).append(item.id)
+    record_ids = list()
+    for record in batch:
+        matches = by_title.get(record["title"])
+        if not matches:
+            raise ValueError('DataFed did not create a record titled: {}'
+                             ''.format(record["title"]))
+        record_ids.append(matches.pop(0))
+    return record_ids
+
+
+def create_records(records, coll_id, df_api=None, scratch=None,
+                   max_bytes=1024 ** 2, verbose=False):
+    """
+    Creates several data records within a collection via as few requests
+    to DataFed's batch record creation as possible, setting the metadata
+    and, for records that link to data in place, the location of the raw
+    data in the same request. Records are created one at a time if this
+    version of DataFed does not offer batch creation
+
+    Parameters
+    ----------
+    records : list of dict
+        Each dictionary describes a record via the keys: "title", "md" (dict
+        of metadata), and optionally "source" (globally accessible path of
+        the raw data that the record should link to)
+    coll_id : str
+        ID of DataFed collection to create the records in
+    df_api : datafed.CommandLib.API, optional
+        Instance of the DataFed CommandLib API
+    scratch : str, optional.
+            path to directory that can be used for scratch purposes such as
+            storing thumbnails or other temporary needs.
+            Default = temporary directory of the system
+    max_bytes : int, optional
+        Maximum size of the JSON describing the records sent to DataFed in
+        a single request. Records with large metadata are spread over
+        several requests to stay within DataFed's limit on the size of a
+        request. Default = 1 MB
+    verbose : bool, optional
+        Set to True to print statements for debugging purposes. Leave False
+        otherwise. Default = False
+
+    Returns
+    -------
+    list of str
+        IDs of the created records in the same order as records
+    """
+    if not isinstance(max_bytes, int) or max_bytes < 1:
+        raise ValueError('max_bytes must be a positive integer')
+    if not df_api:
+        df_api = API()
+    if not records:
+        return list()
+    if not hasattr(df_api, 'dataBatchCreate'):
+        return _create_records_individually(records, coll_id, df_api,
+                                            verbose=verbose)
+
+    batch = list()
+    for record in records:
+        this_rec = {"title": record["title"], "parent": coll_id,
+                    "md": record.get("md", {})}
+        if record.get("source"):
+            this_rec["external"] = True
+            this_rec["source"] = record["source"]
+        batch.append(this_rec)
+
+    record_ids = list()
+    for chunk in _split_batch(batch, max_bytes):
+        record_ids += _batch_create(chunk, coll_id, df_api, scratch=scratch,
+                                    verbose=verbose)
+    return record_ids
+
+
+def upload_batch_to_datafed(file_paths, web_md, coll_id, link_data=True,
+                            df_api=None, scratch=None, cloud=None,
+                            verbose=False, tnail_cache=None,
+                            tnail_pipeline=None):
+    """
+    Same as calling upload_to_datafed for each of the given data files except
+    that all records are created via a single request to DataFed. Meant for
+    directories with many small files, where requests rather than data
+    dominate the time taken
+
+    Parameters
+    ----------
+    file_paths : list of str
+        Paths to raw data files within the same directory
+    web_md : dict
+        Metadata captured from the DataFlow web interface
+    coll_id : str
+        ID of DataFed collection where new data records will be created for
+        these data files
+    link_data : bool, optional
+        Set to True to have the data records reference the data files in
+        their present location. Set to False to push the data files to
+        DataFed
+    df_api : datafed.CommandLib.API, optional
+        Instance of the DataFed CommandLib API
+    scratch : str, optional.
+            path to directory that can be used for scratch purposes such as
+            storing thumbnails or other temporary needs.
+            Default = same directory where raw data is located
+    cloud : microflow.CloudProvider, Optional
+        Initialized instance of microflow.DBox or microflow.GDrive
+    verbose : bool, optional
+        Set to True to print statements for debugging purposes. Leave False
+        otherwise. Default = False
+    tnail_cache : autoDIET.utils.thumbnail_cache.ThumbnailCache, optional
+        Cache of thumbnails and their links on the cloud
+    tnail_pipeline : autoDIET.pipeline.ThumbnailPipeline, optional
+        Background stage to hand thumbnails off to
+
+    Returns
+    -------
+    list of str
+        IDs of DataFed records in the same order as file_paths
+    """
+    if not df_api:
+        df_api = API()
+
+    parsers = list()
+    try:
+        endpoint = df_api.endpointGet() if link_data else None
+        records = list()
+        for file_path in file_paths:
+            this_parser = None
+            if not os.path.isdir(file_path):
+                this_parser = get_parser(file_path, scratch=scratch,
+                                         verbose=verbose)
+            parsers.append(this_parser)
+            dset_name, full_md = get_record_metadata(file_path, web_md,
+                                                     scratch=scratch,
+                                                     parser=this_parser,
+                                                     verbose=verbose)
+            record = {"title": dset_name, "md": full_md}
+            if link_data:
+                record["source"] = endpoint + os.path.abspath(file_path)
+            records.append(record)
+
+        record_ids = create_records(records, coll_id, df_api=df_api,
+                                    scratch=scratch, verbose=verbose)
+
+        for ind, (file_path, record_id) in enumerate(zip(file_paths,
+                                                         record_ids)):
+            if not link_data:
+                put_raw_data(record_id, file_path, df_api=df_api,
+                             scratch=scratch, verbose=verbose)
+            if os.path.isdir(file_path) or not parsers[ind]:
+                continue
+            if _thumbnails_for_record(record_id, file_path, parsers[ind],
+                                      cloud=cloud, df_api=df_api,
+                                      scratch=scratch,
+                                      tnail_cache=tnail_cache,
+                                      tnail_pipeline=tnail_pipeline,
+                                      verbose=verbose):
+                parsers[ind] = None
+        return record_ids
+    finally:
+        for this_parser in parsers:
+            if this_parser:
+                this_parser.close()
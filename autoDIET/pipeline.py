@@ -0,0 +1,138 @@
+import queue
+import threading
+from warnings import warn
+
+from .utils.datafed_utils import thread_local_api
+from .ingest import add_thumbnails
+
+# Placed on the queue once per worker to tell it to stop
+_STOP = object()
+
+
+class ThumbnailPipeline(object):
+
+    def __init__(self, cloud, workers=2, max_pending=None, scratch=None,
+                 tnail_cache=None, verbose=False):
+        """
+        Background stage that generates thumbnails, hosts them on the cloud
+        and embeds them into the descriptions of data records that were
+        already created. Record creation therefore does not wait on the
+        cloud. Calls to submit block once max_pending records are waiting
+        for thumbnails, so a slow cloud throttles the crawl rather than
+        letting the backlog grow without bound.
+
+        Parameters
+        ----------
+        cloud : microflow.CloudProvider
+            Initialized instance of microflow.DBox or microflow.GDrive
+        workers : int, optional
+            Number of threads generating and uploading thumbnails. Default = 2
+        max_pending : int, optional
+            Maximum number of records waiting for thumbnails.
+            Default = four times the number of workers
+        scratch : str, optional.
+            path to directory that can be used for scratch purposes such as
+            storing thumbnails or other temporary needs.
+            Default = same directory where raw data is located
+        tnail_cache : autoDIET.utils.thumbnail_cache.ThumbnailCache, optional
+            Cache of thumbnails and their links on the cloud
+        verbose : bool, optional
+            Set to True to print statements for debugging purposes. Leave False
+            otherwise. Default = False
+        """
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError('workers must be a positive integer')
+        if max_pending is None:
+            max_pending = 4 * workers
+        if not isinstance(max_pending, int) or max_pending < 1:
+            raise ValueError('max_pending must be a positive integer')
+        self.cloud = cloud
+        self.scratch = scratch
+        self.tnail_cache = tnail_cache
+        self.verbose = verbose
+        self.failures = list()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._lock = threading.Lock()
+        self._threads = list()
+        for index in range(workers):
+            thread = threading.Thread(target=self._work,
+                                      name='ThumbnailPipeline-{}'.format(index),
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, record_id, file_path, parser=None):
+        """
+        Queues a data record for thumbnails, waiting for room in the queue if
+        necessary
+
+        Parameters
+        ----------
+        record_id : str
+            ID of DataFed data record
+        file_path : str
+            Path to raw data file
+        parser : microflow.raw_data.parser.Parser, optional
+            Parser for this file obtained via get_parser. The pipeline takes
+            ownership of the Parser and closes it once done
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Cannot submit to a closed '
+                                   'ThumbnailPipeline')
+        self._queue.put((record_id, file_path, parser))
+
+    def _work(self):
+        df_api = thread_local_api()
+        while True:
+            task = self._queue.get()
+            try:
+                if task is _STOP:
+                    return
+                record_id, file_path, parser = task
+                try:
+                    add_thumbnails(record_id, file_path, self.cloud,
+                                   df_api=df_api, scratch=self.scratch,
+                                   parser=parser,
+                                   tnail_cache=self.tnail_cache,
+                                   verbose=self.verbose)
+                except Exception as exc:
+                    # The record exists already. Only its description is
+                    # missing, so carry on with the other records
+                    self.failures.append((record_id, file_path))
+                    warn('Could not add thumbnails for {} to record: {}\n'
+                         '{}: {}'.format(file_path, record_id,
+                                         type(exc).__name__, exc))
+                finally:
+                    if parser:
+                        parser.close()
+            finally:
+                self._queue.task_done()
+
+    def close(self, wait=True):
+        """
+        Stops accepting new records and shuts down the workers once every
+        queued record has been processed
+
+        Parameters
+        ----------
+        wait : bool, optional
+            Set to True to block until the queue has drained. Default = True
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(wait=True)
+        return False
@@ -1,9 +1,26 @@
 from ..utils.dict_utils import clean_attributes, pretty_print_dict
+from ..utils.parallel_utils import imap_unordered
 from ..raw_data.parser import Parser
-from ..raw_data.images import Images
-
-# Domain scientists to add more cases here.
-parsers = [Images, Parser]
+from ..raw_data.registry import ParserRegistry, ParserSpec
+
+registry = ParserRegistry(fallback=Parser)
+register_parser = registry.register
+
+# Domain scientists to register more Parsers here, or via the
+# "autoDIET.parsers" entry point group of their own packages.
+# Parsers are only imported once a matching file is encountered.
+register_parser(ParserSpec('autoDIET.raw_data.images:Images',
+                           extensions=('png', 'jpg', 'jpeg', 'gif', 'tif',
+                                       'tiff', 'bmp', 'webp', 'pbm', 'pgm',
+                                       'ppm', 'ras', 'xbm', 'rgb', 'exr'),
+                           mime_types=('image/png', 'image/jpeg', 'image/gif',
+                                       'image/tiff', 'image/bmp', 'image/webp',
+                                       'image/x-portable-bitmap',
+                                       'image/x-portable-graymap',
+                                       'image/x-portable-pixmap'),
+                           magic=(b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff',
+                                  b'GIF87a', b'GIF89a', b'II*\x00',
+                                  b'MM\x00*', b'BM')))
 
 
 def get_parser(file_path, scratch=None, verbose=False):
@@ -28,16 +45,10 @@ def get_parser(file_path, scratch=None, verbose=False):
     microfow.raw_data.parser.Parser
         Child class of the Parser class
     """
-    for this_class in parsers:
-        try:
-            reader = this_class(file_path, scratch=scratch, verbose=verbose)
-            return reader
-        except Exception as _:
-            pass
-    return None
+    return registry.get_parser(file_path, scratch=scratch, verbose=verbose)
 
 
-def extract_metadata(file_path, scratch=None, verbose=False):
+def extract_metadata(file_path, scratch=None, verbose=False, parser=None):
     """
     Extracts metadata present within the provided data file.
     This is the function that domain scientists can add to.
@@ -53,13 +64,18 @@ def extract_metadata(file_path, scratch=None, verbose=False):
     verbose : bool, optional
         Set to True to print statements for debugging purposes. Leave False
         otherwise. Default = False
+    parser : microflow.raw_data.parser.Parser, optional
+        Parser already constructed for this file via get_parser. Provide this
+        to reuse the same Parser for generate_thumbnails
 
     Returns
     -------
     dict
         Dictionary with domain-specific metadata
     """
-    this_parser = get_parser(file_path, scratch=scratch, verbose=verbose)
+    this_parser = parser
+    if this_parser is None:
+        this_parser = get_parser(file_path, scratch=scratch, verbose=verbose)
     if not this_parser:
         # we don't have any means for extracting MD.
         if verbose:
@@ -67,7 +83,12 @@ def extract_metadata(file_path, scratch=None, verbose=False):
         return dict()
 
     assert isinstance(this_parser, Parser)
-    sci_md = this_parser.get_metadata()
+    try:
+        sci_md = this_parser.get_metadata()
+    finally:
+        if parser is None:
+            # Only close the Parser if it was created here
+            this_parser.close()
     # Put the burden on cleaning for JSON here rather than on the Parsers
     sci_md = clean_attributes(sci_md)
 
@@ -77,7 +98,45 @@ def extract_metadata(file_path, scratch=None, verbose=False):
     return sci_md
 
 
-def generate_thumbnails(file_path, record_id, scratch=None, verbose=False):
+def extract_metadata_many(file_paths, workers=4, scratch=None,
+                          verbose=False):
+    """
+    Extracts metadata from many data files concurrently. Results are yielded
+    as soon as they are available rather than in the order of file_paths.
+    A failure for one file does not affect the others.
+
+    Parameters
+    ----------
+    file_paths : iterable of str
+        Paths to raw data files. Consumed lazily
+    workers : int, optional
+        Number of files to extract metadata from at the same time.
+        Default = 4
+    scratch : str, optional.
+            path to directory that can be used for scratch purposes such as
+            storing thumbnails or other temporary needs.
+            Default = same directory where raw data is located
+    verbose : bool, optional
+        Set to True to print statements for debugging purposes. Leave False
+        otherwise. Default = False
+
+    Yields
+    ------
+    tuple
+        (file_path, metadata, exception) where metadata is the dictionary
+        returned by extract_metadata and exception is None if extraction
+        succeeded. Otherwise metadata is None and exception is what was raised
+    """
+    def _extract(file_path):
+        return extract_metadata(file_path, scratch=scratch, verbose=verbose)
+
+    for file_path, sci_md, exc in imap_unordered(_extract, file_paths,
+                                                 workers=workers):
+        yield file_path, sci_md, exc
+
+
+def generate_thumbnails(file_path, record_id, scratch=None, verbose=False,
+                        parser=None):
     """
     Generates the description string for any given data file.
     This is the function that domain scientists can add to.
@@ -95,6 +154,9 @@ def generate_thumbnails(file_path, record_id, scratch=None, verbose=False):
     verbose : bool, optional
         Set to True to print statements for debugging purposes. Leave False
         otherwise. Default = False
+    parser : microflow.raw_data.parser.Parser, optional
+        Parser already constructed for this file via get_parser. Provide this
+        to avoid reading the file again after extract_metadata
 
     Returns
     -------
@@ -102,7 +164,9 @@ def generate_thumbnails(file_path, record_id, scratch=None, verbose=False):
         List of tuples of size 2 where each tuple is a pair of
         alternate text for image and path to thumbnail image
     """
-    this_parser = get_parser(file_path, scratch=scratch, verbose=verbose)
+    this_parser = parser
+    if this_parser is None:
+        this_parser = get_parser(file_path, scratch=scratch, verbose=verbose)
     if not this_parser:
         # we don't have any means for extracting thumbnails
         if verbose:
@@ -113,6 +177,11 @@ def generate_thumbnails(file_path, record_id, scratch=None, verbose=False):
     num_id = record_id.split('/')[-1]
 
     assert isinstance(this_parser, Parser)
-    tnail_pairs = this_parser.get_thumbnails(num_id)
+    try:
+        tnail_pairs = this_parser.get_thumbnails(num_id)
+    finally:
+        if parser is None:
+            # Only close the Parser if it was created here
+            this_parser.close()
 
     return tnail_pairs
@@ -3,10 +3,16 @@ import imghdr
 from PIL import Image
 from .parser import Parser
 
+# Uncompressed TIFF raw modes that can be read directly via numpy:
+# raw mode -> (numpy dtype, number of samples per pixel)
+_RAW_DTYPES = {'L': ('u1', 1), 'RGB': ('u1', 3), 'RGBA': ('u1', 4),
+               'I;16': ('<u2', 1), 'I;16B': ('>u2', 1),
+               'F;32F': ('<f4', 1), 'F;32BF': ('>f4', 1)}
+
 
 class Images(Parser):
 
-    def __init__(self, file_path, scratch=None, verbose=False):
+    def __init__(self, file_path, scratch=None, verbose=False, **kwargs):
         """
         Parser capable of generating a thumbnail of the provided image.
         Metadata is extracted by default using Apache Kita
@@ -23,11 +29,135 @@ class Images(Parser):
             otherwise. Default = False
         """
         super(Images, self).__init__(file_path, scratch=scratch,
-                                     verbose=verbose)
-        if not imghdr.what(self.file_path):
+                                     verbose=verbose, **kwargs)
+        if os.path.isdir(self.file_path) or \
+                not imghdr.what(None, h=self.header(32)):
             raise TypeError("Unable to read file: " + self.file_path)
+        self._image = None
+
+    @property
+    def image(self):
+        """
+        PIL Image for the data file. Opened lazily from the file handle that
+        this Parser already holds. Pixels are only decoded when needed
+        """
+        if self._image is None:
+            self.file_handle.seek(0)
+            self._image = Image.open(self.file_handle)
+        return self._image
+
+    def close(self):
+        """
+        Releases the image along with any file handles
+        """
+        if self._image is not None:
+            self._image.close()
+            self._image = None
+        super(Images, self).close()
+
+    def _select_pyramid_level(self, max_size):
+        """
+        Seeks to the smallest page of a multi-page (pyramidal) TIFF that is
+        still at least max_size large and has the same aspect ratio as the
+        full resolution image. Only page headers are read
+        """
+        image = self.image
+        if image.format != 'TIFF' or getattr(image, 'n_frames', 1) < 2:
+            return
+        full_w, full_h = image.size
+        best_frame, best_size = 0, image.size
+        for frame in range(1, image.n_frames):
+            image.seek(frame)
+            width, height = image.size
+            if max(width, height) < max_size:
+                continue
+            if abs(width / full_w - height / full_h) > 0.02 * width / full_w:
+                # Not a reduced version of the first page
+                continue
+            if width * height < best_size[0] * best_size[1]:
+                best_frame, best_size = frame, (width, height)
+        image.seek(best_frame)
+        if self.verbose and best_frame > 0:
+            print('Using pyramid level {} of shape: {}'
+                  ''.format(best_frame, best_size))
+
+    def _read_strided(self, max_size):
+        """
+        Reads every n-th row and column of an uncompressed TIFF whose strips
+        are stored contiguously via a memory map, such that the full image is
+        never decoded.
+
+        Returns
+        -------
+        PIL.Image.Image
+            Subsampled image. None if the image is not stored in this manner
+        """
+        image = self.image
+        if image.format != 'TIFF' or image.info.get('compression') != 'raw':
+            return None
+        if not image.tile or any(tile[0] != 'raw' for tile in image.tile):
+            return None
+        width, height = image.size
+        rawmode = image.tile[0][3][0]
+        if rawmode not in _RAW_DTYPES:
+            return None
+        dtype, samples = _RAW_DTYPES[rawmode]
+        import numpy as np
+        row_bytes = width * samples * np.dtype(dtype).itemsize
+        # Strips must span the full width and follow each other in the file
+        offset = image.tile[0][2]
+        expected = offset
+        for _, extents, tile_offset, args in image.tile:
+            x_0, y_0, x_1, y_1 = extents
+            if x_0 != 0 or x_1 != width or tile_offset != expected or \
+                    args[0] != rawmode or args[1] not in (0, row_bytes):
+                return None
+            expected += (y_1 - y_0) * row_bytes
+        if expected - offset != height * row_bytes:
+            return None
+
+        step = max(1, max(width, height) // max_size)
+        shape = (height, width, samples) if samples > 1 else (height, width)
+        data = np.memmap(self.file_path, dtype=dtype, mode='r',
+                         offset=offset, shape=shape)
+        # Only the pages holding every step-th row are read from disk
+        small = np.array(data[::step, ::step])
+        del data
+        if small.dtype.byteorder == '>':
+            small = small.astype(small.dtype.newbyteorder('='))
+        if self.verbose:
+            print('Read every {}th pixel of memory-mapped TIFF to shape: {}'
+                  ''.format(step, small.shape))
+        return Image.fromarray(small)
 
-    def get_thumbnails(self, base_name, max_size=256):
+    def _load_reduced(self, max_size):
+        """
+        Loads the image at a reduced resolution that is still at least
+        max_size large wherever the file format allows it, keeping the
+        memory needed to generate the thumbnail bounded
+
+        Returns
+        -------
+        PIL.Image.Image
+            Image to generate the thumbnail from
+        """
+        self._select_pyramid_level(max_size)
+        image = self.image
+        if image.format == 'JPEG':
+            # Let the JPEG decoder skip the unneeded DCT coefficients
+            image.draft(image.mode, (max_size, max_size))
+            return image
+        try:
+            small = self._read_strided(max_size)
+        except Exception as exc:
+            if self.verbose:
+                print('Could not read TIFF strips directly: {}'.format(exc))
+            small = None
+        if small is not None:
+            return small
+        return image
+
+    def get_thumbnails(self, base_name, max_size=256, fast=True):
         """
         Generates a thumbnail of the provided image
 
@@ -37,6 +167,11 @@ class Images(Parser):
             Prefix for the thumbnail image file. Use DataFed record ID here.
         max_size : int, optional
             Size of the largest dimension in the image
+        fast : bool, optional
+            Set to True to avoid decoding the full resolution image where
+            possible: JPEG images are decoded at a reduced scale, the smallest
+            sufficient page of pyramidal TIFFs is used, and uncompressed TIFFs
+            are subsampled via a memory map. Default = True
 
         Returns
         -------
@@ -45,10 +180,15 @@ class Images(Parser):
             "Image", Path to a thumbnail image file
         """
         try:
-            image = Image.open(self.file_path)
             if self.verbose:
                 print('Opened image: {}, of size: {}'
-                      ''.format(self.file_path, image.size))
+                      ''.format(self.file_path, self.image.size))
+            if fast:
+                image = self._load_reduced(max_size)
+            else:
+                image = self.image
+            if self.verbose:
+                print('Reading image of size: {}'.format(image.size))
             scal = max_size / max(image.size)
             new_size = (int(image.size[0] * scal), int(image.size[1] * scal))
             if self.verbose:
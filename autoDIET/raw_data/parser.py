@@ -1,11 +1,16 @@
 import sys
 import os
+import time
+import atexit
+import tempfile
+import threading
+import subprocess
 from warnings import warn
-import wget
-import tika
-from tika import parser
+from urllib.parse import urlparse
+import requests
 
 from ..utils.file_utils import validate_scratch_dir
+from ..utils.scratch import ScratchSpace
 from ..utils.dict_utils import parse_dict
 
 
@@ -49,6 +54,7 @@ def _get_local_kita_jar(root_dir, version=None, verbose=False):
             return os.path.join(root_dir, item)
     # At this point, jar file was not found locally
     # Download from Apache
+    import wget
     if verbose:
         print('Existing jar file not found. Downloading from Apache')
     return wget.download('https://dlcdn.apache.org/tika/{}/tika-server-{}.jar'
@@ -56,10 +62,333 @@ def _get_local_kita_jar(root_dir, version=None, verbose=False):
                          out=os.path.join(root_dir, target_jar))
 
 
+class TikaServer(object):
+
+    def __init__(self, jar_path=None, host='localhost', port=9998,
+                 java='java', startup_timeout=60, request_timeout=300,
+                 verbose=False):
+        """
+        Manages a single, long-lived Apache Tika server that is shared by all
+        Parsers such that the JVM is only started once per crawl. Extracting
+        metadata from a file then only costs one HTTP request.
+
+        Parameters
+        ----------
+        jar_path : str, Optional
+            Path to the Apache Tika server jar file used to start the server.
+            If not provided, the server is expected to be running already
+            at the provided host and port
+        host : str, Optional
+            Host on which the server listens. Default = "localhost"
+        port : int, Optional
+            Port on which the server listens. Default = 9998
+        java : str, Optional
+            Java executable used to start the server. Default = "java"
+        startup_timeout : float, Optional
+            Number of seconds to wait for the server to start responding.
+            Default = 60
+        request_timeout : float, Optional
+            Number of seconds to wait for the server to respond when
+            extracting metadata from a file. The server is considered hung and
+            restarted if it takes longer. Default = 300
+        verbose : bool, optional
+            Set to True to print statements for debugging purposes. Leave False
+            otherwise. Default = False
+        """
+        self.jar_path = jar_path
+        self.host = host
+        self.port = port
+        self.java = java
+        self.startup_timeout = startup_timeout
+        self.request_timeout = request_timeout
+        self.verbose = verbose
+        self._process = None
+        # Whether the server responded when last checked. Only checked again
+        # once a request fails
+        self._healthy = False
+        self._lock = threading.Lock()
+        # requests.Session objects are not thread-safe. Keep one per thread
+        # to reuse connections
+        self._local = threading.local()
+
+    def __repr__(self):
+        return 'TikaServer({})'.format(self.endpoint)
+
+    @property
+    def endpoint(self):
+        """
+        URL of the Apache Tika server
+        """
+        return 'http://{}:{}'.format(self.host, self.port)
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def is_alive(self):
+        """
+        Checks whether the server is responding to requests
+
+        Returns
+        -------
+        bool
+            True if the server is responding
+        """
+        try:
+            resp = self._session().get(self.endpoint + '/version', timeout=5)
+        except requests.RequestException:
+            return False
+        return resp.ok
+
+    def start(self):
+        """
+        Starts the server unless one is already responding at the endpoint
+        """
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        if self._process is not None and self._process.poll() is None:
+            if self.is_alive():
+                self._healthy = True
+                return
+            # Hung rather than crashed. Clear the way for a new one
+            self._stop()
+        elif self.is_alive():
+            # Started by somebody else
+            self._healthy = True
+            return
+        if not self.jar_path:
+            raise ConnectionError('Apache Tika server not reachable at {} and'
+                                  ' no jar file to start it from'
+                                  ''.format(self.endpoint))
+        if self.verbose:
+            print('Starting Apache Tika server from: ' + self.jar_path)
+        self._process = subprocess.Popen([self.java, '-jar', self.jar_path,
+                                          '--host', self.host,
+                                          '--port', str(self.port)],
+                                         stdout=subprocess.DEVNULL,
+                                         stderr=subprocess.DEVNULL)
+        deadline = time.time() + self.startup_timeout
+        while time.time() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError('Apache Tika server exited with code: {}'
+                                   ''.format(self._process.returncode))
+            if self.is_alive():
+                if self.verbose:
+                    print('Apache Tika server running at: ' + self.endpoint)
+                self._healthy = True
+                return
+            time.sleep(0.5)
+        self._stop()
+        raise TimeoutError('Apache Tika server did not start within {} '
+                           'seconds'.format(self.startup_timeout))
+
+    def ensure_running(self):
+        """
+        Starts the server if it was never started, or restarts it if the
+        process that was started has since exited. A server started by
+        somebody else is only checked until it first responds
+        """
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return
+            if self._process is None and self._healthy:
+                return
+            if self._process is not None and self.verbose:
+                print('Apache Tika server exited with code: {}. Restarting'
+                      ''.format(self._process.returncode))
+            self._start()
+
+    def restart(self):
+        """
+        Stops and starts the server
+        """
+        with self._lock:
+            self._stop()
+            self._start()
+
+    def get_metadata(self, file_path, file_handle=None):
+        """
+        Extracts metadata from the provided file
+
+        Parameters
+        ----------
+        file_path : str
+            Path to a data file
+        file_handle : file, optional
+            Binary file handle to the data file that is already open. Its
+            position is restored afterwards. Default = open the file here
+
+        Returns
+        -------
+        dict
+            Metadata returned by Apache Tika
+        """
+        self.ensure_running()
+        try:
+            return self._put_meta(file_path, file_handle=file_handle)
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            # Server may have crashed or hung mid-way. Try once more with a
+            # new one
+            if self.verbose:
+                print('Apache Tika server failed on: {}. Restarting: {}'
+                      ''.format(file_path, exc))
+            self._healthy = False
+            self.restart()
+            return self._put_meta(file_path, file_handle=file_handle)
+
+    def _put_meta(self, file_path, file_handle=None):
+        if file_handle is None:
+            with open(file_path, mode='rb') as file_handle:
+                return self._put_meta(file_path, file_handle=file_handle)
+        position = file_handle.tell()
+        file_handle.seek(0)
+        try:
+            resp = self._session().put(self.endpoint + '/meta',
+                                       data=file_handle,
+                                       headers={'Accept': 'application/json'},
+                                       timeout=self.request_timeout)
+        finally:
+            file_handle.seek(position)
+        resp.raise_for_status()
+        return resp.json()
+
+    def shutdown(self):
+        """
+        Stops the server if it was started by this object
+        """
+        with self._lock:
+            self._stop()
+
+    def _stop(self):
+        if self._process is None:
+            return
+        if self._process.poll() is None:
+            if self.verbose:
+                print('Stopping Apache Tika server')
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+        self._process = None
+        self._healthy = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+        return False
+
+
+_tika_server = None
+_tika_lock = threading.Lock()
+
+
+def get_tika_server(scratch=None, verbose=False):
+    """
+    Returns the Apache Tika server shared by all Parsers in this process,
+    creating it the first time
+
+    Parameters
+    ----------
+    scratch : str, optional.
+        path to directory that can be used to store the Apache Tika jar file.
+        Default = the temporary directory of the operating system
+    verbose : bool, optional
+        Set to True to print statements for debugging purposes. Leave False
+        otherwise. Default = False
+
+    Returns
+    -------
+    TikaServer
+        Shared Apache Tika server
+    """
+    global _tika_server
+    with _tika_lock:
+        if _tika_server is None:
+            if not scratch:
+                if verbose:
+                    print('No scratch provided. Placing Tika jar file in '
+                          'temporary directory')
+                scratch = tempfile.gettempdir()
+            jar_path = _get_local_kita_jar(scratch, verbose=verbose)
+            _tika_server = TikaServer(jar_path=jar_path, verbose=verbose)
+        return _tika_server
+
+
+def set_tika_server(server):
+    """
+    Sets the Apache Tika server to be shared by all Parsers in this process.
+    Use this to talk to a server that is managed elsewhere
+
+    Parameters
+    ----------
+    server : TikaServer
+        Apache Tika server to share
+    """
+    global _tika_server
+    if not isinstance(server, TikaServer):
+        raise TypeError('server must be a TikaServer')
+    with _tika_lock:
+        _tika_server = server
+
+
+def connect_tika_server(endpoint, verbose=False):
+    """
+    Shares the Apache Tika server that is already running at the given
+    endpoint, such as one started by the parent of this process, with all
+    Parsers in this process rather than starting another one
+
+    Parameters
+    ----------
+    endpoint : str
+        URL of the Apache Tika server, such as "http://localhost:9998"
+    verbose : bool, optional
+        Set to True to print statements for debugging purposes. Leave False
+        otherwise. Default = False
+    """
+    global _tika_server
+    parsed = urlparse(endpoint)
+    with _tika_lock:
+        if _tika_server is not None and _tika_server.jar_path is None and \
+                _tika_server.endpoint == endpoint:
+            return
+        # Any server inherited from the parent via fork belongs to the parent
+        _tika_server = TikaServer(host=parsed.hostname, port=parsed.port,
+                                  verbose=verbose)
+
+
+@atexit.register
+def shutdown_tika_server():
+    """
+    Shuts down the shared Apache Tika server, if it was started
+    """
+    global _tika_server
+    with _tika_lock:
+        if _tika_server is not None:
+            _tika_server.shutdown()
+            _tika_server = None
+
+
 class Parser(object):
 
+    # File extensions (without the leading period), MIME types, and magic
+    # numbers (leading bytes) of the files that this Parser can read.
+    # Used by babel to pick Parsers without trying every one of them
+    extensions = ()
+    mime_types = ()
+    magic = ()
+
     def __init__(self, file_path, *args, scratch=None, verbose=False,
-                 **kwargs):
+                 header=None, **kwargs):
         """
         Constructor for a Parser
 
@@ -68,23 +397,94 @@ class Parser(object):
         file_path : str
             Path to a data file or directory containing data associated
             with a single dataset
-        scratch : str, optional.
+        scratch : str or autoDIET.utils.scratch.ScratchSpace, optional.
             path to directory that can be used for scratch purposes such as
-            storing thumbnails or other temporary needs.
+            storing thumbnails or other temporary needs. Given a ScratchSpace,
+            this Parser writes into a directory of its own such that its
+            files never collide with those of other Parsers.
             Default = same directory where raw data is located
         verbose : bool, optional
             Set to True to print statements for debugging purposes. Leave False
             otherwise. Default = False
+        header : bytes, optional
+            Leading bytes of the file if they were already read
         """
         if not os.path.exists(file_path):
             raise FileNotFoundError('File for this dataset does not exist: '
                                     '{}'.format(file_path))
         self.file_path = file_path
         self.verbose = verbose
+        # Files that outlive this Parser, such as the Apache Tika jar, go into
+        # the root of the scratch space rather than this Parser's directory
+        self._own_scratch = None
+        self._shared_scratch = None
+        if isinstance(scratch, ScratchSpace):
+            self._shared_scratch = scratch.root
+            scratch = self._own_scratch = scratch.make_dir(small=True)
         self.scratch = validate_scratch_dir(scratch, verbose=verbose)
+        if self._shared_scratch is None:
+            self._shared_scratch = self.scratch
         if not self.scratch and verbose:
             print('No scratch provided. Will attempt to write to same '
                   'directory as data')
+        # Opened lazily and shared by get_metadata and get_thumbnails
+        self._file_handle = None
+        self._header = header
+
+    @property
+    def file_handle(self):
+        """
+        Binary file handle to the data file, opened the first time it is
+        needed and kept open until close is called
+        """
+        if self._file_handle is None or self._file_handle.closed:
+            self._file_handle = open(self.file_path, mode='rb')
+        return self._file_handle
+
+    def header(self, num_bytes=32):
+        """
+        Returns the first few bytes of the data file. These are read only
+        once regardless of how many times this is called
+
+        Parameters
+        ----------
+        num_bytes : int, optional
+            Number of bytes at the start of the file. Default = 32
+
+        Returns
+        -------
+        bytes
+            Header of the file. Empty if the dataset is a directory
+        """
+        if self._header is None or len(self._header) < num_bytes:
+            if os.path.isdir(self.file_path):
+                return b''
+            handle = self.file_handle
+            handle.seek(0)
+            self._header = handle.read(max(num_bytes, 32))
+        return self._header[:num_bytes]
+
+    def close(self):
+        """
+        Releases any file handles and decoded content held by this Parser
+        """
+        if self._file_handle is not None:
+            self._file_handle.close()
+            self._file_handle = None
+        if getattr(self, '_own_scratch', None):
+            try:
+                # Only once the thumbnails were moved or deleted
+                os.rmdir(self._own_scratch)
+                self._own_scratch = None
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
 
     def get_metadata(self):
         """
@@ -96,18 +496,14 @@ class Parser(object):
         dict
             Dictionary with metadata
         """
-        parent_dir, _ = os.path.split(self.file_path)
-
-        if not self.scratch:  # and not os.access(parent_dir, os.W_OK):
-            warn('Nowhere to place Tika jar file. Using Tika in online mode')
-            # Rely on directly talking to the mothership
-        else:
-            # TODO: Resort to downloading only if online mode fails.
-            os.environ['TIKA_SERVER_JAR'] = _get_local_kita_jar(self.scratch, verbose=self.verbose)
-
         try:
-            tika.initVM()
-            parsed = parser.from_file(self.file_path)
+            server = get_tika_server(scratch=self._shared_scratch,
+                                     verbose=self.verbose)
+            handle = None
+            if not os.path.isdir(self.file_path):
+                # Stream the file from the handle this Parser already holds
+                handle = self.file_handle
+            parsed = server.get_metadata(self.file_path, file_handle=handle)
         except Exception as _:
             # If anything goes wrong, just tell the user it was not possible
             exc_type, exc_obj, exc_tb = sys.exc_info()
@@ -127,7 +523,7 @@ class Parser(object):
         ignore_keys = ['X-Parsed-By', 'X-TIKA:embedded_depth', 'Content-Type',
                        'X-TIKA:parse_time_millis', 'resourceName']
 
-        return parse_dict(parsed['metadata'], ignore_keys=ignore_keys)
+        return parse_dict(parsed, ignore_keys=ignore_keys)
 
     def get_thumbnails(self, base_name, *args, **kwargs):
         """
@@ -0,0 +1,269 @@
+import os
+import sys
+import mimetypes
+import importlib
+import threading
+from warnings import warn
+
+ENTRY_POINT_GROUP = 'autoDIET.parsers'
+
+
+class ParserSpec(object):
+
+    def __init__(self, target, extensions=(), mime_types=(), magic=()):
+        """
+        Describes a Parser class without importing it. The module containing
+        the Parser, along with its dependencies, is only imported the first
+        time a file that the Parser may be able to read is encountered.
+
+        Parameters
+        ----------
+        target : str
+            Location of the Parser class as "package.module:ClassName"
+        extensions : tuple of str, optional
+            File extensions (without the leading period) the Parser can read
+        mime_types : tuple of str, optional
+            MIME types of the files the Parser can read
+        magic : tuple of bytes, optional
+            Leading bytes of the files the Parser can read
+        """
+        if not isinstance(target, str) or target.count(':') != 1:
+            raise ValueError('target should be a string formatted as '
+                             '"package.module:ClassName"')
+        self.target = target
+        self.extensions = tuple(extensions)
+        self.mime_types = tuple(mime_types)
+        self.magic = tuple(magic)
+        self._class = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'ParserSpec({})'.format(self.target)
+
+    def load(self):
+        """
+        Imports the Parser class
+
+        Returns
+        -------
+        class
+            Child class of microflow.raw_data.parser.Parser
+        """
+        if self._class is None:
+            with self._lock:
+                if self._class is None:
+                    module_name, class_name = self.target.split(':')
+                    module = importlib.import_module(module_name)
+                    self._class = getattr(module, class_name)
+        return self._class
+
+
+def _iter_entry_points(group):
+    """
+    Returns the entry points registered by installed packages for the given
+    group
+    """
+    if sys.version_info >= (3, 8):
+        from importlib import metadata
+        eps = metadata.entry_points()
+        if hasattr(eps, 'select'):
+            return list(eps.select(group=group))
+        return list(eps.get(group, []))
+    try:
+        import pkg_resources
+    except ImportError:
+        return []
+    return list(pkg_resources.iter_entry_points(group))
+
+
+class ParserRegistry(object):
+
+    def __init__(self, fallback=None):
+        """
+        Index of Parser classes by the file extensions, MIME types and
+        magic numbers (leading bytes) that they declare. Finding the Parser
+        for a file only requires reading its header once and a few dictionary
+        lookups, regardless of how many Parsers are registered.
+
+        Parsers may be registered as classes or as ParserSpecs, which defer
+        importing the Parser until it is needed. Other packages can provide
+        Parsers via the "autoDIET.parsers" entry point group. Each entry point
+        should refer to a ParserSpec (preferably defined in a module that
+        does not import anything heavy) or to a Parser class. Entry points
+        are discovered the first time a Parser is looked up.
+
+        Parameters
+        ----------
+        fallback : class, optional
+            Parser class to use when no registered Parser matches a file
+        """
+        self.fallback = fallback
+        self._entry_points_loaded = False
+        self._by_ext = dict()
+        self._by_mime = dict()
+        # Length of magic number -> {magic number: [Parser classes]}
+        self._by_magic = dict()
+        self._header_size = 0
+        # (extension, magic number) -> tuple of candidate Parser classes
+        self._cache = dict()
+        self._lock = threading.Lock()
+
+    def register(self, parser_class):
+        """
+        Registers a Parser class using its extensions, mime_types, and magic
+        class attributes. Parsers registered later take precedence over
+        those registered earlier for the same key.
+
+        Parameters
+        ----------
+        parser_class : class or ParserSpec
+            Child class of microflow.raw_data.parser.Parser or a ParserSpec
+            that describes one
+
+        Returns
+        -------
+        class or ParserSpec
+            The same object, so that this can be used as a class decorator
+        """
+        with self._lock:
+            for ext in getattr(parser_class, 'extensions', ()):
+                self._by_ext.setdefault(ext.lower().lstrip('.'),
+                                        list()).insert(0, parser_class)
+            for mime in getattr(parser_class, 'mime_types', ()):
+                self._by_mime.setdefault(mime.lower(),
+                                         list()).insert(0, parser_class)
+            for magic in getattr(parser_class, 'magic', ()):
+                if not isinstance(magic, bytes) or len(magic) == 0:
+                    raise TypeError('magic numbers must be non-empty bytes')
+                self._by_magic.setdefault(len(magic), dict()).setdefault(
+                    magic, list()).insert(0, parser_class)
+                self._header_size = max(self._header_size, len(magic))
+            self._cache.clear()
+        return parser_class
+
+    def load_entry_points(self, group=ENTRY_POINT_GROUP):
+        """
+        Registers the Parsers provided by installed packages. Only the
+        modules the entry points refer to are imported
+
+        Parameters
+        ----------
+        group : str, optional
+            Name of the entry point group. Default = "autoDIET.parsers"
+        """
+        self._entry_points_loaded = True
+        for entry_point in _iter_entry_points(group):
+            try:
+                self.register(entry_point.load())
+            except Exception as exc:
+                warn('Could not load Parser from entry point: {}\n{}: {}'
+                     ''.format(entry_point, type(exc).__name__, exc))
+
+    def _sniff(self, file_path):
+        """
+        Reads the leading bytes of the file. Empty for directories
+        """
+        if os.path.isdir(file_path):
+            return b''
+        with open(file_path, mode='rb') as file_handle:
+            return file_handle.read(max(self._header_size, 32))
+
+    def _match_magic(self, header):
+        # Longest (most specific) magic numbers first
+        for length in sorted(self._by_magic, reverse=True):
+            magic = header[:length]
+            if magic in self._by_magic[length]:
+                return magic
+        return None
+
+    def candidates(self, file_path, header=None):
+        """
+        Returns the Parser classes that could read the provided file, most
+        specific first
+
+        Parameters
+        ----------
+        file_path : str
+            Path to a data file or directory
+        header : bytes, optional
+            Leading bytes of the file if already read
+
+        Returns
+        -------
+        tuple
+            Parser classes or ParserSpecs to attempt in order
+        """
+        if not self._entry_points_loaded:
+            self.load_entry_points()
+        if header is None:
+            header = self._sniff(file_path)
+        ext = os.path.splitext(file_path)[1].lower().lstrip('.')
+        magic = self._match_magic(header)
+        key = (ext, magic)
+        found = self._cache.get(key)
+        if found is not None:
+            return found
+
+        ordered = list()
+        if magic is not None:
+            ordered += self._by_magic[len(magic)][magic]
+        ordered += self._by_ext.get(ext, [])
+        mime, _ = mimetypes.guess_type('file.' + ext) if ext else (None, None)
+        if mime:
+            ordered += self._by_mime.get(mime.lower(), [])
+        if self.fallback is not None:
+            ordered.append(self.fallback)
+        # Remove duplicates while preserving order
+        found = tuple(dict.fromkeys(ordered))
+        with self._lock:
+            self._cache[key] = found
+        return found
+
+    def get_parser(self, file_path, scratch=None, verbose=False):
+        """
+        Returns an instance of the first Parser capable of reading the file
+
+        Parameters
+        ----------
+        file_path : str
+            Path to a data file or directory containing data associated
+            with a single dataset
+        scratch : str, optional.
+            path to directory that can be used for scratch purposes such as
+            storing thumbnails or other temporary needs.
+            Default = same directory where raw data is located
+        verbose : bool, optional
+            Set to True to print statements for debugging purposes. Leave False
+            otherwise. Default = False
+
+        Returns
+        -------
+        microflow.raw_data.parser.Parser
+            Child class of the Parser class. None if no Parser could read the
+            file
+        """
+        if not os.path.exists(file_path):
+            if verbose:
+                print('File for this dataset does not exist: ' + file_path)
+            return None
+        if not self._entry_points_loaded:
+            self.load_entry_points()
+        header = self._sniff(file_path)
+        for this_class in self.candidates(file_path, header=header):
+            try:
+                if isinstance(this_class, ParserSpec):
+                    # Import the Parser only now that it is needed
+                    this_class = this_class.load()
+                return this_class(file_path, scratch=scratch, verbose=verbose,
+                                  header=header)
+            except (TypeError, ValueError) as exc:
+                # This Parser cannot read this particular file
+                if verbose:
+                    print('{} cannot read {}: {}'
+                          ''.format(getattr(this_class, '__name__',
+                                            this_class), file_path, exc))
+            except Exception as exc:
+                warn('{} failed to read {}\n{}: {}'
+                     ''.format(getattr(this_class, '__name__', this_class),
+                               file_path, type(exc).__name__, exc))
+        return None
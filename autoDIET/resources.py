@@ -0,0 +1,158 @@
+from warnings import warn
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils.file_utils import validate_scratch_dir
+from .utils.scratch import ScratchSpace
+from .utils.sync_state import SyncState
+from .utils.thumbnail_cache import ThumbnailCache
+from .cloud.cloud_provider import CloudProvider
+from .cloud.cloud_spawn import setup_tnail_cloud
+from .pipeline import ThumbnailPipeline
+from .raw_data.parser import get_tika_server
+
+
+def open_cloud(cloud, executor=None):
+    """
+    Returns the CloudProvider for the given path to a configuration file,
+    unless tasks run in other processes, in which case only the path can be
+    passed along. The provider is set up in this process regardless, such
+    that files are served, if so configured, once by this process
+    """
+    if not cloud or isinstance(cloud, CloudProvider):
+        return cloud
+    provider = setup_tnail_cloud(cloud)
+    if executor and executor.uses_processes:
+        return cloud
+    return provider
+
+
+def open_tika_server(executor=None, scratch=None, verbose=False):
+    """
+    Starts the Apache Tika server of this process if tasks run in other
+    processes and returns its endpoint, such that they all connect to this
+    one server rather than each starting one of their own. None otherwise,
+    in which case Parsers start the server when first needed
+    """
+    if not (executor and executor.uses_processes):
+        return None
+    try:
+        server = get_tika_server(scratch=getattr(scratch, 'root', scratch),
+                                 verbose=verbose)
+        server.ensure_running()
+    except Exception as exc:
+        warn('Could not start Apache Tika server: {}: {}'
+             ''.format(type(exc).__name__, exc))
+        return None
+    return server.endpoint
+
+
+def open_thumbnail_cache(tnail_cache, executor=None):
+    """
+    Returns an instance of ThumbnailCache unless tasks run in other processes,
+    in which case only the path to the cache directory can be passed along
+    """
+    if not tnail_cache or isinstance(tnail_cache, ThumbnailCache):
+        return tnail_cache
+    if executor and executor.uses_processes:
+        return tnail_cache
+    return ThumbnailCache(tnail_cache)
+
+
+def open_thumbnail_pipeline(tnail_pipeline, cloud, executor=None,
+                            scratch=None, tnail_cache=None, verbose=False,
+                            own_executor=True):
+    """
+    Returns an instance of ThumbnailPipeline and whether or not the caller
+    owns it. The caller cannot own a pipeline that tasks on an executor it
+    does not own would still submit to after it returns
+    """
+    if not tnail_pipeline or isinstance(tnail_pipeline, ThumbnailPipeline):
+        return tnail_pipeline, False
+    if not isinstance(tnail_pipeline, int):
+        raise TypeError('tnail_pipeline must either be an int or a '
+                        'ThumbnailPipeline')
+    if not isinstance(cloud, CloudProvider):
+        return None, False
+    if executor and executor.uses_processes:
+        warn('Thumbnails are added synchronously when using a pool of '
+             'processes')
+        return None, False
+    if executor and not own_executor:
+        warn('Thumbnails are added synchronously when an executor is '
+             'provided. Provide an instance of ThumbnailPipeline instead')
+        return None, False
+    return ThumbnailPipeline(cloud, workers=tnail_pipeline, scratch=scratch,
+                             tnail_cache=tnail_cache, verbose=verbose), True
+
+
+def open_scratch(scratch, executor=None, own_executor=True):
+    """
+    Returns an instance of ScratchSpace for the given scratch directory and
+    whether or not the caller owns it. Tasks running in other processes are
+    given the path to the scratch directory instead, as are tasks on an
+    executor that the caller does not own since they may outlive the caller
+    """
+    if not scratch or isinstance(scratch, ScratchSpace):
+        return scratch, False
+    if executor and (executor.uses_processes or not own_executor):
+        return scratch, False
+    if not validate_scratch_dir(scratch):
+        # Same as before: write next to the raw data instead
+        return None, False
+    return ScratchSpace(scratch), True
+
+
+def open_sync_state(state, executor=None):
+    """
+    Returns an instance of SyncState and whether or not the caller owns it
+    (and is therefore responsible for closing it). The caller cannot own the
+    state if tasks on an executor it does not own still use the state after
+    it returns
+    """
+    if not state or isinstance(state, SyncState):
+        return state, False
+    if executor is not None:
+        raise TypeError('state must be an instance of SyncState when an '
+                        'executor is provided since the state must remain '
+                        'open until all tasks on the executor are complete')
+    return SyncState(state), True
+
+
+def open_listing_pool(listing_pool, workers=4):
+    """
+    Returns the pool of threads that fetches the pages of collection
+    listings, and whether it was created here. A single pool for an entire
+    crawl means that each of its threads sets up its instance of the API only
+    once rather than once per listing
+    """
+    if listing_pool is not None:
+        return listing_pool, False
+    return ThreadPoolExecutor(max_workers=workers,
+                              thread_name_prefix='CollectionListing'), True
+
+
+def release_owned(executor=None, tnail_pipeline=None, state=None,
+                  scratch=None, listing_pool=None):
+    """
+    Releases the resources that a crawl opened for itself, in order, even if
+    releasing one of them fails
+    """
+    try:
+        if executor:
+            executor.shutdown(wait=True)
+    finally:
+        try:
+            if tnail_pipeline:
+                # Records are all created. Wait for their thumbnails
+                tnail_pipeline.close(wait=True)
+        finally:
+            try:
+                if state:
+                    state.close()
+            finally:
+                try:
+                    if scratch:
+                        scratch.close()
+                finally:
+                    if listing_pool:
+                        listing_pool.shutdown(wait=True)
@@ -1 +1,2 @@
-from . import dict_utils, datafed_utils, file_utils
\ No newline at end of file
+from . import archive_utils, dict_utils, datafed_utils, file_utils, \
+    parallel_utils, scratch, sync_state, thumbnail_cache
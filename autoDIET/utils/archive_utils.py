@@ -0,0 +1,414 @@
+import os
+import time
+import zlib
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Extensions of formats whose contents are always compressed such that
+# compressing them again costs CPU time without saving space. Containers
+# such as HDF5 or NetCDF only compress some datasets, if any, so sampling
+# decides for those
+COMPRESSED_EXTENSIONS = {'.gz', '.tgz', '.bz2', '.xz', '.zst', '.lz4', '.zip',
+                         '.7z', '.rar', '.png', '.jpg', '.jpeg', '.gif',
+                         '.webp', '.mp4', '.mov', '.avi', '.mkv', '.mp3'}
+
+_SUFFIXES = {None: '.tar', 'gzip': '.tar.gz', 'zstd': '.tar.zst'}
+
+# Levels at which each codec spends next to no time on data that does not
+# compress. gzip stores such data as is while zstd's fastest levels barely
+# look for matches
+_STORE_LEVELS = {'gzip': 0, 'zstd': -50}
+
+
+def sample_compressibility(file_path, sample_size=64 * 1024, samples=3):
+    """
+    Estimates how well the contents of a file compress by compressing a few
+    samples from the start, middle, and end of the file with a fast codec
+    rather than the entire file
+
+    Parameters
+    ----------
+    file_path : str
+        Path to a file
+    sample_size : int, optional
+        Number of bytes in each sample. Default = 64 KB
+    samples : int, optional
+        Number of samples spread evenly over the file. Default = 3
+
+    Returns
+    -------
+    float
+        Size of the compressed samples relative to their original size.
+        Close to (or above) 1 for data that is already compressed
+    """
+    file_size = os.path.getsize(file_path)
+    if file_size == 0:
+        return 1.0
+    if file_size <= sample_size * samples:
+        offsets = [0]
+        sample_size = file_size
+    else:
+        step = (file_size - sample_size) // max(samples - 1, 1)
+        offsets = [ind * step for ind in range(samples)]
+    raw_bytes = 0
+    comp_bytes = 0
+    with open(file_path, mode='rb') as file_handle:
+        for offset in offsets:
+            file_handle.seek(offset)
+            chunk = file_handle.read(sample_size)
+            raw_bytes += len(chunk)
+            comp_bytes += len(zlib.compress(chunk, 1))
+    return float(comp_bytes) / max(raw_bytes, 1)
+
+
+class _ParallelGzipWriter(object):
+
+    def __init__(self, fileobj, level=6, workers=None, block_size=1024 ** 2):
+        """
+        Write-only file-like object that compresses blocks of what is written
+        to it on a pool of threads (zlib releases the GIL), similar to pigz.
+        Each block becomes a gzip member of its own. Concatenated gzip members
+        form a valid gzip stream that any gzip reader decompresses.
+
+        Parameters
+        ----------
+        fileobj : file-like
+            Binary file to write the compressed stream to
+        level : int, optional
+            Compression level from 0 (store) to 9 (smallest). Default = 6
+        workers : int, optional
+            Number of threads compressing blocks. Default = number of CPUs
+        block_size : int, optional
+            Number of bytes compressed as a single block. Default = 1 MB
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.fileobj = fileobj
+        self.level = level
+        self.block_size = block_size
+        self._buffer = bytearray()
+        self._pending = deque()
+        # Bounds the memory held by blocks waiting to be written out
+        self._max_pending = 2 * workers
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+
+    @staticmethod
+    def _compress(block, level):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(block) + compressor.flush()
+
+    def _drain(self, keep):
+        # Blocks are written in the order they were submitted
+        while len(self._pending) > keep:
+            self.fileobj.write(self._pending.popleft().result())
+
+    def _submit(self, block):
+        self._pending.append(self._pool.submit(self._compress, bytes(block),
+                                               self.level))
+        self._drain(self._max_pending)
+
+    def set_level(self, level):
+        """
+        Compresses whatever is written from now on at the given level.
+        Whatever was written before remains at the previous level
+        """
+        if level == self.level:
+            return
+        if self._buffer:
+            self._submit(self._buffer)
+            self._buffer = bytearray()
+        self.level = level
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(self._buffer[:self.block_size])
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def flush(self):
+        """
+        Compresses whatever is buffered as a block of its own and writes out
+        every pending block
+        """
+        if self._buffer:
+            self._submit(self._buffer)
+            self._buffer = bytearray()
+        self._drain(0)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._pool.shutdown(wait=True)
+
+
+class _ZstdWriter(object):
+
+    def __init__(self, fileobj, level=3, workers=None):
+        """
+        Write-only file-like object that compresses into fileobj using
+        multi-threaded zstandard. Changing the level starts a new frame.
+        Concatenated frames form a valid zstandard stream
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.fileobj = fileobj
+        self.workers = workers
+        self.level = level
+        self._writer = self._new_writer()
+
+    def _new_writer(self):
+        compressor = zstandard.ZstdCompressor(level=self.level,
+                                              threads=self.workers)
+        return compressor.stream_writer(self.fileobj, closefd=False)
+
+    def set_level(self, level):
+        """
+        Compresses whatever is written from now on at the given level
+        """
+        if level == self.level:
+            return
+        self._writer.close()
+        self.level = level
+        self._writer = self._new_writer()
+
+    def write(self, data):
+        return self._writer.write(data)
+
+    def close(self):
+        self._writer.close()
+
+
+def _open_compressor(fileobj, codec, level=None, workers=None):
+    """
+    Returns a write-only file-like object that compresses into fileobj with
+    the given codec
+    """
+    if codec is None:
+        return None
+    if codec == 'gzip':
+        if level is None:
+            level = 6
+        return _ParallelGzipWriter(fileobj, level=level, workers=workers)
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ImportError('The zstandard package is required for the '
+                              'zstd codec')
+        if level is None:
+            level = 3
+        return _ZstdWriter(fileobj, level=level, workers=workers)
+    raise ValueError('codec must be one of: "auto", "gzip", "zstd", or None')
+
+
+def _iter_tree(path, arcname):
+    """
+    Yields the paths within the given directory tree along with their names
+    within the archive, in the same order as tarfile.TarFile.add
+    """
+    yield path, arcname
+    if os.path.isdir(path) and not os.path.islink(path):
+        for name in sorted(os.listdir(path)):
+            for item in _iter_tree(os.path.join(path, name),
+                                   arcname + '/' + name):
+                yield item
+
+
+def _walk_sizes(source_dir):
+    """
+    Returns the paths and sizes of all files within source_dir
+    """
+    sizes = list()
+    for root, _, file_names in os.walk(source_dir):
+        for file_name in file_names:
+            file_path = os.path.join(root, file_name)
+            if os.path.isfile(file_path):
+                sizes.append((file_path, os.path.getsize(file_path)))
+    return sizes
+
+
+def _pick_codec(sizes, fraction=0.9):
+    """
+    Returns None if nearly all bytes belong to formats that are already
+    compressed and gzip otherwise
+    """
+    total = sum(size for _, size in sizes)
+    compressed = sum(size for path, size in sizes
+                     if os.path.splitext(path)[1].lower() in
+                     COMPRESSED_EXTENSIONS)
+    if total and compressed >= fraction * total:
+        return None
+    return 'gzip'
+
+
+class ArchiveResult(object):
+
+    def __init__(self, path, codec, members, raw_bytes, archive_bytes,
+                 seconds, stored_members=0, stored_bytes=0):
+        """
+        Describes an archive written by make_archive
+
+        Parameters
+        ----------
+        path : str
+            Path to the archive
+        codec : str
+            Codec that the archive was compressed with. None if not compressed
+        members : int
+            Number of files within the archive
+        raw_bytes : int
+            Total size of the files within the archive
+        archive_bytes : int
+            Size of the archive
+        seconds : float
+            Time taken to write the archive
+        stored_members : int, optional
+            Number of files that were found not to compress and were
+            therefore written without compression. Default = 0
+        stored_bytes : int, optional
+            Total size of these files. Default = 0
+        """
+        self.path = path
+        self.codec = codec
+        self.members = members
+        self.raw_bytes = raw_bytes
+        self.archive_bytes = archive_bytes
+        self.seconds = seconds
+        self.stored_members = stored_members
+        self.stored_bytes = stored_bytes
+
+    @property
+    def stored_fraction(self):
+        """
+        Fraction of the bytes that were not compressed since they would not
+        have compressed anyway
+        """
+        if not self.raw_bytes:
+            return 0.0
+        return float(self.stored_bytes) / self.raw_bytes
+
+    @property
+    def ratio(self):
+        """
+        Size of the files relative to the size of the archive
+        """
+        if not self.archive_bytes:
+            return 1.0
+        return float(self.raw_bytes) / self.archive_bytes
+
+    def __repr__(self):
+        return 'ArchiveResult({}, codec={}, members={}, ratio={:.2f}, ' \
+               'stored={:.0%}, seconds={:.2f})' \
+               ''.format(self.path, self.codec, self.members, self.ratio,
+                         self.stored_fraction, self.seconds)
+
+    def __fspath__(self):
+        return self.path
+
+
+def make_archive(source_dir, dest=None, codec='auto', level=None,
+                 workers=None, sample=True, max_ratio=0.95,
+                 min_sample_size=16 * 1024):
+    """
+    Archives the provided directory into a tar file, compressing it on
+    several threads while it is being written. The archive is streamed
+    straight into its destination (e.g. a staging area visible to Globus)
+    without writing an intermediate uncompressed tar file, and only appears
+    under its final name once it is complete.
+
+    Parameters
+    ----------
+    source_dir : str
+        Path to a directory
+    dest : str, Optional.
+        Path for resulting archive or directory to place the archive in.
+        Default = next to source_dir
+    codec : str, Optional.
+        "gzip" for gzip compressed in parallel blocks (readable by any gzip
+        reader), "zstd" for multi-threaded zstandard (requires the zstandard
+        package), None to not compress at all, or "auto" to skip compression
+        if nearly all the data is in formats that are already compressed and
+        use gzip otherwise. Default = "auto"
+    level : int, Optional.
+        Compression level. Default = 6 for gzip and 3 for zstd
+    workers : int, Optional.
+        Number of threads compressing the archive. Default = number of CPUs
+    sample : bool, Optional.
+        Set to True to sample how well each file compresses (see
+        sample_compressibility) and write files that do not compress, such
+        as PNG images or HDF5 files with compressed datasets, without
+        compressing them again. Default = True
+    max_ratio : float, Optional.
+        Files whose samples compress to more than this fraction of their
+        size are not compressed. Default = 0.95
+    min_sample_size : int, Optional.
+        Files smaller than this many bytes are always compressed since
+        sampling them costs as much as compressing them. Default = 16 KB
+
+    Returns
+    -------
+    ArchiveResult
+        Path to the archive along with statistics about it
+    """
+    if not os.path.isdir(source_dir):
+        raise ValueError('source_dir must be a directory: '
+                         '{}'.format(source_dir))
+    start = time.time()
+    sizes = _walk_sizes(source_dir)
+    if codec == 'auto':
+        codec = _pick_codec(sizes)
+    if codec not in _SUFFIXES:
+        raise ValueError('codec must be one of: "auto", "gzip", "zstd", or '
+                         'None')
+
+    base_name = os.path.basename(os.path.normpath(source_dir))
+    if dest is None:
+        dest = os.path.dirname(os.path.abspath(source_dir))
+    if os.path.isdir(dest):
+        dest = os.path.join(dest, base_name + _SUFFIXES[codec])
+
+    if level is None:
+        level = {'gzip': 6, 'zstd': 3}.get(codec)
+    stored_members = 0
+    stored_bytes = 0
+    partial_path = dest + '.partial'
+    try:
+        with open(partial_path, mode='wb') as file_handle:
+            compressor = _open_compressor(file_handle, codec, level=level,
+                                          workers=workers)
+            # Stream mode never seeks, so it can write into a compressor
+            with tarfile.open(fileobj=compressor or file_handle,
+                              mode='w|') as tar:
+                for path, arcname in _iter_tree(source_dir, base_name):
+                    tarinfo = tar.gettarinfo(path, arcname=arcname)
+                    if not tarinfo.isreg():
+                        tar.addfile(tarinfo)
+                        continue
+                    if compressor is not None and sample:
+                        store = tarinfo.size >= min_sample_size and \
+                            sample_compressibility(path) > max_ratio
+                        if store:
+                            stored_members += 1
+                            stored_bytes += tarinfo.size
+                        compressor.set_level(_STORE_LEVELS[codec] if store
+                                             else level)
+                    with open(path, mode='rb') as member_handle:
+                        tar.addfile(tarinfo, member_handle)
+            if compressor is not None:
+                compressor.close()
+        os.replace(partial_path, dest)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return ArchiveResult(dest, codec, len(sizes),
+                         sum(size for _, size in sizes),
+                         os.path.getsize(dest), time.time() - start,
+                         stored_members=stored_members,
+                         stored_bytes=stored_bytes)
@@ -1,43 +1,522 @@
 import math
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datafed.CommandLib import API
 
+_thread_state = threading.local()
 
-def items_in_this_page(ls_resp, mode=None):
+
+def thread_local_api(endpoint=None, context=None):
     """
-    Returns a dictionary of data record and/or collections from the given
-    listing response from DataFed
+    Returns an instance of the DataFed CommandLib API that belongs to the
+    calling thread. Instances of the API cannot be shared safely between
+    threads, so each worker in a pool lazily creates and then reuses its own.
+    New instances are set up from the default configuration (configuration
+    files and environment variables). Pass the endpoint and context of the
+    caller's instance to carry them over
 
     Parameters
     ----------
-    ls_resp : protobuf message
-        Message containing the listing reply
-    mode : str, optional
-        Set to "d" to only get datasets from the listing
-        Set to "c" to only get collections from the listing
-        Leave unset for all items in the listing
+    endpoint : str, optional
+        Globus endpoint to use for data transfers. Default = as configured
+    context : str, optional
+        User or project ID to resolve relative aliases against.
+        Default = as configured
+
+    Returns
+    -------
+    datafed.CommandLib.API
+        Instance of the DataFed CommandLib API for this thread
+    """
+    df_api = getattr(_thread_state, 'df_api', None)
+    if df_api is None:
+        df_api = API()
+        _thread_state.df_api = df_api
+    if endpoint and df_api.endpointGet() != endpoint:
+        df_api.endpointSet(endpoint)
+    if context and df_api.getContext() != context:
+        df_api.setContext(context)
+    return df_api
+
+
+def api_settings(df_api):
+    """
+    Returns the settings of the given instance of the API that instances
+    returned by thread_local_api need in order to act on its behalf
+
+    Parameters
+    ----------
+    df_api : datafed.CommandLib.API
+        Instance of the DataFed CommandLib API
 
     Returns
     -------
     dict
-        Keys are IDs and values are the title for the object
+        Keyword arguments for thread_local_api
+    """
+    return dict(endpoint=df_api.endpointGet(), context=df_api.getContext())
+
+
+def _fetch_page(coll_id_alias, context, offset):
+    return thread_local_api().collectionItemsList(coll_id_alias,
+                                                  context=context,
+                                                  offset=offset)
+
+
+def _iter_pages(coll_id_alias, context=None, df_api=None, workers=4,
+                ordered=True, pool=None):
+    """
+    Yields the listing responses for every page of the given collection. The
+    first page is fetched via df_api to learn the number of pages, after
+    which up to workers pages are fetched concurrently
+
+    Parameters
+    ----------
+    ordered : bool, optional
+        Set to True to yield pages in order. Otherwise, pages are yielded as
+        soon as they arrive. Default = True
+    pool : concurrent.futures.ThreadPoolExecutor, optional
+        Pool of threads to fetch pages with. Default = a pool for this call
+    """
+    if not isinstance(workers, int) or workers < 1:
+        raise ValueError('workers must be a positive integer')
+    if not df_api:
+        df_api = API()
+    # First do an LS
+    ls_resp = df_api.collectionItemsList(coll_id_alias,
+                                         context=context)
+    yield ls_resp
+    # Gather important information like the number of pages, page size, etc.
+    page_size = ls_resp[0].count
+    if not page_size:
+        return
+    num_pages = math.ceil(ls_resp[0].total / page_size)
+    offsets = [page_size * page_ind for page_ind in range(1, num_pages)]
+    if not offsets:
+        return
+
+    if workers == 1 or len(offsets) == 1:
+        for offset in offsets:
+            yield df_api.collectionItemsList(coll_id_alias, context=context,
+                                             offset=offset)
+        return
+
+    if context is None and hasattr(df_api, 'getContext'):
+        # Other threads use their own API whose context may differ
+        context = df_api.getContext()
+    own_pool = pool is None
+    if own_pool:
+        pool = ThreadPoolExecutor(max_workers=min(workers, len(offsets)))
+    offsets = iter(offsets)
+    pending = list()
+    try:
+        for offset in offsets:
+            pending.append(pool.submit(_fetch_page, coll_id_alias, context,
+                                       offset))
+            if len(pending) >= workers:
+                break
+        while pending:
+            if ordered:
+                done = [pending[0]]
+                done[0].result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                yield future.result()
+                # Keep up to workers requests in flight
+                for offset in offsets:
+                    pending.append(pool.submit(_fetch_page, coll_id_alias,
+                                               context, offset))
+                    break
+    finally:
+        # Consumer may have stopped iterating early
+        for future in pending:
+            future.cancel()
+        if own_pool:
+            # Requests already in flight finish in the background
+            pool.shutdown(wait=False)
+
+
+def iter_items_in_coll(coll_id_alias, context=None, mode=None, df_api=None,
+                       workers=4, pool=None):
     """
-    data_objects = dict()
+    Yields the data records and/or collections in the given collection as
+    soon as each page of the listing arrives, rather than waiting for the
+    entire listing. Pages are fetched concurrently, so items are not
+    necessarily yielded in the order that DataFed lists them
+
+    Parameters
+    ----------
+    coll_id_alias : str
+        ID or alias for DataFed collection
+    context : str
+        Context such as a project or user ID where this collection is located
+        Not required if an ID is provided in place of an alias
+    mode : str, optional
+        Set to "d" to only get datasets from the listing
+        Set to "c" to only get collections from the listing
+        Leave unset for all items in the listing
+    df_api : datafed.CommandLib.API instance
+        Instance of the DataFed CommandLib API
+    workers : int, optional
+        Maximum number of pages requested at the same time. Default = 4
+    pool : concurrent.futures.ThreadPoolExecutor, optional
+        Pool of threads to fetch pages with. Reusing the same pool for many
+        listings also reuses the instance of the API in each of its threads.
+        Default = a pool for this call
 
-    if not mode:
-        # return everything - records and collections
+    Yields
+    ------
+    tuple
+        (title, ID) of each item
+    """
+    for ls_resp in _iter_pages(coll_id_alias, context=context, df_api=df_api,
+                               workers=workers, ordered=False, pool=pool):
         for item in ls_resp[0].item:
-            data_objects[item.title] = item.id
-    else:
+            if not mode or item.id.startswith(mode):
+                yield item.title, item.id
+
+
+class CollectionIndex(object):
+
+    def __init__(self):
+        """
+        Compact index of the items in a DataFed collection built in a single
+        pass over its listing. Titles, IDs, and types (the first character of
+        the ID, e.g. "d" for data records and "c" for collections) are held
+        as columns, along with a per-type lookup from title to position.
+        Items sharing a title are kept rather than silently overwritten and
+        can be reported via duplicates.
+        """
+        self.titles = list()
+        self.ids = list()
+        self.types = bytearray()
+        # type -> {title: position of the last item with this title}
+        self._by_title = dict()
+        self._duplicates = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return 'CollectionIndex({} items)'.format(len(self))
+
+    @staticmethod
+    def _type_of(mode):
+        """
+        Returns the type code for a mode such as "d/" or "c/". None for no
+        mode. Raises ValueError for modes that are not a type prefix
+        """
+        if not mode:
+            return None
+        code = mode.rstrip('/')
+        if len(code) != 1:
+            raise ValueError('mode should be "d/" or "c/". Provided: '
+                             '{}'.format(mode))
+        return ord(code)
+
+    def add(self, title, item_id):
+        """
+        Adds an item to the index. Adding an item that is already the latest
+        one with this title and type is a no-op
+
+        Parameters
+        ----------
+        title : str
+            Title of the data record or collection
+        item_id : str
+            ID of the data record or collection
+        """
+        code = ord(item_id[0]) if item_id else 0
+        with self._lock:
+            titles = self._by_title.setdefault(code, dict())
+            position = titles.get(title)
+            if position is not None:
+                if self.ids[position] == item_id:
+                    return
+                self._duplicates.add(title)
+            titles[title] = len(self.ids)
+            self.titles.append(title)
+            self.ids.append(item_id)
+            self.types.append(code)
+
+    def add_page(self, ls_resp):
+        """
+        Adds every item in a page of a listing from DataFed
+
+        Parameters
+        ----------
+        ls_resp : protobuf message
+            Message containing the listing reply
+        """
         for item in ls_resp[0].item:
-            # return only those that match with the mode (dataset / collection)
-            if item.id.startswith(mode):
-                data_objects[item.title] = item.id
+            self.add(item.title, item.id)
+
+    def get(self, title, mode=None, default=None):
+        """
+        Returns the ID of the item with the given title. If several items
+        share the title, the one listed last is returned
+
+        Parameters
+        ----------
+        title : str
+            Title of the data record or collection
+        mode : str, optional
+            Set to "d/" to only consider data records or "c/" to only
+            consider collections
+        default : object, optional
+            Returned if there is no such item. Default = None
+
+        Returns
+        -------
+        str
+            ID of the item
+        """
+        code = self._type_of(mode)
+        with self._lock:
+            if code is not None:
+                position = self._by_title.get(code, {}).get(title)
+            else:
+                positions = [titles[title] for titles in
+                             self._by_title.values() if title in titles]
+                position = max(positions) if positions else None
+            if position is None:
+                return default
+            return self.ids[position]
+
+    def contains(self, title, mode=None):
+        """
+        Whether or not an item with the given title (and type) exists
+        """
+        return self.get(title, mode=mode) is not None
+
+    def __contains__(self, title):
+        return self.contains(title)
+
+    def to_dict(self, mode=None):
+        """
+        Returns the items as a dictionary, as list_all_items_in_coll does
+
+        Parameters
+        ----------
+        mode : str, optional
+            Set to "d/" to only get data records or "c/" to only get
+            collections. Leave unset for all items
+
+        Returns
+        -------
+        dict
+            Keys are titles and values are IDs. Items listed later replace
+            earlier items with the same title
+        """
+        code = self._type_of(mode)
+        with self._lock:
+            if code is None:
+                return dict(zip(self.titles, self.ids))
+            return dict((title, self.ids[position]) for title, position in
+                        self._by_title.get(code, {}).items())
+
+    def duplicates(self, mode=None):
+        """
+        Returns the titles shared by more than one item
+
+        Parameters
+        ----------
+        mode : str, optional
+            Set to "d/" to only consider data records or "c/" to only
+            consider collections. Leave unset to consider titles shared
+            by items of the same type
+
+        Returns
+        -------
+        dict
+            Keys are titles and values are lists of IDs of items with
+            that title, in the order they were listed
+        """
+        code = self._type_of(mode)
+        found = dict()
+        with self._lock:
+            if not self._duplicates:
+                return found
+            for title, item_id, item_type in zip(self.titles, self.ids,
+                                                 self.types):
+                if title not in self._duplicates:
+                    continue
+                if code is not None and item_type != code:
+                    continue
+                found.setdefault((item_type, title), list()).append(item_id)
+        return dict((title, ids) for (_, title), ids in found.items()
+                    if len(ids) > 1)
+
+
+class CollectionListingCache(object):
+
+    def __init__(self, ttl=300, max_entries=1024):
+        """
+        Cache of indices of DataFed collections keyed by the collection and
+        context. A single index serves requests for data records,
+        collections, or both. Items created locally are added to cached
+        indices (write-through) so that they remain accurate without listing
+        the collection again.
+
+        Parameters
+        ----------
+        ttl : float, optional
+            Number of seconds after which a collection is listed again, to
+            pick up changes made by others. Default = 300
+        max_entries : int, optional
+            Maximum number of indices held. The least recently used indices
+            are evicted first. Default = 1024
+        """
+        if not isinstance(max_entries, int) or max_entries < 1:
+            raise ValueError('max_entries must be a positive integer')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # (coll_id, context) -> (time fetched, CollectionIndex)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, coll_id, context=None):
+        """
+        Returns the cached index of the given collection
+
+        Parameters
+        ----------
+        coll_id : str
+            ID or alias of the DataFed collection
+        context : str, optional
+            Context such as a project or user ID where this collection is
+            located
+
+        Returns
+        -------
+        CollectionIndex
+            Index of the items in the collection. None if not cached or
+            expired
+        """
+        key = (coll_id, context)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, coll_id, index, context=None):
+        """
+        Caches the index of the given collection
+
+        Parameters
+        ----------
+        coll_id : str
+            ID or alias of the DataFed collection
+        index : CollectionIndex
+            Index of the items in the collection
+        context : str, optional
+            Context such as a project or user ID where this collection is
+            located
+        """
+        key = (coll_id, context)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), index)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
 
-    return data_objects
+    def add_item(self, coll_id, title, item_id, context=None):
+        """
+        Adds an item that was just created in the given collection to its
+        cached index, if any
+
+        Parameters
+        ----------
+        coll_id : str
+            ID or alias of the DataFed collection
+        title : str
+            Title of the new data record or collection
+        item_id : str
+            ID of the new data record or collection
+        context : str, optional
+            Context such as a project or user ID where this collection is
+            located
+        """
+        with self._lock:
+            entry = self._entries.get((coll_id, context))
+        if entry is not None:
+            entry[1].add(title, item_id)
+
+    def invalidate(self, coll_id=None, context=None):
+        """
+        Forgets the index of the given collection, or of all collections
+
+        Parameters
+        ----------
+        coll_id : str, optional
+            ID or alias of the DataFed collection. Default = all collections
+        context : str, optional
+            Context such as a project or user ID where this collection is
+            located
+        """
+        with self._lock:
+            if coll_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop((coll_id, context), None)
+
+
+def get_collection_index(coll_id_alias, context=None, df_api=None, workers=4,
+                         cache=None, pool=None):
+    """
+    Lists the given collection into a CollectionIndex
+
+    Parameters
+    ----------
+    coll_id_alias : str
+        ID or alias for DataFed collection
+    context : str
+        Context such as a project or user ID where this collection is located
+        Not required if an ID is provided in place of an alias
+    df_api : datafed.CommandLib.API instance
+        Instance of the DataFed CommandLib API
+    workers : int, optional
+        Maximum number of pages requested at the same time. Default = 4
+    cache : CollectionListingCache, optional
+        Cache of indices to consult first and to populate otherwise
+    pool : concurrent.futures.ThreadPoolExecutor, optional
+        Pool of threads to fetch pages with. Reusing the same pool for many
+        listings also reuses the instance of the API in each of its threads.
+        Default = a pool for this call
+
+    Returns
+    -------
+    CollectionIndex
+        Index of all items in the collection. Shared with the cache, if any,
+        such that items added to it are visible to other users of the cache
+    """
+    if cache is not None:
+        index = cache.get(coll_id_alias, context=context)
+        if index is not None:
+            return index
+    index = CollectionIndex()
+    # Pages are added in order such that the result does not depend on
+    # which page arrived first
+    for ls_resp in _iter_pages(coll_id_alias, context=context, df_api=df_api,
+                               workers=workers, ordered=True, pool=pool):
+        index.add_page(ls_resp)
+    if cache is not None:
+        cache.put(coll_id_alias, index, context=context)
+    return index
 
 
 def list_all_items_in_coll(coll_id_alias, context=None, mode=None,
-                           df_api=None):
+                           df_api=None, workers=1, cache=None, pool=None):
     """
     Returns a dictionary of data record and/or collections in the given
     collection
@@ -55,29 +534,25 @@ def list_all_items_in_coll(coll_id_alias, context=None, mode=None,
         Leave unset for all items in the listing
     df_api : datafed.CommandLib.API instance
         Instance of the DataFed CommandLib API
+    workers : int, optional
+        Maximum number of pages requested at the same time. Pages other than
+        the first are requested through an instance of the API per thread
+        rather than through df_api. Default = 1 - one page at a time via
+        df_api
+    cache : CollectionListingCache, optional
+        Cache of indices to consult first and to populate with the index of
+        this collection otherwise
+    pool : concurrent.futures.ThreadPoolExecutor, optional
+        Pool of threads to fetch pages with. Reusing the same pool for many
+        listings also reuses the instance of the API in each of its threads.
+        Default = a pool for this call
 
     Returns
     -------
     dict
         Keys are IDs and values are the title for the object
     """
-    if not df_api:
-        df_api = API()
-    # First do an LS
-    ls_resp = df_api.collectionItemsList(coll_id_alias,
-                                         context=context)
-    # Gather important information like the number of pages, page size, etc.
-    # TODO: perhaps request 100 items per request?
-    page_size = ls_resp[0].count
-    num_pages = math.ceil(ls_resp[0].total / ls_resp[0].count)
-    # Get the items from the first page
-    master_dict = items_in_this_page(ls_resp, mode=mode)
-    # Get items from all subsequent pages
-    for page_ind in range(1, num_pages):
-        ls_resp = df_api.collectionItemsList(coll_id_alias,
-                                             context=context,
-                                             offset=page_size * page_ind)
-        this_page = items_in_this_page(ls_resp, mode=mode)
-        master_dict.update(this_page)
-
-    return master_dict
+    index = get_collection_index(coll_id_alias, context=context,
+                                 df_api=df_api, workers=workers, cache=cache,
+                                 pool=pool)
+    return index.to_dict(mode=mode)
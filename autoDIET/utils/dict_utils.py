@@ -1,6 +1,5 @@
+import sys
 from math import isinf, isnan
-import h5py
-import numpy as np
 
 
 def pretty_print_dict(my_dict, level=0):
@@ -95,6 +94,11 @@ def clean_attributes(metadata):
     metadata: dict
         Dictionary whose values are base python objects
     """
+    # Values can only be numpy or h5py objects if a Parser already imported
+    # those packages. Avoid importing them otherwise
+    np = sys.modules.get('numpy')
+    h5py = sys.modules.get('h5py')
+
     attrs_to_delete = []
     for key, val in metadata.items():
         if not val:
@@ -102,6 +106,11 @@ def clean_attributes(metadata):
             metadata[key] = "None"
         elif isinstance(val, dict):
             metadata[key] = clean_attributes(val)
+        elif np is None:
+            if isinstance(val, float) and (isinf(val) or isnan(val)):
+                metadata[key] = "NaN"
+            elif isinstance(val, bytes):
+                metadata[key] = val.decode("utf-8")
         elif type(val) in [np.uint16, np.uint8, np.uint, np.uint32, np.int,
                            np.int16, np.int32, np.int64]:
             metadata[key] = int(val)
@@ -113,7 +122,7 @@ def clean_attributes(metadata):
             metadata[key] = bool(val)
         elif isinstance(val, np.ndarray):
             metadata[key] = val.tolist()
-        elif isinstance(val, h5py.Reference):
+        elif h5py is not None and isinstance(val, h5py.Reference):
             attrs_to_delete.append(key)
         elif isinstance(val, bytes):
             metadata[key] = val.decode("utf-8")
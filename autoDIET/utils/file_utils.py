@@ -1,7 +1,34 @@
 import os
-import tarfile
+import hashlib
 from warnings import warn
 
+from .archive_utils import make_archive
+
+
+def hash_file(file_path, algorithm='sha256', chunk_size=1024 * 1024):
+    """
+    Computes the hash of the contents of a file without reading the entire
+    file into memory at once
+
+    Parameters
+    ----------
+    file_path : str
+        Path to a file
+    algorithm : str, Optional. Default = "sha256"
+        Name of any hashing algorithm supported by hashlib
+    chunk_size : int, Optional. Default = 1 MB
+        Number of bytes to read at a time
+
+    Returns
+    -------
+    str : hexadecimal digest of the contents of the file
+    """
+    hasher = hashlib.new(algorithm)
+    with open(file_path, mode='rb') as file_handle:
+        for chunk in iter(lambda: file_handle.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
 
 def make_tarfile(source_dir, tar_path=None, compress=True):
     """
@@ -14,7 +41,9 @@ def make_tarfile(source_dir, tar_path=None, compress=True):
     tar_path : str, Optional.
         Path for resulting tar file or directory to place the tar ball
     compress : bool, Optional. Default = True
-        Whether or not to compress the provided folder using gzip
+        Whether or not to compress the provided folder using gzip. The gzip
+        stream is compressed on several threads. See
+        autoDIET.utils.archive_utils.make_archive for other codecs
 
     Returns
     -------
@@ -44,12 +73,9 @@ def make_tarfile(source_dir, tar_path=None, compress=True):
         if len(parts) > 1:
             tar_name = '.'.join(parts[:-1])
         tar_path = os.path.join(parent, tar_name + '.tar')
-    mode = "w"
-    if compress:
-        mode = "w:gz"
-    with tarfile.open(tar_path, mode) as tar:
-        tar.add(source_dir, arcname=os.path.basename(source_dir))
-    return tar_path
+    result = make_archive(source_dir, dest=tar_path,
+                          codec='gzip' if compress else None)
+    return result.path
 
 
 def validate_scratch_dir(scratch, verbose=False):
@@ -0,0 +1,171 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, \
+    wait, FIRST_COMPLETED
+
+
+def make_executor(workers, pool='thread'):
+    """
+    Creates a pool of workers wrapped in a BoundedExecutor
+
+    Parameters
+    ----------
+    workers : int
+        Number of workers in the pool
+    pool : str, optional
+        Set to "thread" to use a pool of threads. Set to "process" to use a
+        pool of processes. Default = "thread"
+
+    Returns
+    -------
+    BoundedExecutor
+        Executor whose queue of pending tasks is bounded
+    """
+    if not isinstance(workers, int) or workers < 1:
+        raise ValueError('workers must be a positive integer')
+    if not isinstance(pool, str):
+        raise TypeError('pool must be a string')
+    pool = pool.lower()
+    if pool == 'thread':
+        executor = ThreadPoolExecutor(max_workers=workers)
+    elif pool == 'process':
+        executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError('pool must either be "thread" or "process". '
+                         'Provided: {}'.format(pool))
+    return BoundedExecutor(executor, max_pending=2 * workers)
+
+
+def imap_unordered(func, items, workers=4, max_pending=None):
+    """
+    Applies func to each of the provided items using a pool of threads and
+    yields the results as soon as they are available, in order of completion.
+    Items are consumed lazily such that only a bounded number of them are
+    in flight at any given time. An exception raised for one item does not
+    affect the others.
+
+    Parameters
+    ----------
+    func : callable
+        Function that accepts a single item
+    items : iterable
+        Items to apply func to
+    workers : int, optional
+        Number of threads. Default = 4
+    max_pending : int, optional
+        Maximum number of items queued or being processed at any time.
+        Default = twice the number of workers
+
+    Yields
+    ------
+    tuple
+        (item, result, exception) where result is None if func raised the
+        exception and exception is None if func succeeded
+    """
+    if not isinstance(workers, int) or workers < 1:
+        raise ValueError('workers must be a positive integer')
+    if max_pending is None:
+        max_pending = 2 * workers
+    items = iter(items)
+    pending = dict()
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _top_up():
+        for item in items:
+            pending[executor.submit(func, item)] = item
+            if len(pending) >= max_pending:
+                break
+
+    try:
+        _top_up()
+        while pending:
+            done, _ = wait(list(pending.keys()), return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                exc = future.exception()
+                if exc is None:
+                    yield item, future.result(), None
+                else:
+                    yield item, None, exc
+            _top_up()
+    finally:
+        # Consumer may have stopped iterating early
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+class BoundedExecutor(object):
+
+    def __init__(self, executor, max_pending):
+        """
+        Wraps a concurrent.futures Executor such that no more than a fixed
+        number of tasks are pending at any time. Calls to submit block until
+        a slot frees up, which keeps a crawl over tens of thousands of files
+        from queueing all of them in memory up front.
+
+        Parameters
+        ----------
+        executor : concurrent.futures.Executor
+            Pool of threads or processes that will run the tasks
+        max_pending : int
+            Maximum number of submitted tasks that are queued or running
+        """
+        if not isinstance(max_pending, int) or max_pending < 1:
+            raise ValueError('max_pending must be a positive integer')
+        self.executor = executor
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    @property
+    def uses_processes(self):
+        """
+        Whether or not tasks are run in other processes, in which case their
+        arguments must be picklable
+        """
+        return isinstance(self.executor, ProcessPoolExecutor)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Submits a task to the pool, waiting for a free slot if necessary
+
+        Parameters
+        ----------
+        func : callable
+            Function to call
+        args : tuple
+            Positional arguments for func
+        kwargs : dict
+            Keyword arguments for func
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Future for the result of this task
+        """
+        self._slots.acquire()
+        try:
+            future = self.executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        """
+        Shuts down the underlying pool
+
+        Parameters
+        ----------
+        wait : bool, optional
+            Set to True to block until all pending tasks have completed.
+            Default = True
+        """
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown(wait=True)
+        return False
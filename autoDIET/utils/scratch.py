@@ -0,0 +1,301 @@
+import os
+import time
+import atexit
+import shutil
+import socket
+import tempfile
+import threading
+from contextlib import contextmanager
+
+_PREFIX = 'autodiet-'
+
+
+def _pid_alive(pid):
+    """
+    Whether or not a process with the given ID is running on this machine
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running, but owned by someone else
+        return True
+    return True
+
+
+def directory_size(dir_path):
+    """
+    Returns the total size in bytes of the files within a directory tree
+    """
+    total = 0
+    for root, _, file_names in os.walk(dir_path):
+        for file_name in file_names:
+            file_path = os.path.join(root, file_name)
+            if os.path.isfile(file_path):
+                total += os.path.getsize(file_path)
+    return total
+
+
+class ScratchSpace(object):
+
+    def __init__(self, root=None, max_bytes=None, small_root=None,
+                 cleanup_stale=True, stale_after=24 * 3600):
+        """
+        Manages the scratch space used by a single run of ingestion such that
+        concurrent ingests never collide on file names, a byte budget keeps
+        the disk from filling up mid-run, and nothing is left behind.
+
+        Every run works within a session directory of its own under root,
+        named after the machine and process. Session directories of runs
+        that crashed are removed by the next run on the same machine. The
+        session directory is removed on close or when the interpreter exits.
+
+        Instances can be used wherever a path to the scratch directory is
+        expected since they resolve to the session directory (os.fspath).
+
+        Parameters
+        ----------
+        root : str, optional
+            Directory to create the session directory in. Created if it does
+            not exist. Default = temporary directory of the system
+        max_bytes : int, optional
+            Number of bytes that may be reserved via reserve at any given
+            time. Default = no limit
+        small_root : str, optional
+            Directory on a memory-backed file system (tmpfs), such as
+            "/dev/shm", for small files such as thumbnails.
+            Default = same as root
+        cleanup_stale : bool, optional
+            Set to True to remove session directories left behind by crashed
+            runs on this machine. Default = True
+        stale_after : float, optional
+            On systems where it cannot be checked whether the process that
+            created a session directory is still running, the session
+            directory is considered stale once it has not been modified for
+            this many seconds. Default = 1 day
+        """
+        if root is None:
+            root = tempfile.gettempdir()
+        if not isinstance(root, str):
+            raise TypeError('root must be a string')
+        if small_root is not None and not isinstance(small_root, str):
+            raise TypeError('small_root must be a string')
+        if max_bytes is not None and (not isinstance(max_bytes, int) or
+                                      max_bytes < 1):
+            raise ValueError('max_bytes must be a positive integer')
+        self.max_bytes = max_bytes
+        self.stale_after = stale_after
+        self._reserved = 0
+        self._cond = threading.Condition()
+        self._prefix = '{}{}-'.format(_PREFIX, socket.gethostname())
+
+        self.root = os.path.abspath(root)
+        self.small_root = os.path.abspath(small_root) if small_root \
+            else None
+        self.path = None
+        self.small_path = None
+        for this_root in (self.root, self.small_root):
+            if this_root is None:
+                continue
+            os.makedirs(this_root, exist_ok=True)
+            if cleanup_stale:
+                self.cleanup_stale(this_root)
+        self.path = self._make_session(self.root)
+        self.small_path = self.path
+        if self.small_root:
+            self.small_path = self._make_session(self.small_root)
+        atexit.register(self.close)
+
+    def __repr__(self):
+        return 'ScratchSpace({})'.format(self.path)
+
+    def __fspath__(self):
+        return self.path
+
+    def __str__(self):
+        return self.path
+
+    def _make_session(self, root):
+        return tempfile.mkdtemp(prefix='{}{}-'.format(self._prefix,
+                                                      os.getpid()),
+                                dir=root)
+
+    def _is_stale(self, path):
+        """
+        Whether or not the given session directory belongs to a run that is
+        no longer running
+        """
+        parts = os.path.basename(path)[len(self._prefix):].split('-')
+        try:
+            pid = int(parts[0])
+        except ValueError:
+            return False
+        if pid == os.getpid():
+            return False
+        if os.name == 'nt':
+            # os.kill would terminate the process on Windows
+            return time.time() - os.path.getmtime(path) > self.stale_after
+        return not _pid_alive(pid)
+
+    def cleanup_stale(self, root=None):
+        """
+        Removes session directories under root left behind by runs on this
+        machine that are no longer running
+
+        Parameters
+        ----------
+        root : str, optional
+            Directory containing session directories. Default = root
+
+        Returns
+        -------
+        list of str
+            Paths of the removed session directories
+        """
+        if root is None:
+            root = self.root
+        removed = list()
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if not name.startswith(self._prefix) or not os.path.isdir(path):
+                continue
+            if path in (self.path, self.small_path):
+                continue
+            if self._is_stale(path):
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(path)
+        return removed
+
+    def make_dir(self, small=False, prefix=''):
+        """
+        Creates a uniquely named directory within the session directory
+
+        Parameters
+        ----------
+        small : bool, optional
+            Set to True to place the directory on small_root, if provided.
+            Meant for small files such as thumbnails. Default = False
+        prefix : str, optional
+            Prefix for the name of the directory. Default = no prefix
+
+        Returns
+        -------
+        str
+            Path to the new, empty directory
+        """
+        parent = self.small_path if small else self.path
+        if parent is None:
+            raise ValueError('ScratchSpace is already closed')
+        return tempfile.mkdtemp(prefix=prefix, dir=parent)
+
+    def unique_path(self, suffix='', prefix='', small=False):
+        """
+        Reserves a unique file name within the session directory by creating
+        an empty file with that name
+
+        Parameters
+        ----------
+        suffix : str, optional
+            Suffix, such as the extension, for the name of the file
+        prefix : str, optional
+            Prefix for the name of the file
+        small : bool, optional
+            Set to True to place the file on small_root, if provided.
+            Default = False
+
+        Returns
+        -------
+        str
+            Path to the new, empty file
+        """
+        parent = self.small_path if small else self.path
+        if parent is None:
+            raise ValueError('ScratchSpace is already closed')
+        handle, path = tempfile.mkstemp(suffix=suffix, prefix=prefix,
+                                        dir=parent)
+        os.close(handle)
+        return path
+
+    @property
+    def reserved(self):
+        """
+        Number of bytes currently reserved
+        """
+        return self._reserved
+
+    def reserve(self, nbytes, timeout=None):
+        """
+        Reserves the given number of bytes against the budget, waiting for
+        other reservations to be released if they would exceed it. A request
+        larger than the entire budget waits until nothing else is reserved
+
+        Parameters
+        ----------
+        nbytes : int
+            Number of bytes to reserve
+        timeout : float, optional
+            Maximum number of seconds to wait. Default = wait indefinitely
+
+        Returns
+        -------
+        bool
+            True if the bytes were reserved. False if the wait timed out
+        """
+        if nbytes < 0:
+            raise ValueError('nbytes must not be negative')
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self.max_bytes is not None and self._reserved and \
+                    self._reserved + nbytes > self.max_bytes:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                self._cond.wait(remaining)
+            self._reserved += nbytes
+            return True
+
+    def release(self, nbytes):
+        """
+        Returns bytes reserved via reserve to the budget
+
+        Parameters
+        ----------
+        nbytes : int
+            Number of bytes to release
+        """
+        with self._cond:
+            self._reserved = max(0, self._reserved - nbytes)
+            self._cond.notify_all()
+
+    @contextmanager
+    def reservation(self, nbytes):
+        """
+        Context manager that reserves the given number of bytes for the
+        duration of the block. See reserve
+        """
+        self.reserve(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    def close(self):
+        """
+        Removes the session directories along with everything in them
+        """
+        for path in {self.path, self.small_path}:
+            if path:
+                shutil.rmtree(path, ignore_errors=True)
+        self.path = None
+        self.small_path = None
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
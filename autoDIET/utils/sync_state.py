@@ -0,0 +1,211 @@
+import os
+import time
+import sqlite3
+import threading
+
+from .file_utils import hash_file
+
+
+class SyncState(object):
+
+    def __init__(self, db_path, use_hash=False):
+        """
+        Local index of paths in the file system that have already been
+        mirrored into DataFed. Each entry maps a file or directory, along with
+        the ID of its parent DataFed collection, to the ID of the data record
+        or collection created for it. Entries are only trusted while the size
+        and modification time of the path are unchanged, so a re-crawl only
+        needs to contact DataFed for new or modified paths.
+
+        Parameters
+        ----------
+        db_path : str
+            Path to the SQLite database file. Created if it does not exist
+        use_hash : bool, optional
+            Set to True to also record a hash of the contents of each file.
+            A file whose size or modification time changed but whose contents
+            did not (e.g. it was touched or copied) is then still considered
+            unchanged. Default = False
+        """
+        if not isinstance(db_path, str):
+            raise TypeError('db_path must be a string')
+        self.db_path = db_path
+        self.use_hash = use_hash
+        self._lock = threading.Lock()
+        # Workers in a pool record what they ingested from other threads
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                               "path TEXT NOT NULL, "
+                               "parent_id TEXT NOT NULL, "
+                               "item_id TEXT NOT NULL, "
+                               "size INTEGER, "
+                               "mtime INTEGER, "
+                               "content_hash TEXT, "
+                               "updated REAL, "
+                               "PRIMARY KEY (path, parent_id))")
+
+    def __repr__(self):
+        return 'SyncState({})'.format(self.db_path)
+
+    @staticmethod
+    def _stat(path):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _hash(self, path):
+        if not self.use_hash or os.path.isdir(path):
+            return None
+        return hash_file(path)
+
+    def get_item(self, path, parent_id):
+        """
+        Returns the ID of the DataFed item created for the given path if the
+        path has not changed since it was indexed
+
+        Parameters
+        ----------
+        path : str
+            Path to file or directory in the local file system
+        parent_id : str
+            ID of the DataFed collection that the item was created within
+
+        Returns
+        -------
+        str
+            ID of the DataFed data record or collection. None if the path was
+            never indexed or has changed since.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            row = self._conn.execute("SELECT item_id, size, mtime, "
+                                     "content_hash FROM entries WHERE path = ?"
+                                     " AND parent_id = ?",
+                                     (path, parent_id)).fetchone()
+        if row is None:
+            return None
+        item_id, size, mtime, content_hash = row
+        try:
+            cur_size, cur_mtime = self._stat(path)
+        except OSError:
+            return None
+        if (cur_size, cur_mtime) == (size, mtime):
+            return item_id
+        if content_hash is None or os.path.isdir(path):
+            return None
+        if self._hash(path) != content_hash:
+            return None
+        # Only the timestamp changed. Remember it to avoid hashing again
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE entries SET size = ?, mtime = ?, "
+                               "updated = ? WHERE path = ? AND parent_id = ?",
+                               (cur_size, cur_mtime, time.time(), path,
+                                parent_id))
+        return item_id
+
+    def set_item(self, path, parent_id, item_id):
+        """
+        Records the DataFed item created for the given path
+
+        Parameters
+        ----------
+        path : str
+            Path to file or directory in the local file system
+        parent_id : str
+            ID of the DataFed collection that the item was created within
+        item_id : str
+            ID of the DataFed data record or collection
+        """
+        path = os.path.abspath(path)
+        size, mtime = self._stat(path)
+        content_hash = self._hash(path)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO entries (path, "
+                               "parent_id, item_id, size, mtime, content_hash,"
+                               " updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (path, parent_id, item_id, size, mtime,
+                                content_hash, time.time()))
+
+    def get_collection(self, dir_path, parent_id):
+        """
+        Returns the ID of the DataFed collection created for the given
+        directory. Unlike data records, collections remain valid regardless
+        of changes to the contents of the directory
+
+        Parameters
+        ----------
+        dir_path : str
+            Path to directory in the local file system
+        parent_id : str
+            ID of the DataFed collection that the collection was created within
+
+        Returns
+        -------
+        str
+            ID of the DataFed collection. None if the directory was never
+            indexed
+        """
+        dir_path = os.path.abspath(dir_path)
+        with self._lock:
+            row = self._conn.execute("SELECT item_id FROM entries WHERE "
+                                     "path = ? AND parent_id = ?",
+                                     (dir_path, parent_id)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def set_collection(self, dir_path, parent_id, coll_id):
+        """
+        Records the DataFed collection created for the given directory
+
+        Parameters
+        ----------
+        dir_path : str
+            Path to directory in the local file system
+        parent_id : str
+            ID of the DataFed collection that the collection was created within
+        coll_id : str
+            ID of the DataFed collection
+        """
+        dir_path = os.path.abspath(dir_path)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO entries (path, "
+                               "parent_id, item_id, updated) VALUES "
+                               "(?, ?, ?, ?)",
+                               (dir_path, parent_id, coll_id, time.time()))
+
+    def forget(self, path, parent_id=None):
+        """
+        Removes the entries for the given path. Use this if the corresponding
+        item was deleted from DataFed.
+
+        Parameters
+        ----------
+        path : str
+            Path to file or directory in the local file system
+        parent_id : str, optional
+            ID of the DataFed collection that the item was created within.
+            If not provided, entries under all collections are removed
+        """
+        path = os.path.abspath(path)
+        with self._lock, self._conn:
+            if parent_id is None:
+                self._conn.execute("DELETE FROM entries WHERE path = ?",
+                                   (path,))
+            else:
+                self._conn.execute("DELETE FROM entries WHERE path = ? AND "
+                                   "parent_id = ?", (path, parent_id))
+
+    def close(self):
+        """
+        Closes the connection to the database
+        """
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
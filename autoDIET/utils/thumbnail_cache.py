@@ -0,0 +1,286 @@
+import os
+import time
+import shutil
+import hashlib
+import sqlite3
+import inspect
+import threading
+from contextlib import contextmanager
+
+from .file_utils import hash_file
+
+
+class ThumbnailCache(object):
+
+    def __init__(self, cache_dir, max_bytes=1024 ** 3):
+        """
+        Persistent cache of thumbnails keyed by the contents of the source
+        file and the parameters used to generate the thumbnails. Each entry
+        holds the local copy of the thumbnails and the public links where
+        they are hosted on the cloud. A cache hit therefore avoids decoding
+        the source file and uploading the thumbnails again.
+
+        Local copies are evicted in least-recently-used order once they
+        take up more than max_bytes. Links are kept after eviction since
+        they are enough to embed the thumbnails.
+
+        Parameters
+        ----------
+        cache_dir : str
+            Directory to place the thumbnails and the index in. Created if it
+            does not exist
+        max_bytes : int, optional
+            Maximum number of bytes occupied by local copies of thumbnails.
+            Default = 1 GB
+        """
+        if not isinstance(cache_dir, str):
+            raise TypeError('cache_dir must be a string')
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Number of users of each key whose local copies must not be evicted
+        self._pinned = dict()
+        self._conn = sqlite3.connect(os.path.join(cache_dir,
+                                                  'thumbnails.sqlite'),
+                                     check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS thumbnails ("
+                               "key TEXT NOT NULL, "
+                               "idx INTEGER NOT NULL, "
+                               "title TEXT, "
+                               "path TEXT, "
+                               "url TEXT, "
+                               "size INTEGER NOT NULL DEFAULT 0, "
+                               "last_used REAL, "
+                               "PRIMARY KEY (key, idx))")
+            # Hash of the contents of each source file as of its last known
+            # size and modification time, such that unchanged files need not
+            # be hashed again
+            self._conn.execute("CREATE TABLE IF NOT EXISTS sources ("
+                               "path TEXT PRIMARY KEY, "
+                               "size INTEGER, "
+                               "mtime INTEGER, "
+                               "content_hash TEXT)")
+
+    def __repr__(self):
+        return 'ThumbnailCache({})'.format(self.cache_dir)
+
+    def _content_hash(self, file_path):
+        """
+        Returns the hash of the contents of the given file. The file is only
+        hashed if its size or modification time changed since it was last
+        hashed
+        """
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        with self._lock:
+            row = self._conn.execute("SELECT content_hash FROM sources WHERE "
+                                     "path = ? AND size = ? AND mtime = ?",
+                                     (file_path, stat.st_size,
+                                      stat.st_mtime_ns)).fetchone()
+        if row is not None:
+            return row[0]
+        content_hash = hash_file(file_path)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO sources (path, size, "
+                               "mtime, content_hash) VALUES (?, ?, ?, ?)",
+                               (file_path, stat.st_size, stat.st_mtime_ns,
+                                content_hash))
+        return content_hash
+
+    def make_key(self, file_path, parser=None, cloud=None, **params):
+        """
+        Computes the key for the thumbnails of the given file. The contents
+        of the file are only hashed if the file is new to the cache or its
+        size or modification time changed
+
+        Parameters
+        ----------
+        file_path : str
+            Path to the source data file
+        parser : microflow.raw_data.parser.Parser, optional
+            Parser that generates the thumbnails. Its class and the default
+            arguments of its get_thumbnails, such as the size of the
+            thumbnails, become part of the key
+        cloud : autoDIET.cloud.CloudProvider, optional
+            Cloud provider that the thumbnails are uploaded to. Its class and
+            namespace become part of the key such that links are never reused
+            across providers
+        params : dict
+            Any other parameters that affect the thumbnails
+
+        Returns
+        -------
+        str
+            Key for the thumbnails
+        """
+        if parser is not None:
+            params['parser'] = type(parser).__name__
+            signature = inspect.signature(parser.get_thumbnails)
+            for name, arg in signature.parameters.items():
+                if arg.default is not inspect.Parameter.empty:
+                    params['parser.' + name] = arg.default
+        if cloud is not None:
+            provider = getattr(cloud, 'provider', cloud)
+            params['cloud'] = '{}:{}'.format(type(provider).__name__,
+                                             cloud.namespace)
+        hasher = hashlib.sha256(self._content_hash(file_path)
+                                 .encode('utf-8'))
+        for name in sorted(params):
+            hasher.update('|{}={}'.format(name, params[name]).encode('utf-8'))
+        return hasher.hexdigest()
+
+    @contextmanager
+    def in_use(self, key):
+        """
+        Context manager that keeps the local copies of the thumbnails for
+        the given key from being evicted for the duration of the block, such
+        as while they are being uploaded
+
+        Parameters
+        ----------
+        key : str
+            Key obtained via make_key
+        """
+        with self._lock:
+            self._pinned[key] = self._pinned.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pinned[key] -= 1
+                if not self._pinned[key]:
+                    del self._pinned[key]
+            # Eviction may have been held back by this key
+            self._evict()
+
+    def get(self, key):
+        """
+        Looks up the thumbnails for the given key
+
+        Parameters
+        ----------
+        key : str
+            Key obtained via make_key
+
+        Returns
+        -------
+        list
+            List of tuples arranged as [(title_1, path_1, url_1), ...] where
+            path is None if the local copy was evicted and url is None if the
+            thumbnail was not uploaded. None if there is no usable entry
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT title, path, url FROM "
+                                      "thumbnails WHERE key = ? ORDER BY idx",
+                                      (key,)).fetchall()
+            if not rows:
+                return None
+            entries = list()
+            for title, path, url in rows:
+                if path and not os.path.exists(path):
+                    path = None
+                if not path and not url:
+                    # Neither usable locally nor on the cloud
+                    return None
+                entries.append((title, path, url))
+            with self._conn:
+                self._conn.execute("UPDATE thumbnails SET last_used = ? "
+                                   "WHERE key = ?", (time.time(), key))
+        return entries
+
+    def put(self, key, tnails):
+        """
+        Moves freshly generated thumbnails into the cache
+
+        Parameters
+        ----------
+        key : str
+            Key obtained via make_key
+        tnails : list
+            List of tuples arranged as [(title_1, path_1), (title_2, path_2)]
+
+        Returns
+        -------
+        list
+            Same as tnails but with the paths of the thumbnails in the cache
+        """
+        cached = list()
+        rows = list()
+        now = time.time()
+        for idx, (title, path) in enumerate(tnails):
+            ext = os.path.splitext(path)[1]
+            new_path = os.path.join(self.cache_dir,
+                                    '{}_{}{}'.format(key[:32], idx, ext))
+            shutil.move(path, new_path)
+            cached.append((title, new_path))
+            rows.append((key, idx, title, new_path, None,
+                         os.path.getsize(new_path), now))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM thumbnails WHERE key = ?", (key,))
+            self._conn.executemany("INSERT INTO thumbnails (key, idx, title, "
+                                   "path, url, size, last_used) VALUES "
+                                   "(?, ?, ?, ?, ?, ?, ?)", rows)
+        self._evict()
+        return cached
+
+    def set_urls(self, key, urls):
+        """
+        Records the public links of the thumbnails for the given key
+
+        Parameters
+        ----------
+        key : str
+            Key obtained via make_key
+        urls : list of str
+            Links in the same order as the thumbnails given to put
+        """
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE thumbnails SET url = ? WHERE "
+                                   "key = ? AND idx = ?",
+                                   [(url, key, idx)
+                                    for idx, url in enumerate(urls)])
+
+    def _evict(self):
+        """
+        Deletes the least recently used local copies until the cache fits
+        within max_bytes
+        """
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM "
+                                       "thumbnails WHERE path IS NOT NULL",
+                                       ).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self._conn.execute("SELECT key, idx, path, size FROM "
+                                      "thumbnails WHERE path IS NOT NULL "
+                                      "ORDER BY last_used").fetchall()
+            with self._conn:
+                for key, idx, path, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    if key in self._pinned:
+                        continue
+                    if os.path.exists(path):
+                        os.remove(path)
+                    total -= size
+                    # Entries without a link become unusable and are
+                    # replaced the next time they are put
+                    self._conn.execute("UPDATE thumbnails SET path = NULL, "
+                                       "size = 0 WHERE key = ? AND idx = ?",
+                                       (key, idx))
+
+    def close(self):
+        """
+        Closes the connection to the index
+        """
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
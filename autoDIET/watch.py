@@ -0,0 +1,501 @@
+import os
+import time
+import threading
+from warnings import warn
+from datafed.CommandLib import API
+from .utils.datafed_utils import get_collection_index, \
+    CollectionListingCache
+from .utils.parallel_utils import make_executor
+from .crawl import process_posix_coll, sync_posix_dfed
+from .resources import open_cloud, open_sync_state, open_scratch, \
+    open_thumbnail_cache, open_thumbnail_pipeline, open_listing_pool, \
+    release_owned
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+def _signature(path):
+    """
+    Returns a tuple that changes whenever the given file, or any file within
+    the given directory, is written to. None if the path no longer exists
+    """
+    try:
+        if not os.path.isdir(path):
+            stat = os.stat(path)
+            return stat.st_size, stat.st_mtime_ns
+        size, mtime, count = 0, os.stat(path).st_mtime_ns, 0
+        for parent, _, files in os.walk(path):
+            for file_name in files:
+                stat = os.stat(os.path.join(parent, file_name))
+                size += stat.st_size
+                mtime = max(mtime, stat.st_mtime_ns)
+                count += 1
+        return size, mtime, count
+    except OSError:
+        return None
+
+
+class _EventHandler(FileSystemEventHandler):
+    """
+    Forwards file system events from watchdog to a PosixWatcher
+    """
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        # Ignore files merely being opened or read, including by the crawler
+        if event.event_type not in ('created', 'modified', 'moved',
+                                    'closed'):
+            return
+        for path in (getattr(event, 'src_path', None),
+                     getattr(event, 'dest_path', None)):
+            if path:
+                self.watcher.notify(path)
+
+
+class PosixWatcher(object):
+
+    def __init__(self, local_dir, max_depth=1, settle=10.0, interval=2.0,
+                 scratch=None, use_events=True, verbose=False):
+        """
+        Keeps track of the files in the dataset directories under local_dir
+        that were created or changed, and reports them once they stop
+        changing, i.e. once they are no longer being written to.
+
+        Uses inotify (via the optional watchdog package) where available.
+        Otherwise falls back to polling the modification times of the
+        directories above and including the dataset directories, which only
+        requires listing a directory whose contents changed.
+
+        Parameters
+        ----------
+        local_dir : str
+            Root directory path in local file system that contains data
+            uploaded using (an older version of) DataFlow
+        max_depth : int, optional.
+            Number of intermediate directories between local_dir and the
+            individual dataset directories. See sync_posix_dfed
+        settle : float, optional
+            Number of seconds that a file must remain unchanged before it is
+            considered completely written. Default = 10
+        interval : float, optional
+            Number of seconds between consecutive checks. Default = 2
+        scratch : str, optional
+            Scratch directory to ignore if it is located within local_dir
+        use_events : bool, optional
+            Set to False to always poll even if watchdog is installed.
+            Default = True
+        verbose : bool, optional
+            Set to True to print statements for debugging purposes. Leave False
+            otherwise. Default = False
+        """
+        if not os.path.isdir(local_dir):
+            raise NotADirectoryError('local_dir must be a directory: '
+                                     '{}'.format(local_dir))
+        self.local_dir = os.path.abspath(local_dir)
+        # Depth (relative to local_dir) of the dataset directories
+        self.dset_depth = max_depth + 1
+        self.settle = settle
+        self.interval = interval
+        self.scratch = os.path.abspath(scratch) if scratch else None
+        self.verbose = verbose
+
+        self._lock = threading.Lock()
+        # (dataset dir, entry name) -> [signature, time of last change]
+        self._pending = dict()
+        # Paths reported by inotify since the last check
+        self._events = set()
+        # Directory -> modification time and contents for the polling fallback
+        self._dir_mtimes = dict()
+        self._children = dict()
+
+        self._observer = None
+        if use_events and Observer is not None:
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self), self.local_dir,
+                                    recursive=True)
+            self._observer.start()
+            if verbose:
+                print('Watching {} using file system events'
+                      ''.format(self.local_dir))
+        else:
+            if use_events and verbose:
+                print('watchdog is not installed. Falling back to polling')
+            # Take a snapshot without treating existing files as new
+            self._scan_dirs(self.local_dir, 0, report=False)
+
+    def _entry_for(self, path):
+        """
+        Maps any path under local_dir to the (dataset dir, entry name) that
+        would become a data record. None if the path is above that level
+        """
+        path = os.path.abspath(path)
+        if self.scratch and (path == self.scratch or
+                             path.startswith(self.scratch + os.sep)):
+            return None
+        rel_path = os.path.relpath(path, self.local_dir)
+        if rel_path.startswith(os.pardir):
+            return None
+        parts = rel_path.split(os.sep)
+        if len(parts) <= self.dset_depth:
+            return None
+        entry = parts[self.dset_depth]
+        if entry == 'metadata.json' or entry.startswith('.'):
+            return None
+        dset_dir = os.path.join(self.local_dir, *parts[:self.dset_depth])
+        return dset_dir, entry
+
+    def notify(self, path):
+        """
+        Registers that something changed at the given path
+
+        Parameters
+        ----------
+        path : str
+            Path within local_dir that was created or modified
+        """
+        with self._lock:
+            self._events.add(path)
+
+    def _scan_dirs(self, dir_path, depth, report=True):
+        """
+        Polls the directories at or above the dataset level, only listing
+        those whose modification time changed since the last check
+        """
+        try:
+            mtime = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            self._forget_dir(dir_path)
+            return
+        if self._dir_mtimes.get(dir_path) != mtime:
+            self._dir_mtimes[dir_path] = mtime
+            old_children = self._children.get(dir_path, set())
+            children = set()
+            for item in os.listdir(dir_path):
+                item_path = os.path.join(dir_path, item)
+                if depth < self.dset_depth:
+                    if os.path.isdir(item_path) and item_path != self.scratch:
+                        children.add(item_path)
+                else:
+                    children.add(item_path)
+                    if report and item_path not in old_children:
+                        self.notify(item_path)
+            for gone in old_children - children:
+                self._forget_dir(gone)
+            self._children[dir_path] = children
+        if depth < self.dset_depth:
+            for sub_dir in self._children.get(dir_path, set()):
+                self._scan_dirs(sub_dir, depth + 1, report=report)
+
+    def _forget_dir(self, dir_path):
+        self._dir_mtimes.pop(dir_path, None)
+        for child in self._children.pop(dir_path, set()):
+            self._forget_dir(child)
+
+    def _refresh(self):
+        """
+        Moves newly reported paths into the pending list and returns the
+        entries that have not changed for at least `settle` seconds
+        """
+        if self._observer is None:
+            self._scan_dirs(self.local_dir, 0)
+        with self._lock:
+            events, self._events = self._events, set()
+
+        now = time.time()
+        for path in events:
+            key = self._entry_for(path)
+            if key is None:
+                continue
+            if key not in self._pending:
+                if self.verbose:
+                    print('Change detected in: ' + os.path.join(*key))
+                self._pending[key] = [None, now]
+
+        ready = list()
+        for key, (old_sig, last_change) in list(self._pending.items()):
+            new_sig = _signature(os.path.join(*key))
+            if new_sig is None:
+                # Deleted or moved away before it settled
+                del self._pending[key]
+            elif new_sig != old_sig:
+                self._pending[key] = [new_sig, now]
+            elif now - last_change >= self.settle:
+                del self._pending[key]
+                ready.append(key)
+        return ready
+
+    def wait_for_changes(self, stop_event=None):
+        """
+        Blocks until at least one changed file has settled
+
+        Parameters
+        ----------
+        stop_event : threading.Event, optional
+            Event that, once set, makes this function return right away
+
+        Returns
+        -------
+        dict
+            Keys are paths to dataset directories and values are lists of
+            names of the changed files within each
+        """
+        while not (stop_event and stop_event.is_set()):
+            ready = self._refresh()
+            if ready:
+                changes = dict()
+                for dset_dir, entry in ready:
+                    changes.setdefault(dset_dir, list()).append(entry)
+                return changes
+            if stop_event:
+                stop_event.wait(self.interval)
+            else:
+                time.sleep(self.interval)
+        return dict()
+
+    def close(self):
+        """
+        Stops listening to file system events
+        """
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+
+def _resolve_collection(dir_path, local_dir, dfed_coll, coll_ids, df_api=None,
+                        state=None, verbose=False, listing_cache=None,
+                        listing_pool=None):
+    """
+    Returns the ID of the DataFed collection that mirrors dir_path, creating
+    any missing collections along the way from local_dir
+
+    Parameters
+    ----------
+    dir_path : str
+        Path to a directory within local_dir
+    local_dir : str
+        Root directory that is mirrored by dfed_coll
+    dfed_coll : str
+        ID of the DataFed collection that mirrors local_dir
+    coll_ids : dict
+        Collection IDs resolved thus far, keyed by directory path. Updated
+        in place
+    df_api : datafed.CommandLib.API instance
+        Instance of the DataFed CommandLib API
+    state : autoDIET.utils.sync_state.SyncState, optional
+        Local index of items already mirrored in DataFed
+    verbose : bool, optional
+        Set to True to print statements for debugging purposes. Leave False
+        otherwise. Default = False
+    listing_cache : autoDIET.utils.datafed_utils.CollectionListingCache
+        Cache of listings of DataFed collections
+    listing_pool : concurrent.futures.ThreadPoolExecutor, optional
+        Pool of threads that fetch the pages of collection listings
+        concurrently. Default = fetch pages one at a time via df_api
+
+    Returns
+    -------
+    str
+        ID of the DataFed collection that mirrors dir_path
+    """
+    coll_id = dfed_coll
+    path = local_dir
+    for dir_name in os.path.relpath(dir_path, local_dir).split(os.sep):
+        path = os.path.join(path, dir_name)
+        child_coll = coll_ids.get(path)
+        if not child_coll and state:
+            child_coll = state.get_collection(path, coll_id)
+        if not child_coll:
+            existing_child_colls = get_collection_index(
+                coll_id, df_api=df_api, cache=listing_cache,
+                workers=1 if listing_pool is None else 4, pool=listing_pool)
+            child_coll = existing_child_colls.get(dir_name, mode="c/")
+            if not child_coll:
+                if verbose:
+                    print('Creating collection for sub-dir: ' + dir_name)
+                cc_resp = df_api.collectionCreate(dir_name, parent_id=coll_id)
+                child_coll = cc_resp[0].coll[0].id
+                if listing_cache:
+                    listing_cache.add_item(coll_id, dir_name, child_coll)
+            if state:
+                state.set_collection(path, coll_id, child_coll)
+        coll_ids[path] = child_coll
+        coll_id = child_coll
+    return coll_id
+
+
+def watch_posix_dfed(local_dir, dfed_coll, max_depth=1, df_api=None,
+                     link_data=True, scratch=None, cloud=None, verbose=False,
+                     workers=1, pool='thread', state=None, settle=10.0,
+                     interval=2.0, initial_sync=True, use_events=True,
+                     stop_event=None, tnail_cache=None, tnail_pipeline=None,
+                     listing_cache=None, batch_size=1, listing_pool=None):
+    """
+    Long-running alternative to calling sync_posix_dfed periodically (e.g.
+    via cron). After an optional initial sync, only the files that are
+    created within the dataset directories are ingested into DataFed, as soon
+    as they are completely written.
+
+    Files that are rewritten in place after they were ingested are not
+    ingested again, same as with sync_posix_dfed.
+
+    Parameters
+    ----------
+    local_dir : str
+        Root directory path in local file system that contains data uploaded
+        using (an older version of) DataFlow for a specific instrument
+    dfed_coll : str
+        ID for corresponding DataFed collection into which data records and
+        collections will be created to mirror the organization of the
+        file-system
+    max_depth : int, optional.
+        Number of intermediate directories between the provided local_dir and
+        the individual dataset directories. See sync_posix_dfed
+    df_api : datafed.CommandLib.API instance
+        Instance of the DataFed CommandLib API
+    link_data : bool, optional
+        Set to True to have the data record reference the data file in its
+        present location. Set to False to push the data file to DataFed
+    scratch : str or autoDIET.utils.scratch.ScratchSpace, optional.
+            path to directory that can be used for scratch purposes such as
+            storing thumbnails or other temporary needs. See sync_posix_dfed
+            Default = same directory where raw data is located
+    cloud : str or CloudProvider, Optional
+        Path to JSON file containing necessary information for cloud hosting
+        of thumbnails
+        OR Initialized instance of DBox or GDrive
+    verbose : bool, optional
+        Set to True to print statements for debugging purposes. Leave False
+        otherwise. Default = False
+    workers : int, optional
+        Number of files to ingest concurrently. Default = 1
+    pool : str, optional
+        Set to "thread" to ingest files using a pool of threads or "process"
+        to use a pool of processes. Default = "thread"
+    state : str or autoDIET.utils.sync_state.SyncState, optional
+        Path to SQLite database OR instance of SyncState that records the
+        directories and files already mirrored in DataFed
+    settle : float, optional
+        Number of seconds that a file must remain unchanged before it is
+        ingested. Default = 10
+    interval : float, optional
+        Number of seconds between consecutive checks for changes. Default = 2
+    initial_sync : bool, optional
+        Set to True to first ingest everything under local_dir that is not
+        yet in DataFed via sync_posix_dfed. Default = True
+    use_events : bool, optional
+        Set to False to poll the file system even if the watchdog package is
+        installed. Default = True
+    stop_event : threading.Event, optional
+        Event that stops watching once set. Otherwise, watches until
+        interrupted via Ctrl + C
+    tnail_cache : str or autoDIET.utils.thumbnail_cache.ThumbnailCache
+        Path to directory OR instance of ThumbnailCache holding thumbnails
+        and their links on the cloud, keyed by the contents of the data files
+    tnail_pipeline : int or autoDIET.pipeline.ThumbnailPipeline, optional
+        Number of background threads OR instance of ThumbnailPipeline that
+        add thumbnails to records after they are created. Default = add
+        thumbnails before moving on to the next file
+    listing_cache : autoDIET.utils.datafed_utils.CollectionListingCache
+        Cache of listings of DataFed collections shared by the initial sync
+        and every subsequent batch of changes. Default = a new cache
+    batch_size : int, optional
+        Number of records to create via a single request to DataFed.
+        Default = 1 - one request per file
+    listing_pool : concurrent.futures.ThreadPoolExecutor, optional
+        Pool of threads that fetch the pages of collection listings
+        concurrently, shared by the initial sync and every subsequent batch
+        of changes. Default = a pool for this call
+    """
+    if not df_api:
+        df_api = API()
+
+    own_state = own_executor = own_scratch = own_pipeline = False
+    own_listing_pool = False
+    executor = watcher = None
+    try:
+        state, own_state = open_sync_state(state)
+        listing_pool, own_listing_pool = open_listing_pool(listing_pool)
+
+        own_executor = workers > 1
+        if own_executor:
+            executor = make_executor(workers, pool=pool)
+        scratch, own_scratch = open_scratch(scratch, executor=executor)
+
+        cloud = open_cloud(cloud, executor=executor)
+        tnail_cache = open_thumbnail_cache(tnail_cache, executor=executor)
+        tnail_pipeline, own_pipeline = open_thumbnail_pipeline(
+            tnail_pipeline, cloud, executor=executor, scratch=scratch,
+            tnail_cache=tnail_cache, verbose=verbose)
+
+        if listing_cache is None:
+            listing_cache = CollectionListingCache()
+
+        # Start watching before the initial sync so nothing falls in between
+        watcher = PosixWatcher(local_dir, max_depth=max_depth, settle=settle,
+                               interval=interval,
+                               scratch=getattr(scratch, 'root', scratch),
+                               use_events=use_events, verbose=verbose)
+        coll_ids = dict()
+
+        if initial_sync:
+            sync_posix_dfed(local_dir, dfed_coll, max_depth=max_depth,
+                            df_api=df_api, link_data=link_data,
+                            scratch=scratch, cloud=cloud, verbose=verbose,
+                            executor=executor, state=state,
+                            tnail_cache=tnail_cache,
+                            tnail_pipeline=tnail_pipeline,
+                            listing_cache=listing_cache,
+                            batch_size=batch_size,
+                            listing_pool=listing_pool)
+
+        while not (stop_event and stop_event.is_set()):
+            changes = watcher.wait_for_changes(stop_event=stop_event)
+            for dset_dir, file_names in changes.items():
+                if verbose:
+                    print('Ingesting {} from {}'.format(file_names, dset_dir))
+                try:
+                    coll_id = _resolve_collection(dset_dir,
+                                                  watcher.local_dir,
+                                                  dfed_coll, coll_ids,
+                                                  df_api=df_api, state=state,
+                                                  verbose=verbose,
+                                                  listing_cache=listing_cache,
+                                                  listing_pool=listing_pool)
+                    process_posix_coll(dset_dir, coll_id, df_api=df_api,
+                                       link_data=link_data, scratch=scratch,
+                                       cloud=cloud, verbose=verbose,
+                                       executor=executor, state=state,
+                                       file_names=file_names,
+                                       tnail_cache=tnail_cache,
+                                       tnail_pipeline=tnail_pipeline,
+                                       listing_cache=listing_cache,
+                                       batch_size=batch_size,
+                                       listing_pool=listing_pool)
+                except Exception as exc:
+                    # Keep watching even if one dataset could not be ingested
+                    warn('Could not ingest {} from {}\n{}: {}'
+                         ''.format(file_names, dset_dir,
+                                   type(exc).__name__, exc))
+    except KeyboardInterrupt:
+        if verbose:
+            print('Stopped watching ' + local_dir)
+    finally:
+        try:
+            if watcher is not None:
+                watcher.close()
+        finally:
+            release_owned(executor=executor if own_executor else None,
+                          tnail_pipeline=tnail_pipeline if own_pipeline
+                          else None,
+                          state=state if own_state else None,
+                          scratch=scratch if own_scratch else None,
+                          listing_pool=listing_pool if own_listing_pool
+                          else None)
@@ -13,7 +13,7 @@ requirements = [
     'h5py',
     'numpy',
 
-    'tika',
+    'requests',
     'wget',
 
     'pillow',
@@ -39,8 +39,6 @@ setup(
         'Operating System :: OS Independent',
         'Programming Language :: Cython',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
@@ -55,6 +53,7 @@ setup(
     author='Suhas Somnath',
     author_email='somnaths@ornl.gov',
     install_requires=requirements,
+    python_requires='>=3.7',
     setup_requires=['pytest-runner'],
     tests_require=['unittest2;python_version<"3.0"', 'pytest'],
     platforms=['Linux', 'Mac OSX', 'Windows 10/8.1/8/7'],
@@ -64,5 +63,9 @@ setup(
     # include_package_data=True,
     # https://setuptools.readthedocs.io/en/latest/setuptools.html#declaring-dependencies
     extras_require={
+        # inotify-based file system events for autoDIET.watch
+        'watch': ['watchdog'],
+        # multi-threaded zstandard compression of directories
+        'zstd': ['zstandard'],
     },
 )
@@ -0,0 +1,196 @@
+import os
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import autoDIET.crawl as crawl
+import autoDIET.ingest as ingest
+import autoDIET.utils.datafed_utils as datafed_utils
+from autoDIET.cloud.cloud_provider import CloudProvider
+
+
+class FakeAPI(object):
+    """
+    Stands in for the DataFed CommandLib API, keeping collections and
+    records in memory. State is shared by all instances, as it would be on
+    the server, while the endpoint and context belong to each instance
+    """
+
+    lock = threading.Lock()
+    collections = dict()
+    records = dict()
+    created = list()
+    instances = list()
+    calls = dict()
+
+    def __init__(self):
+        self._endpoint = 'default-endpoint'
+        self._context = 'u/default'
+        with self.lock:
+            self.instances.append(self)
+
+    @classmethod
+    def reset(cls):
+        cls.collections = {'c/root': []}
+        cls.records = dict()
+        cls.created = list()
+        cls.instances = list()
+        cls.calls = dict()
+
+    @classmethod
+    def _count(cls, name):
+        with cls.lock:
+            cls.calls[name] = cls.calls.get(name, 0) + 1
+
+    @classmethod
+    def _new_item(cls, prefix, title, parent_id):
+        with cls.lock:
+            item_id = '{}/{}'.format(prefix, len(cls.created) + 1)
+            cls.created.append(title)
+            cls.collections[parent_id].append((title, item_id))
+            if prefix == 'c':
+                cls.collections[item_id] = list()
+        return item_id
+
+    def getContext(self):
+        return self._context
+
+    def setContext(self, item_id=None):
+        self._count('setContext')
+        self._context = item_id
+
+    def endpointGet(self):
+        return self._endpoint
+
+    def endpointSet(self, endpoint):
+        self._endpoint = endpoint
+
+    def collectionItemsList(self, coll_id, offset=0, count=20, context=None):
+        self._count('collectionItemsList')
+        with self.lock:
+            items = [SimpleNamespace(title=title, id=item_id) for
+                     title, item_id in self.collections.get(coll_id, [])]
+        return [SimpleNamespace(item=items[offset:offset + count],
+                                offset=offset, count=count,
+                                total=len(items))]
+
+    def collectionCreate(self, title, parent_id=None, **kwargs):
+        self._count('collectionCreate')
+        coll_id = self._new_item('c', title, parent_id)
+        return [SimpleNamespace(coll=[SimpleNamespace(id=coll_id)])]
+
+    def dataCreate(self, title, parent_id=None, metadata=None,
+                   external=None, raw_data_file=None, **kwargs):
+        self._count('dataCreate')
+        record_id = self._new_item('d', title, parent_id)
+        with self.lock:
+            self.records[record_id] = dict(title=title, parent=parent_id,
+                                           external=bool(external),
+                                           source=raw_data_file,
+                                           md=json.loads(metadata or '{}'),
+                                           context=self._context)
+        return [SimpleNamespace(data=[SimpleNamespace(id=record_id,
+                                                      title=title)])]
+
+    def dataUpdate(self, data_id, **kwargs):
+        self._count('dataUpdate')
+        with self.lock:
+            self.records.setdefault(data_id, dict()).update(kwargs)
+
+
+class FakeBatchAPI(FakeAPI):
+    """
+    Same as FakeAPI but with batch record creation. Like DataFed, the fields
+    of each record are read from JSON files and checked against the schema
+    of a record
+    """
+
+    batches = list()
+
+    # Fields of a record that dataBatchCreate understands
+    fields = {'title', 'alias', 'desc', 'tags', 'md', 'parent', 'external',
+              'source', 'ext', 'ext_auto', 'repo', 'deps', 'sch_id'}
+
+    @classmethod
+    def reset(cls):
+        super(FakeBatchAPI, cls).reset()
+        cls.batches = list()
+
+    def dataBatchCreate(self, file, coll_id=None, context=None):
+        self._count('dataBatchCreate')
+        created = list()
+        for path in file:
+            with open(path) as file_handle:
+                batch = json.load(file_handle)
+            self.batches.append(batch)
+            for rec in batch:
+                unknown = set(rec) - self.fields
+                if unknown:
+                    raise ValueError('Unknown fields: {}'.format(unknown))
+                if 'ext' in rec and not isinstance(rec['ext'], str):
+                    raise ValueError('ext must be a file extension')
+                record_id = self._new_item('d', rec['title'], rec['parent'])
+                with self.lock:
+                    self.records[record_id] = dict(
+                        title=rec['title'], parent=rec['parent'],
+                        external=bool(rec.get('external')),
+                        source=rec.get('source'), md=rec.get('md', {}),
+                        context=self._context)
+                created.append(SimpleNamespace(id=record_id,
+                                               title=rec['title']))
+        return [SimpleNamespace(data=created)]
+
+
+class FakeCloud(CloudProvider):
+    """
+    Hosts files in memory under links derived from their remote names,
+    remembering which local files were uploaded
+    """
+
+    def __init__(self):
+        self.hosted = dict()
+        self.uploads = list()
+        self.lock = threading.Lock()
+
+    def upload_public_file(self, local_path, dest_path):
+        with self.lock:
+            if dest_path in self.hosted:
+                raise FileExistsError(dest_path)
+            self.uploads.append(local_path)
+            self.hosted[dest_path] = 'https://cloud/' + dest_path
+        return self.hosted[dest_path]
+
+
+def _patch_api(monkeypatch, api_class):
+    api_class.reset()
+    for module in (crawl, ingest, datafed_utils):
+        monkeypatch.setattr(module, 'API', api_class)
+    # Instances created by earlier tests must not leak into this one
+    monkeypatch.setattr(datafed_utils, '_thread_state', threading.local())
+    # Keep Apache Tika out of the picture
+    monkeypatch.setattr(ingest, 'get_parser', lambda *args, **kwargs: None)
+    return api_class
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    return _patch_api(monkeypatch, FakeAPI)
+
+
+@pytest.fixture
+def fake_batch_api(monkeypatch):
+    return _patch_api(monkeypatch, FakeBatchAPI)
+
+
+def make_tree(root, rel_paths):
+    """
+    Creates the given files, named relative to root, with their relative
+    paths as their contents
+    """
+    for rel_path in rel_paths:
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, mode='w') as file_handle:
+            file_handle.write(rel_path)
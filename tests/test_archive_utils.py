@@ -0,0 +1,96 @@
+import os
+import tarfile
+
+import pytest
+
+from autoDIET.utils.archive_utils import make_archive
+
+
+def _make_tree(root):
+    os.makedirs(os.path.join(root, 'sub', 'empty'))
+    contents = {'a.txt': b'hello world\n' * 1000,
+                os.path.join('sub', 'b.bin'): os.urandom(64 * 1024)}
+    for rel_path, data in contents.items():
+        with open(os.path.join(root, rel_path), mode='wb') as file_handle:
+            file_handle.write(data)
+    return contents
+
+
+def _check_round_trip(tmp_path, codec, mode):
+    source = str(tmp_path / 'source')
+    contents = _make_tree(source)
+    dest = str(tmp_path / 'out')
+    os.makedirs(dest)
+
+    result = make_archive(source, dest=dest, codec=codec, workers=2)
+
+    assert result.codec == codec
+    assert result.members == len(contents)
+    assert os.path.isfile(result.path)
+    assert not os.path.exists(result.path + '.partial')
+    with tarfile.open(result.path, mode=mode) as tar:
+        names = tar.getnames()
+        assert os.path.join('source', 'sub', 'empty') in names
+        for rel_path, data in contents.items():
+            member = tar.extractfile(os.path.join('source', rel_path))
+            assert member.read() == data
+    return result
+
+
+def test_gzip_round_trip(tmp_path):
+    _check_round_trip(tmp_path, 'gzip', 'r:gz')
+
+
+def test_uncompressed_round_trip(tmp_path):
+    _check_round_trip(tmp_path, None, 'r:')
+
+
+def test_zstd_round_trip(tmp_path):
+    zstandard = pytest.importorskip('zstandard')
+    source = str(tmp_path / 'source')
+    contents = _make_tree(source)
+    result = make_archive(source, dest=str(tmp_path), codec='zstd')
+    with open(result.path, mode='rb') as file_handle:
+        reader = zstandard.ZstdDecompressor().stream_reader(file_handle)
+        with tarfile.open(fileobj=reader, mode='r|') as tar:
+            for member in tar:
+                if member.isreg():
+                    rel_path = os.path.relpath(member.name, 'source')
+                    assert tar.extractfile(member).read() == \
+                        contents[rel_path]
+
+
+def test_auto_skips_compressed_formats_only(tmp_path):
+    images = str(tmp_path / 'images')
+    os.makedirs(images)
+    with open(os.path.join(images, 'a.png'), mode='wb') as file_handle:
+        file_handle.write(os.urandom(64 * 1024))
+    assert make_archive(images, dest=str(tmp_path)).codec is None
+
+    # HDF5 files are often stored without compression
+    hdf5 = str(tmp_path / 'hdf5')
+    os.makedirs(hdf5)
+    with open(os.path.join(hdf5, 'a.h5'), mode='wb') as file_handle:
+        file_handle.write(bytes(256 * 1024))
+    result = make_archive(hdf5, dest=str(tmp_path))
+    assert result.codec == 'gzip'
+    assert result.archive_bytes < result.raw_bytes // 10
+
+
+def test_rejects_files(tmp_path):
+    file_path = str(tmp_path / 'a.txt')
+    open(file_path, mode='w').close()
+    with pytest.raises(ValueError):
+        make_archive(file_path)
+
+
+def test_incompressible_files_are_stored(tmp_path):
+    result = _check_round_trip(tmp_path, 'gzip', 'r:gz')
+    # The random file does not compress and is stored as is
+    assert result.stored_members == 1
+    assert result.stored_bytes == 64 * 1024
+
+    source = str(tmp_path / 'source')
+    result = make_archive(source, dest=str(tmp_path / 'plain.tar.gz'),
+                          codec='gzip', sample=False)
+    assert result.stored_members == 0
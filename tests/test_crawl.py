@@ -0,0 +1,149 @@
+import os
+
+import pytest
+
+from autoDIET import crawl
+from autoDIET.utils.parallel_utils import make_executor
+from autoDIET.utils.sync_state import SyncState
+
+from conftest import make_tree
+
+pytestmark = pytest.mark.filterwarnings('ignore:metadata.json not found')
+
+_FILES = ('a/f1.txt', 'a/f2.txt', 'a/f3.txt', 'b/g1.txt')
+
+
+def test_concurrent_crawl_creates_every_record(tmp_path, fake_api):
+    data_dir = str(tmp_path / 'data')
+    make_tree(data_dir, _FILES)
+
+    crawl.sync_posix_dfed(data_dir, 'c/root', max_depth=0,
+                          df_api=fake_api(), workers=3)
+
+    assert sorted(fake_api.created) == ['a', 'b', 'f1', 'f2', 'f3', 'g1']
+    assert len(fake_api.records) == 4
+
+
+def test_workers_use_endpoint_and_context_of_caller(tmp_path, fake_api):
+    data_dir = str(tmp_path / 'data')
+    make_tree(data_dir, _FILES)
+    df_api = fake_api()
+    df_api.endpointSet('my-endpoint')
+    df_api.setContext('p/my_project')
+
+    crawl.sync_posix_dfed(data_dir, 'c/root', max_depth=0, df_api=df_api,
+                          workers=2)
+
+    assert len(fake_api.records) == 4
+    for record in fake_api.records.values():
+        assert record['source'].startswith('my-endpoint/')
+        assert record['context'] == 'p/my_project'
+    # Each worker set up its own instance of the API
+    assert len(fake_api.instances) > 1
+
+
+def test_caller_executor_outlives_crawl(tmp_path, fake_api):
+    data_dir = str(tmp_path / 'data')
+    make_tree(data_dir, _FILES)
+    scratch = str(tmp_path / 'scratch')
+    os.makedirs(scratch)
+    state = SyncState(str(tmp_path / 'state.sqlite'))
+
+    executor = make_executor(2)
+    try:
+        crawl.sync_posix_dfed(data_dir, 'c/root', max_depth=0,
+                              df_api=fake_api(), scratch=scratch,
+                              executor=executor, state=state)
+        # Tasks may still be running. Nothing they need may be closed
+        assert os.path.isdir(scratch)
+        assert executor.submit(sum, [1, 2]).result() == 3
+    finally:
+        executor.shutdown(wait=True)
+    assert len(fake_api.records) == 4
+    # The state stayed open for the tasks to record the files
+    coll_a = dict(fake_api.collections['c/root'])['a']
+    assert state.get_item(os.path.join(data_dir, 'a', 'f1.txt'),
+                          coll_a) is not None
+    state.close()
+
+
+def test_recrawl_with_state_skips_listing(tmp_path, fake_api):
+    data_dir = str(tmp_path / 'data')
+    make_tree(data_dir, _FILES)
+    state_path = str(tmp_path / 'state.sqlite')
+
+    crawl.sync_posix_dfed(data_dir, 'c/root', max_depth=0,
+                          df_api=fake_api(), state=state_path)
+    listed = fake_api.calls['collectionItemsList']
+    crawl.sync_posix_dfed(data_dir, 'c/root', max_depth=0,
+                          df_api=fake_api(), state=state_path)
+    # Nothing changed, so DataFed was not contacted at all
+    assert fake_api.calls['collectionItemsList'] == listed
+    assert len(fake_api.records) == 4
+
+    with open(os.path.join(data_dir, 'a', 'f4.txt'), mode='w') as handle:
+        handle.write('new')
+    crawl.sync_posix_dfed(data_dir, 'c/root', max_depth=0,
+                          df_api=fake_api(), state=state_path)
+    assert len(fake_api.records) == 5
+
+
+def test_state_path_with_caller_executor_is_rejected(tmp_path, fake_api):
+    executor = make_executor(1)
+    try:
+        with pytest.raises(TypeError):
+            crawl.sync_posix_dfed(str(tmp_path), 'c/root', df_api=fake_api(),
+                                  executor=executor,
+                                  state=str(tmp_path / 'state.sqlite'))
+    finally:
+        executor.shutdown()
+
+
+def test_relative_scratch_within_tree_is_skipped(tmp_path, fake_api,
+                                                 monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    make_tree('data', ('a/f1.txt', 'scratch/leftover.txt'))
+
+    crawl.sync_posix_dfed('data', 'c/root', max_depth=0, df_api=fake_api(),
+                          scratch=os.path.join('data', 'scratch'))
+
+    assert sorted(fake_api.created) == ['a', 'f1']
+
+
+def _fill(fake_api, coll_id, count):
+    # Enough items for the listing to span several pages
+    fake_api.collections.setdefault(coll_id, list()).extend(
+        ('filler{}'.format(ind), 'd/{}-{}'.format(coll_id, ind))
+        for ind in range(count))
+
+
+def test_listings_share_one_pool(tmp_path, fake_api):
+    data_dir = str(tmp_path / 'data')
+    dir_names = ('a', 'b', 'c', 'd')
+    make_tree(data_dir, ['{}/f.txt'.format(name) for name in dir_names])
+    _fill(fake_api, 'c/root', 45)
+    for name in dir_names:
+        fake_api.collections['c/root'].append((name, 'c/' + name))
+        _fill(fake_api, 'c/' + name, 45)
+
+    crawl.sync_posix_dfed(data_dir, 'c/root', max_depth=0,
+                          df_api=fake_api())
+
+    assert len(fake_api.records) == 4
+    # Five listings of three pages each, yet only the caller's instance and
+    # one per thread of the shared pool
+    assert fake_api.calls['collectionItemsList'] == 15
+    assert len(fake_api.instances) <= 5
+
+
+def test_single_collection_lists_via_caller(tmp_path, fake_api):
+    data_dir = str(tmp_path / 'data')
+    make_tree(data_dir, ('f1.txt', 'f2.txt'))
+    fake_api.collections['c/a'] = list()
+    _fill(fake_api, 'c/a', 45)
+
+    crawl.process_posix_coll(data_dir, 'c/a', df_api=fake_api())
+
+    assert len(fake_api.records) == 2
+    assert fake_api.calls['collectionItemsList'] == 3
+    assert len(fake_api.instances) == 1
@@ -0,0 +1,85 @@
+import pytest
+
+import autoDIET.utils.datafed_utils as datafed_utils
+from autoDIET.utils.datafed_utils import CollectionIndex, \
+    CollectionListingCache, get_collection_index
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(datafed_utils.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_cached_listings_expire(clock):
+    cache = CollectionListingCache(ttl=10)
+    index = CollectionIndex()
+    cache.put('c/1', index)
+    assert cache.get('c/1') is index
+    # Listings are per context
+    assert cache.get('c/1', context='p/other') is None
+    clock[0] += 11
+    assert cache.get('c/1') is None
+
+
+def test_least_recently_used_listing_is_evicted():
+    cache = CollectionListingCache(max_entries=2)
+    for coll_id in ('c/1', 'c/2'):
+        cache.put(coll_id, CollectionIndex())
+    cache.get('c/1')
+    cache.put('c/3', CollectionIndex())
+    assert cache.get('c/2') is None
+    assert cache.get('c/1') is not None
+    assert cache.get('c/3') is not None
+    cache.invalidate('c/1')
+    assert cache.get('c/1') is None
+    cache.invalidate()
+    assert cache.get('c/3') is None
+    with pytest.raises(ValueError):
+        CollectionListingCache(max_entries=0)
+
+
+def test_created_items_are_added_to_cached_listing(fake_api):
+    fake_api.collections['c/1'] = [('old', 'd/1')]
+    cache = CollectionListingCache()
+    index = get_collection_index('c/1', df_api=fake_api(), cache=cache)
+    cache.add_item('c/1', 'new', 'd/2')
+    # Not cached, so nothing to update
+    cache.add_item('c/2', 'other', 'd/3')
+
+    again = get_collection_index('c/1', df_api=fake_api(), cache=cache)
+    assert again is index
+    assert again.to_dict() == {'old': 'd/1', 'new': 'd/2'}
+    assert fake_api.calls['collectionItemsList'] == 1
+
+
+def test_index_reports_shared_titles():
+    index = CollectionIndex()
+    for title, item_id in (('scan', 'd/1'), ('scan', 'c/2'), ('scan', 'd/3'),
+                           ('other', 'd/4'), ('scan', 'd/3')):
+        index.add(title, item_id)
+    # Adding the latest item again is a no-op
+    assert len(index) == 4
+    assert index.get('scan', mode='d/') == 'd/3'
+    assert index.get('scan', mode='c/') == 'c/2'
+    # Listed last wins across types
+    assert index.get('scan') == 'd/3'
+    assert index.get('missing', default='x') == 'x'
+    assert 'other' in index
+    assert not index.contains('other', mode='c/')
+    assert index.to_dict(mode='d/') == {'scan': 'd/3', 'other': 'd/4'}
+    assert index.to_dict(mode='c/') == {'scan': 'c/2'}
+    assert index.duplicates() == {'scan': ['d/1', 'd/3']}
+    assert index.duplicates(mode='c/') == {}
+    with pytest.raises(ValueError):
+        index.get('scan', mode='data')
+
+
+def test_index_spans_every_page(fake_api):
+    fake_api.collections['c/1'] = [('item{}'.format(ind), 'd/{}'.format(ind))
+                                   for ind in range(45)]
+    index = get_collection_index('c/1', df_api=fake_api(), workers=2)
+    assert len(index) == 45
+    assert index.get('item44') == 'd/44'
+    assert fake_api.calls['collectionItemsList'] == 3
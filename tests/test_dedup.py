@@ -0,0 +1,81 @@
+from autoDIET.cloud.manifest import UploadManifest
+from autoDIET.utils.file_utils import hash_file
+
+from conftest import FakeCloud
+
+
+class _LookupCounter(FakeCloud):
+
+    def __init__(self):
+        super(_LookupCounter, self).__init__()
+        self.lookups = list()
+
+    def _existing_link(self, remote_name):
+        self.lookups.append(remote_name)
+        return self.hosted.get(remote_name)
+
+
+class _ConflictingCloud(_LookupCounter):
+    lookup_before_upload = False
+
+
+def _write(tmp_path, name, contents):
+    file_path = str(tmp_path / name)
+    with open(file_path, mode='w') as file_handle:
+        file_handle.write(contents)
+    return file_path
+
+
+def test_identical_files_are_uploaded_once(tmp_path):
+    cloud = _LookupCounter()
+    paths = [_write(tmp_path, 'a.png', 'blank'),
+             _write(tmp_path, 'b.png', 'blank'),
+             _write(tmp_path, 'c.PNG', 'frame')]
+    links = cloud.upload_public_files(paths, deduplicate=True)
+    assert links[0] == links[1] != links[2]
+    assert len(cloud.uploads) == 2
+    assert links[2].endswith(hash_file(paths[2]) + '.png')
+    # Looked up before each distinct upload
+    assert len(cloud.lookups) == 2
+    assert cloud.upload_deduplicated(paths[0]) == links[0]
+    assert len(cloud.uploads) == 2
+
+
+def test_conflicting_provider_is_only_asked_after_failure(tmp_path):
+    cloud = _ConflictingCloud()
+    file_path = _write(tmp_path, 'a.png', 'blank')
+    link = cloud.upload_deduplicated(file_path)
+    assert cloud.lookups == []
+    # Already hosted, e.g. by an earlier run without a manifest
+    assert cloud.upload_deduplicated(file_path) == link
+    assert len(cloud.lookups) == 1
+    assert len(cloud.uploads) == 1
+
+
+def test_manifest_skips_provider(tmp_path):
+    file_path = _write(tmp_path, 'a.png', 'blank')
+    with UploadManifest(str(tmp_path / 'manifest.sqlite')) as manifest:
+        cloud = _LookupCounter()
+        cloud.manifest = manifest
+        link = cloud.upload_deduplicated(file_path)
+        assert manifest.get('_LookupCounter', hash_file(file_path)) == link
+
+        other = _LookupCounter()
+        other.manifest = manifest
+        assert other.upload_deduplicated(file_path) == link
+        assert other.uploads == other.lookups == []
+
+
+def test_manifest_entries_are_per_namespace(tmp_path):
+    with UploadManifest(str(tmp_path / 'manifest.sqlite')) as manifest:
+        manifest.set('dropbox:1', 'abc', 'https://one/abc')
+        manifest.set('dropbox:1', 'def', 'https://one/def')
+        manifest.set('dropbox:2', 'abc', 'https://two/abc')
+        assert manifest.get('dropbox:2', 'abc') == 'https://two/abc'
+        assert manifest.get('dropbox:2', 'def') is None
+        manifest.forget('dropbox:1', 'abc')
+        assert manifest.get('dropbox:1', 'abc') is None
+        assert manifest.get('dropbox:1', 'def') == 'https://one/def'
+        manifest.forget('dropbox:1')
+        assert manifest.get('dropbox:1', 'def') is None
+        assert manifest.get('dropbox:2', 'abc') == 'https://two/abc'
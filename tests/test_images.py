@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from autoDIET.raw_data.images import Images
+
+
+def _gradient(width, height):
+    rows = np.arange(height, dtype=np.uint16)[:, None] * 7
+    cols = np.arange(width, dtype=np.uint16)[None, :] * 3
+    return ((rows + cols) % 251).astype(np.uint8)
+
+
+def test_pyramid_level_selection(tmp_path):
+    file_path = str(tmp_path / 'pyramid.tif')
+    levels = [Image.fromarray(_gradient(1024 // 2 ** ind, 512 // 2 ** ind))
+              for ind in range(4)]
+    # Page of a different aspect ratio that must never be picked
+    levels.append(Image.fromarray(_gradient(300, 300)))
+    levels[0].save(file_path, save_all=True, append_images=levels[1:])
+
+    parser = Images(file_path)
+    try:
+        parser._select_pyramid_level(200)
+        # 256 x 128 is the smallest page at least 200 large
+        assert parser.image.size == (256, 128)
+        assert parser.image.tell() == 2
+        parser._select_pyramid_level(2000)
+        # Nothing is large enough. Fall back to full resolution
+        assert parser.image.size == (1024, 512)
+    finally:
+        parser.close()
+
+
+def test_strided_read_of_uncompressed_tiff(tmp_path):
+    file_path = str(tmp_path / 'raw.tif')
+    data = _gradient(1000, 600)
+    Image.fromarray(data).save(file_path, compression='raw')
+
+    parser = Images(file_path)
+    try:
+        small = parser._read_strided(100)
+        assert small is not None
+        step = 1000 // 100
+        assert np.array_equal(np.asarray(small), data[::step, ::step])
+    finally:
+        parser.close()
+
+
+def test_strided_read_skips_compressed_tiff(tmp_path):
+    file_path = str(tmp_path / 'packed.tif')
+    Image.fromarray(_gradient(400, 300)).save(file_path,
+                                              compression='tiff_lzw')
+    parser = Images(file_path)
+    try:
+        assert parser._read_strided(100) is None
+    finally:
+        parser.close()
+
+
+def test_fast_thumbnail_matches_size(tmp_path):
+    file_path = str(tmp_path / 'raw.tif')
+    Image.fromarray(_gradient(1000, 600)).save(file_path, compression='raw')
+    scratch = str(tmp_path / 'scratch')
+    os.makedirs(scratch)
+
+    parser = Images(file_path, scratch=scratch)
+    try:
+        tnails = parser.get_thumbnails('12345', max_size=100)
+    finally:
+        parser.close()
+    assert len(tnails) == 1
+    _, tnail_path = tnails[0]
+    assert os.path.dirname(tnail_path) == scratch
+    with Image.open(tnail_path) as image:
+        assert max(image.size) == 100
@@ -0,0 +1,66 @@
+import pytest
+
+from autoDIET.ingest import create_records
+
+
+def _records(count, source=True):
+    return [dict(title='rec{}'.format(ind), md={'index': ind},
+                 source='ep/data/rec{}.txt'.format(ind) if source else None)
+            for ind in range(count)]
+
+
+def test_batch_describes_linked_records(fake_batch_api, tmp_path):
+    fake_batch_api.collections['c/1'] = list()
+    records = _records(2) + [dict(title='pushed', md={})]
+    record_ids = create_records(records, 'c/1', df_api=fake_batch_api(),
+                                scratch=str(tmp_path))
+
+    assert fake_batch_api.calls['dataBatchCreate'] == 1
+    batch = fake_batch_api.batches[0]
+    assert batch[0] == {'title': 'rec0', 'parent': 'c/1',
+                        'md': {'index': 0}, 'external': True,
+                        'source': 'ep/data/rec0.txt'}
+    # Data is pushed separately for records without a source
+    assert batch[2] == {'title': 'pushed', 'parent': 'c/1', 'md': {}}
+    assert [fake_batch_api.records[rec_id]['external']
+            for rec_id in record_ids] == [True, True, False]
+    # Temporary JSON files are cleaned up
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_large_batches_are_split(fake_batch_api):
+    fake_batch_api.collections['c/1'] = list()
+    records = _records(10)
+    record_ids = create_records(records, 'c/1', df_api=fake_batch_api(),
+                                max_bytes=300)
+    assert fake_batch_api.calls['dataBatchCreate'] > 1
+    assert all(len(batch) <= 3 for batch in fake_batch_api.batches)
+    assert [fake_batch_api.records[rec_id]['title']
+            for rec_id in record_ids] == [rec['title'] for rec in records]
+
+
+def test_records_are_matched_by_title(fake_batch_api, monkeypatch):
+    fake_batch_api.collections['c/1'] = list()
+    batch_create = fake_batch_api.dataBatchCreate
+
+    def shuffled(self, *args, **kwargs):
+        resp = batch_create(self, *args, **kwargs)
+        resp[0].data.reverse()
+        return resp
+
+    monkeypatch.setattr(fake_batch_api, 'dataBatchCreate', shuffled)
+    records = _records(3, source=False) + [dict(title='rec1', md={})]
+    record_ids = create_records(records, 'c/1', df_api=fake_batch_api())
+    assert [fake_batch_api.records[rec_id]['title']
+            for rec_id in record_ids] == ['rec0', 'rec1', 'rec2', 'rec1']
+    # Each record with a shared title gets one of the IDs
+    assert len(set(record_ids)) == 4
+
+
+def test_records_are_created_individually_without_batch(fake_api):
+    fake_api.collections['c/1'] = list()
+    record_ids = create_records(_records(2), 'c/1', df_api=fake_api())
+    assert fake_api.calls['dataCreate'] == 2
+    assert fake_api.records[record_ids[1]]['source'] == 'ep/data/rec1.txt'
+    with pytest.raises(ValueError):
+        create_records(_records(1), 'c/1', df_api=fake_api(), max_bytes=0)
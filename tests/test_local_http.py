@@ -0,0 +1,56 @@
+import os
+from urllib.request import urlopen
+
+import pytest
+
+from autoDIET.cloud.local_http import LocalHTTPProvider
+
+
+def _write(path, contents):
+    with open(path, mode='w') as file_handle:
+        file_handle.write(contents)
+    return path
+
+
+def test_uploaded_files_are_served(tmp_path):
+    provider = LocalHTTPProvider(str(tmp_path / 'www'))
+    try:
+        with pytest.raises(ValueError):
+            # Nowhere to point to yet
+            provider._url('a.png')
+        server = provider.serve()
+        assert provider.serve() is server
+        assert provider.base_url == 'http://127.0.0.1:{}'.format(
+            server.server_address[1])
+        local_path = _write(str(tmp_path / 'tnail.png'), 'pixels')
+        link = provider.upload_public_file(local_path, 'sub dir/a.png')
+        assert link == provider.base_url + '/sub%20dir/a.png'
+        with urlopen(link, timeout=10) as resp:
+            assert resp.read() == b'pixels'
+        assert provider._existing_link('sub dir/a.png') == link
+        assert provider._existing_link('sub dir/b.png') is None
+        # No temporary files left behind
+        assert os.listdir(str(tmp_path / 'www' / 'sub dir')) == ['a.png']
+    finally:
+        provider.close()
+
+
+def test_destination_must_stay_within_root(tmp_path):
+    provider = LocalHTTPProvider(str(tmp_path / 'www'),
+                                 base_url='http://thumbs.example.org/')
+    assert provider.namespace == 'local_http:http://thumbs.example.org'
+    local_path = _write(str(tmp_path / 'tnail.png'), 'pixels')
+    for dest_path in ('../escaped.png', 'a/../../escaped.png', '/'):
+        with pytest.raises(ValueError):
+            provider.upload_public_file(local_path, dest_path)
+    assert not os.path.exists(str(tmp_path / 'escaped.png'))
+    # Leading slashes are relative to the root
+    assert provider.upload_public_file(local_path, '/x.png') == \
+        'http://thumbs.example.org/x.png'
+
+
+def test_invalid_arguments(tmp_path):
+    with pytest.raises(TypeError):
+        LocalHTTPProvider(None)
+    with pytest.raises(ValueError):
+        LocalHTTPProvider(str(tmp_path), base_url=' / ')
@@ -0,0 +1,99 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import autoDIET.raw_data.parser as parser
+from autoDIET.raw_data.parser import TikaServer, connect_tika_server, \
+    get_tika_server
+
+
+class _FakeTika(BaseHTTPRequestHandler):
+    """
+    Answers like an Apache Tika server, counting requests per path
+    """
+
+    def do_GET(self):
+        self.server.calls.append(self.path)
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b'Apache Tika 2.9.1')
+
+    def do_PUT(self):
+        self.server.calls.append(self.path)
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.server.hang:
+            self.server.hang -= 1
+            time.sleep(1)
+        payload = json.dumps({'Content-Length': str(len(body))}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_tika():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeTika)
+    server.calls = []
+    server.hang = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _data_file(tmp_path, contents=b'0123456789'):
+    file_path = str(tmp_path / 'data.bin')
+    with open(file_path, mode='wb') as file_handle:
+        file_handle.write(contents)
+    return file_path
+
+
+def test_health_is_checked_once(tmp_path, fake_tika):
+    file_path = _data_file(tmp_path)
+    server = TikaServer(host='127.0.0.1', port=fake_tika.server_port)
+    for _ in range(5):
+        assert server.get_metadata(file_path) == {'Content-Length': '10'}
+    assert fake_tika.calls.count('/version') == 1
+    assert fake_tika.calls.count('/meta') == 5
+
+
+def test_hung_request_checks_health_again(tmp_path, fake_tika):
+    file_path = _data_file(tmp_path)
+    fake_tika.hang = 1
+    server = TikaServer(host='127.0.0.1', port=fake_tika.server_port,
+                        request_timeout=0.2)
+    assert server.get_metadata(file_path) == {'Content-Length': '10'}
+    assert fake_tika.calls.count('/version') == 2
+    assert fake_tika.calls.count('/meta') == 2
+
+
+def test_open_file_handle_is_reused(tmp_path, fake_tika):
+    file_path = _data_file(tmp_path)
+    server = TikaServer(host='127.0.0.1', port=fake_tika.server_port)
+    with open(file_path, mode='rb') as file_handle:
+        file_handle.seek(4)
+        meta = server.get_metadata(file_path, file_handle=file_handle)
+        # Whole file sent, position of the caller untouched
+        assert meta == {'Content-Length': '10'}
+        assert file_handle.tell() == 4
+
+
+def test_connect_shares_running_server(monkeypatch, fake_tika):
+    monkeypatch.setattr(parser, '_tika_server', None)
+    endpoint = 'http://127.0.0.1:{}'.format(fake_tika.server_port)
+    connect_tika_server(endpoint)
+    server = get_tika_server()
+    assert server.endpoint == endpoint
+    # Never starts a server of its own
+    assert server.jar_path is None
+    connect_tika_server(endpoint)
+    assert get_tika_server() is server
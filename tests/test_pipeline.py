@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+import autoDIET.pipeline as pipeline
+from autoDIET.pipeline import ThumbnailPipeline
+
+
+class _Parser(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_failures_do_not_stop_pipeline(monkeypatch, fake_api):
+    done = list()
+
+    def add_thumbnails(record_id, file_path, cloud, df_api=None, **kwargs):
+        if record_id == 'd/2':
+            raise IOError('Cloud unreachable')
+        done.append(record_id)
+
+    monkeypatch.setattr(pipeline, 'add_thumbnails', add_thumbnails)
+    parsers = [_Parser() for _ in range(4)]
+    with pytest.warns(UserWarning, match='Could not add thumbnails'):
+        with ThumbnailPipeline(None, workers=2) as tnail_pipeline:
+            for index, parser in enumerate(parsers):
+                tnail_pipeline.submit('d/{}'.format(index), 'f.txt',
+                                      parser=parser)
+    assert sorted(done) == ['d/0', 'd/1', 'd/3']
+    assert tnail_pipeline.failures == [('d/2', 'f.txt')]
+    # The pipeline owns the Parsers
+    assert all(parser.closed for parser in parsers)
+    with pytest.raises(RuntimeError):
+        tnail_pipeline.submit('d/4', 'f.txt')
+
+
+def test_submit_blocks_once_queue_is_full(monkeypatch, fake_api):
+    release = threading.Event()
+    started = threading.Event()
+
+    def add_thumbnails(record_id, file_path, cloud, **kwargs):
+        started.set()
+        release.wait(10)
+
+    monkeypatch.setattr(pipeline, 'add_thumbnails', add_thumbnails)
+    tnail_pipeline = ThumbnailPipeline(None, workers=1, max_pending=1)
+    try:
+        tnail_pipeline.submit('d/1', 'f.txt')
+        assert started.wait(10)
+        # Fills the queue while the worker is busy
+        tnail_pipeline.submit('d/2', 'f.txt')
+        blocked = threading.Thread(target=tnail_pipeline.submit,
+                                   args=('d/3', 'f.txt'))
+        blocked.start()
+        blocked.join(0.2)
+        assert blocked.is_alive()
+        release.set()
+        blocked.join(10)
+        assert not blocked.is_alive()
+    finally:
+        release.set()
+        tnail_pipeline.close()
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        ThumbnailPipeline(None, workers=0)
+    with pytest.raises(ValueError):
+        ThumbnailPipeline(None, max_pending=0)
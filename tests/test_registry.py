@@ -0,0 +1,104 @@
+import pytest
+
+import autoDIET.raw_data.registry as registry_module
+from autoDIET.raw_data.registry import ParserRegistry, ParserSpec
+
+
+class _Fallback(object):
+
+    def __init__(self, file_path, scratch=None, verbose=False, header=None):
+        self.file_path = file_path
+        self.header = header
+
+
+class _Text(_Fallback):
+    extensions = ('txt',)
+
+
+class _Magic(_Fallback):
+    magic = (b'MAGIC',)
+
+
+class _Picky(_Fallback):
+    extensions = ('txt',)
+
+    def __init__(self, file_path, **kwargs):
+        raise ValueError('Not for me')
+
+
+class _Broken(_Fallback):
+    extensions = ('txt',)
+
+    def __init__(self, file_path, **kwargs):
+        raise RuntimeError('Bug')
+
+
+@pytest.fixture(autouse=True)
+def no_entry_points(monkeypatch):
+    monkeypatch.setattr(registry_module, '_iter_entry_points',
+                        lambda group: [])
+
+
+def _write(tmp_path, name, contents):
+    file_path = str(tmp_path / name)
+    with open(file_path, mode='wb') as file_handle:
+        file_handle.write(contents)
+    return file_path
+
+
+def test_magic_number_comes_before_extension(tmp_path):
+    registry = ParserRegistry(fallback=_Fallback)
+    registry.register(_Text)
+    registry.register(_Magic)
+    file_path = _write(tmp_path, 'data.txt', b'MAGIC and more')
+    assert registry.candidates(file_path) == (_Magic, _Text, _Fallback)
+    other_path = _write(tmp_path, 'other.txt', b'plain text')
+    assert registry.candidates(other_path) == (_Text, _Fallback)
+    parser = registry.get_parser(file_path)
+    assert isinstance(parser, _Magic)
+    # Header is only read once and handed to the Parser
+    assert parser.header.startswith(b'MAGIC')
+
+
+def test_later_registration_takes_precedence(tmp_path):
+    registry = ParserRegistry()
+    registry.register(_Text)
+    file_path = _write(tmp_path, 'data.txt', b'abc')
+    assert registry.candidates(file_path) == (_Text,)
+
+    class _Newer(_Text):
+        pass
+
+    # Registering clears cached candidates
+    registry.register(_Newer)
+    assert registry.candidates(file_path) == (_Newer, _Text)
+
+
+def test_parsers_that_cannot_read_file_are_skipped(tmp_path):
+    registry = ParserRegistry(fallback=_Fallback)
+    registry.register(_Broken)
+    registry.register(_Picky)
+    file_path = _write(tmp_path, 'data.txt', b'abc')
+    with pytest.warns(UserWarning, match='_Broken failed to read'):
+        parser = registry.get_parser(file_path)
+    assert type(parser) is _Fallback
+    assert registry.get_parser(str(tmp_path / 'missing.txt')) is None
+
+
+def test_spec_is_imported_only_when_needed(tmp_path):
+    registry = ParserRegistry()
+    spec = registry.register(ParserSpec('test_registry:_Text',
+                                        extensions=('dat',)))
+    _write(tmp_path, 'data.txt', b'abc')
+    assert registry.get_parser(str(tmp_path / 'data.txt')) is None
+    assert spec._class is None
+    file_path = _write(tmp_path, 'data.dat', b'abc')
+    assert type(registry.get_parser(file_path)).__name__ == '_Text'
+    assert spec._class is not None
+
+
+def test_invalid_registrations_are_rejected():
+    with pytest.raises(ValueError):
+        ParserSpec('module.without.class')
+    with pytest.raises(TypeError):
+        ParserRegistry().register(ParserSpec('a:B', magic=('text',)))
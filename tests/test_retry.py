@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+
+import pytest
+
+import autoDIET.cloud.retry as retry
+from autoDIET.cloud.retry import AdaptiveLimit, RetryingProvider
+
+from conftest import FakeCloud
+
+
+class _HTTPError(Exception):
+
+    def __init__(self, status, headers=None):
+        super(_HTTPError, self).__init__('HTTP {}'.format(status))
+        self.response = SimpleNamespace(status_code=status,
+                                        headers=headers or dict())
+
+
+class _FlakyCloud(FakeCloud):
+    """
+    Fails with the given exceptions before uploading
+    """
+
+    def __init__(self, failures):
+        super(_FlakyCloud, self).__init__()
+        self.failures = list(failures)
+        self.attempts = 0
+
+    def upload_public_file(self, local_path, dest_path):
+        self.attempts += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return super(_FlakyCloud, self).upload_public_file(local_path,
+                                                           dest_path)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = list()
+    monkeypatch.setattr(retry.time, 'sleep', delays.append)
+    return delays
+
+
+def test_throttled_uploads_are_tried_again(sleeps):
+    cloud = _FlakyCloud([_HTTPError(429, {'Retry-After': '7'}),
+                         ConnectionError('reset'),
+                         _HTTPError(502)])
+    limit = AdaptiveLimit(initial=8)
+    provider = RetryingProvider(cloud, base_delay=1, max_delay=5,
+                                limit=limit)
+    assert provider.upload_public_file('a.png', 'a.png') == \
+        'https://cloud/a.png'
+    assert cloud.attempts == 4
+    # Retry-After is honored up to max_delay, others back off with jitter
+    assert sleeps[0] == 5
+    assert 0 <= sleeps[1] <= 2 and 0 <= sleeps[2] <= 4
+    # Halved for the 429 and the 502, raised a little by the success
+    assert limit.limit == 2
+
+
+def test_permanent_errors_are_raised(sleeps):
+    cloud = _FlakyCloud([_HTTPError(403)])
+    provider = RetryingProvider(cloud)
+    with pytest.raises(_HTTPError):
+        provider.upload_public_file('a.png', 'a.png')
+    assert cloud.attempts == 1
+    assert sleeps == []
+
+    cloud = _FlakyCloud([_HTTPError(503)] * 3)
+    provider = RetryingProvider(cloud, max_retries=2)
+    with pytest.raises(_HTTPError):
+        provider.upload_public_file('a.png', 'a.png')
+    assert cloud.attempts == 3
+
+
+def test_limit_grows_additively_and_shrinks_multiplicatively():
+    limit = AdaptiveLimit(initial=4, minimum=2, maximum=5)
+    # Roughly one more per window of successes
+    for _ in range(4):
+        limit.acquire()
+        limit.release('success')
+    assert limit.limit == 4
+    limit.acquire()
+    limit.release('success')
+    assert limit.limit == 5
+    for _ in range(20):
+        limit.acquire()
+        limit.release('success')
+    assert limit.limit == 5
+    limit.acquire()
+    limit.release('throttled')
+    assert limit.limit == 2
+    limit.acquire()
+    limit.release('throttled')
+    assert limit.limit == 2
+    with pytest.raises(ValueError):
+        AdaptiveLimit(initial=1, minimum=2)
+
+
+def test_wrapper_exposes_wrapped_provider():
+    cloud = FakeCloud()
+    provider = RetryingProvider(cloud)
+    assert provider.namespace == cloud.namespace
+    assert provider.lookup_before_upload
+    provider.manifest = 'manifest'
+    assert cloud.manifest == 'manifest'
+    with pytest.raises(TypeError):
+        RetryingProvider(object())
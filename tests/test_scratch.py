@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+import subprocess
+
+import pytest
+
+from autoDIET.utils.scratch import ScratchSpace
+
+
+def test_session_is_removed_on_close(tmp_path):
+    with ScratchSpace(str(tmp_path)) as scratch:
+        session = scratch.path
+        assert os.fspath(scratch) == session
+        assert os.path.dirname(session) == str(tmp_path)
+        paths = {scratch.unique_path(suffix='.png') for _ in range(3)}
+        assert len(paths) == 3
+        assert all(path.endswith('.png') and os.path.dirname(path) == session
+                   for path in paths)
+        assert os.path.isdir(scratch.make_dir(prefix='tnails_'))
+    assert not os.path.exists(session)
+    with pytest.raises(ValueError):
+        scratch.unique_path()
+
+
+def test_small_files_go_to_small_root(tmp_path):
+    with ScratchSpace(str(tmp_path / 'big'),
+                      small_root=str(tmp_path / 'small')) as scratch:
+        path = scratch.unique_path(small=True)
+        assert os.path.dirname(path) == scratch.small_path
+        assert scratch.small_path.startswith(str(tmp_path / 'small'))
+        small_path = scratch.small_path
+    assert not os.path.exists(small_path)
+
+
+def test_reservations_wait_for_budget(tmp_path):
+    with ScratchSpace(str(tmp_path), max_bytes=100) as scratch:
+        assert scratch.reserve(60)
+        assert not scratch.reserve(60, timeout=0.05)
+        waiter = threading.Thread(target=scratch.reserve, args=(60,))
+        waiter.start()
+        waiter.join(0.1)
+        assert waiter.is_alive()
+        scratch.release(60)
+        waiter.join(10)
+        assert scratch.reserved == 60
+        scratch.release(60)
+        # Larger than the budget, but nothing else is reserved
+        with scratch.reservation(500):
+            assert scratch.reserved == 500
+        assert scratch.reserved == 0
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='Checks process IDs')
+def test_sessions_of_dead_runs_are_removed(tmp_path):
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    with ScratchSpace(str(tmp_path), cleanup_stale=False) as scratch:
+        stale = os.path.join(str(tmp_path), '{}{}-abc'.format(
+            scratch._prefix, process.pid))
+        alive = os.path.join(str(tmp_path), '{}{}-abc'.format(
+            scratch._prefix, os.getppid()))
+        other = str(tmp_path / 'unrelated')
+        for path in (stale, alive, other):
+            os.makedirs(path)
+    with ScratchSpace(str(tmp_path)) as scratch:
+        assert not os.path.exists(stale)
+        assert os.path.isdir(alive)
+        assert os.path.isdir(other)
@@ -0,0 +1,55 @@
+import os
+
+from autoDIET.utils.sync_state import SyncState
+
+
+def _write(path, contents):
+    with open(path, mode='w') as file_handle:
+        file_handle.write(contents)
+
+
+def test_unchanged_file_is_skipped(tmp_path):
+    file_path = str(tmp_path / 'data.txt')
+    _write(file_path, 'abc')
+    with SyncState(str(tmp_path / 'state.sqlite')) as state:
+        assert state.get_item(file_path, 'c/1') is None
+        state.set_item(file_path, 'c/1', 'd/1')
+        assert state.get_item(file_path, 'c/1') == 'd/1'
+        # Entries are per parent collection
+        assert state.get_item(file_path, 'c/2') is None
+
+
+def test_modified_file_is_synced_again(tmp_path):
+    file_path = str(tmp_path / 'data.txt')
+    _write(file_path, 'abc')
+    with SyncState(str(tmp_path / 'state.sqlite')) as state:
+        state.set_item(file_path, 'c/1', 'd/1')
+        _write(file_path, 'abcdef')
+        assert state.get_item(file_path, 'c/1') is None
+
+
+def test_touched_file_is_skipped_with_hash(tmp_path):
+    file_path = str(tmp_path / 'data.txt')
+    _write(file_path, 'abc')
+    with SyncState(str(tmp_path / 'state.sqlite'), use_hash=True) as state:
+        state.set_item(file_path, 'c/1', 'd/1')
+        stat = os.stat(file_path)
+        os.utime(file_path, ns=(stat.st_atime_ns,
+                                stat.st_mtime_ns + 10 ** 9))
+        assert state.get_item(file_path, 'c/1') == 'd/1'
+        _write(file_path, 'xyz')
+        assert state.get_item(file_path, 'c/1') is None
+
+
+def test_state_persists_and_forget(tmp_path):
+    file_path = str(tmp_path / 'data.txt')
+    db_path = str(tmp_path / 'state.sqlite')
+    _write(file_path, 'abc')
+    with SyncState(db_path) as state:
+        state.set_item(file_path, 'c/1', 'd/1')
+        state.set_collection(str(tmp_path), 'c/0', 'c/1')
+    with SyncState(db_path) as state:
+        assert state.get_item(file_path, 'c/1') == 'd/1'
+        assert state.get_collection(str(tmp_path), 'c/0') == 'c/1'
+        state.forget(file_path)
+        assert state.get_item(file_path, 'c/1') is None
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+import autoDIET.utils.thumbnail_cache as thumbnail_cache
+from autoDIET.ingest import _cached_thumbnails_desc
+from autoDIET.utils.thumbnail_cache import ThumbnailCache
+
+from conftest import FakeCloud
+
+
+class _Parser(object):
+
+    def get_thumbnails(self, size=256):
+        raise AssertionError('Cached thumbnails should have been reused')
+
+
+def _write(path, contents):
+    with open(path, mode='w') as file_handle:
+        file_handle.write(contents)
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with ThumbnailCache(str(tmp_path / 'cache')) as cache:
+        yield cache
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    paths = list()
+    hash_file = thumbnail_cache.hash_file
+
+    def counting_hash(file_path):
+        paths.append(file_path)
+        return hash_file(file_path)
+
+    monkeypatch.setattr(thumbnail_cache, 'hash_file', counting_hash)
+    return paths
+
+
+def test_key_only_hashes_changed_files(tmp_path, cache, hashed):
+    file_path = _write(str(tmp_path / 'data.txt'), 'abc')
+    key = cache.make_key(file_path, parser=_Parser(), size=128)
+    assert cache.make_key(file_path, parser=_Parser(), size=128) == key
+    assert len(hashed) == 1
+    assert cache.make_key(file_path, parser=_Parser(), size=64) != key
+
+    # Touched but identical contents map to the same key
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.make_key(file_path, parser=_Parser(), size=128) == key
+    assert len(hashed) == 2
+
+    _write(file_path, 'abcdef')
+    assert cache.make_key(file_path, parser=_Parser(), size=128) != key
+
+
+def test_evicted_thumbnails_are_kept_by_link(tmp_path, cache):
+    cache.max_bytes = 5
+    key = 'k' * 64
+    tnails = [('a', _write(str(tmp_path / 'a.png'), 'aaaa')),
+              ('b', _write(str(tmp_path / 'b.png'), 'bbbb'))]
+    with cache.in_use(key):
+        cached = cache.put(key, tnails)
+        # Nothing evicted while in use
+        assert all(os.path.exists(path) for _, path in cached)
+        cache.set_urls(key, ['https://cloud/a'])
+    entries = cache.get(key)
+    assert entries[0] == ('a', None, 'https://cloud/a')
+    assert entries[1] == ('b', cached[1][1], None)
+
+    # Neither a local copy nor a link left
+    os.remove(cached[1][1])
+    assert cache.get(key) is None
+
+
+def test_mixed_entries_upload_only_missing_links(tmp_path, cache):
+    file_path = _write(str(tmp_path / 'data.txt'), 'abc')
+    cloud = FakeCloud()
+    parser = _Parser()
+    key = cache.make_key(file_path, parser=parser, cloud=cloud)
+    cached = cache.put(key, [('a', _write(str(tmp_path / 'a.png'), 'aaaa')),
+                             ('b', _write(str(tmp_path / 'b.png'), 'bbbb'))])
+    cache.set_urls(key, ['https://cloud/old_a'])
+    os.remove(cached[0][1])
+
+    desc = _cached_thumbnails_desc('d/1', file_path, cloud, cache,
+                                   parser=parser)
+    assert cloud.uploads == [cached[1][1]]
+    assert desc.startswith('![a](https://cloud/old_a)\n\n![b](https://cloud/')
+    assert all(url for _, _, url in cache.get(key))
@@ -0,0 +1,80 @@
+import os
+import time
+import threading
+
+import pytest
+
+from autoDIET.watch import PosixWatcher, watch_posix_dfed
+
+from conftest import make_tree
+
+pytestmark = pytest.mark.filterwarnings('ignore:metadata.json not found')
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_polling_watcher_reports_settled_files(tmp_path):
+    data_dir = str(tmp_path / 'data')
+    make_tree(data_dir, ('a/old.txt',))
+    watcher = PosixWatcher(data_dir, max_depth=0, settle=0.1, interval=0.02,
+                           use_events=False)
+    try:
+        make_tree(data_dir, ('a/new.txt', 'a/.hidden', 'a/metadata.json'))
+        stop = threading.Event()
+        timer = threading.Timer(10, stop.set)
+        timer.start()
+        try:
+            changes = watcher.wait_for_changes(stop_event=stop)
+        finally:
+            timer.cancel()
+    finally:
+        watcher.close()
+    # Files present before watching started are left to the initial sync
+    assert changes == {os.path.join(data_dir, 'a'): ['new.txt']}
+
+
+def test_watch_ingests_new_files(tmp_path, fake_api):
+    data_dir = str(tmp_path / 'data')
+    make_tree(data_dir, ('a/f1.txt',))
+    stop = threading.Event()
+    errors = list()
+
+    def _watch():
+        try:
+            watch_posix_dfed(data_dir, 'c/root', max_depth=0,
+                             df_api=fake_api(), settle=0.1, interval=0.02,
+                             use_events=False, stop_event=stop,
+                             state=str(tmp_path / 'state.sqlite'))
+        except Exception as exc:
+            errors.append(exc)
+
+    thread = threading.Thread(target=_watch)
+    thread.start()
+    try:
+        assert _wait_for(lambda: len(fake_api.records) == 1)
+        make_tree(data_dir, ('a/f2.txt',))
+        assert _wait_for(lambda: len(fake_api.records) == 2)
+    finally:
+        stop.set()
+        thread.join(10)
+    assert not errors
+    assert sorted(fake_api.created) == ['a', 'f1', 'f2']
+
+
+def test_watch_releases_resources_when_setup_fails(tmp_path, fake_api):
+    scratch = str(tmp_path / 'scratch')
+    os.makedirs(scratch)
+    # Not a directory, so the watcher cannot start
+    with pytest.raises(NotADirectoryError):
+        watch_posix_dfed(str(tmp_path / 'missing'), 'c/root',
+                         df_api=fake_api(), scratch=scratch, workers=2,
+                         state=str(tmp_path / 'state.sqlite'))
+    # The session directory of the ScratchSpace was removed
+    assert os.listdir(scratch) == []